@@ -0,0 +1,190 @@
+import os
+import re
+import csv
+import sys
+import glob
+import json
+import multiprocessing
+from LXRS_csv_file_processor import buildArgumentParser, checkArguments, loadFromArguments, isMaxMode, \
+    sliceFromArguments, saveCaptures, saveEventIndex, saveCaptureSpectra, saveWelchSpectrum, plotCaptures, \
+    nanosecondsToDatetime, TIME_FORMAT
+"""
+    This script runs the processing of LXRS_csv_file_processor.py over many Sensor Connect *.csv files at once. It
+takes any number of files, directories or glob patterns, for example,
+
+    LXRS_batch_processor.py -w 8 -S nightly.json logs/ "archive/2017-02-*.csv"
+
+    Every file is handed to a pool of worker processes and sliced with the same trigger settings, all of the
+command line options of LXRS_csv_file_processor.py apply. The captures of each file are saved next to it as usual and
+a summary of every file, its sample count, sample rate, per axis peaks and triggers, is written out as one csv or
+json file. A file that can't be processed is noted in the summary and skipped rather than stopping the batch.
+"""
+
+# constants
+# ------------------------
+DEFAULT_WORKERS = multiprocessing.cpu_count()
+DEFAULT_SUMMARY = "batch_summary.csv"
+# capture files, event indexes and spectrum summaries written by an earlier run are never taken as input
+CAPTURE_FILE_RE = re.compile(r".*_(trunc\d*|events|captures|spectra|welch)\.csv$")
+# the csv summary has these columns followed by the peaks of every channel found in the batch and the triggers
+SUMMARY_COLUMNS = ["file", "status", "error", "samples", "sampleRate", "gaps"]
+PEAK_FIELDS = ["Max", "MaxTime", "Min", "MinTime"]
+
+
+def findCsvFiles(paths, recursive=False):
+    """
+    expands the batch arguments into a list of csv files, directories give the csv files inside them and glob
+    patterns the files they match, capture files from earlier runs are left out
+    :param paths: a list of files, directories and glob patterns
+    :param recursive: also search the subdirectories of directories
+    :return: a sorted list of csv filenames with no repeats
+    """
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for directory, subdirectories, names in os.walk(path):
+                    found.update(os.path.join(directory, name) for name in names if name.lower().endswith(".csv"))
+            else:
+                found.update(glob.glob(os.path.join(path, "*.csv")))
+        elif os.path.isfile(path):
+            found.add(path)
+        else:
+            found.update(match for match in glob.glob(path) if os.path.isfile(match))
+    return sorted(name for name in found if not CAPTURE_FILE_RE.match(name))
+
+
+def summarize(msd, captures):
+    """
+    collects the summary of one processed file
+    :param msd: the MicroStrainData object of the file
+    :param captures: the captures sliced from it, from every node in per node mode
+    :return: a dictionary with an entry per SUMMARY_COLUMNS column and per PEAK_FIELDS field of every channel, the
+    triggers as a list of dictionaries
+    """
+    summary = {"samples": msd.totalNumSamples, "sampleRate": msd.sampleFrequency, "gaps": len(msd.gaps),
+               "channels": msd.channelNames}
+    for axis, name in enumerate(msd.channelNames):
+        summary[name + "Max"] = msd.maxPeaks[axis][2]
+        summary[name + "MaxTime"] = msd.maxPeaks[axis][1].strftime(TIME_FORMAT)
+        summary[name + "Min"] = msd.minPeaks[axis][2]
+        summary[name + "MinTime"] = msd.minPeaks[axis][1].strftime(TIME_FORMAT)
+    summary["triggers"] = []
+    for capture in captures:
+        time = capture.triggerTime()
+        summary["triggers"].append({"index": capture.triggerIndex,
+                                    "time": nanosecondsToDatetime(time).strftime(TIME_FORMAT) if time else "",
+                                    "value": float(capture.triggerValue or 0)})
+    return summary
+
+
+def processFile(job):
+    """
+    the work done for one file by a worker process, loads the file, slices it and saves the captures, any
+    failure is caught and recorded in the summary so the rest of the batch carries on
+    :param job: a tuple of the csv filename, the parsed command line arguments and whether to save captures
+    :return: the summary dictionary of the file
+    """
+    filename, args, export = job
+    summary = {"file": filename, "status": "ok", "error": ""}
+    try:
+        msd = loadFromArguments(filename, args)
+        maxMode = isMaxMode(msd, args)
+        captures = []
+        groups = sliceFromArguments(msd, args)
+        for node, nodeCaptures in groups:
+            if export: saveCaptures(filename, nodeCaptures, maxMode=maxMode, verbose=False, node=node,
+                                    fmt=args.format, combined=args.combined)
+            if export and args.events: saveEventIndex(filename, nodeCaptures, node=node)
+            if export and args.spectrum: saveCaptureSpectra(filename, msd, nodeCaptures, args, node)
+            captures += nodeCaptures
+        if export and args.welch: saveWelchSpectrum(filename, msd, args)
+        # the files are already spread over the worker processes, so each draws its own plots
+        if args.plot_format: plotCaptures(filename, groups, set(msd.plotChannels()), args, maxMode, workers=1)
+        summary.update(summarize(msd, captures))
+    except Exception as e:
+        summary["status"] = "error"
+        summary["error"] = str(e)
+    return summary
+
+
+def writeSummary(summaryFilename, summaries):
+    """
+    writes the batch summary, as json when the filename ends in .json and as csv otherwise, in the csv the
+    triggers of a file are listed in one column as index@time=value separated by semicolons and the peak columns
+    are those of every channel seen across the batch, in the order they were first seen
+    :param summaryFilename: the name of the summary file
+    :param summaries: the list of per file summary dictionaries
+    :return: No return data.
+    """
+    if summaryFilename.lower().endswith(".json"):
+        with open(summaryFilename, 'wb') as summaryFile:
+            json.dump(summaries, summaryFile, indent=2, sort_keys=True)
+        return
+    channels = []
+    for summary in summaries:
+        channels += [name for name in summary.get("channels", []) if name not in channels]
+    columns = SUMMARY_COLUMNS + ["{}{}".format(name, field) for name in channels for field in PEAK_FIELDS] + \
+        ["triggers"]
+    with open(summaryFilename, 'wb') as summaryFile:
+        summaryWriter = csv.writer(summaryFile)
+        summaryWriter.writerow(columns)
+        for summary in summaries:
+            row = dict(summary)
+            row["triggers"] = ";".join("{index}@{time}={value}".format(**trigger)
+                                       for trigger in summary.get("triggers", []))
+            summaryWriter.writerow([row.get(column, "") for column in columns])
+
+
+def main():
+    # argument data
+    paths_help = "Paths: the CSV files, directories of CSV files or glob patterns to process"
+    workers_help = "Workers: the number of worker processes, default is the number of cores (%d)" % DEFAULT_WORKERS
+    summary_help = "Summary: the file the batch summary is written to, .csv or .json, default is %s" % \
+                   DEFAULT_SUMMARY
+    recursive_help = "Recursive: also search the subdirectories of any directories given"
+    no_export_help = "No Export: only write the summary, don't save the captures of each file"
+
+    # argument parsing section, setup and execution
+    parser = buildArgumentParser()
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=workers_help)
+    parser.add_argument("-S", "--summary", type=str, default=DEFAULT_SUMMARY, help=summary_help)
+    parser.add_argument("-r", "--recursive", action="store_true", help=recursive_help)
+    parser.add_argument("-ne", "--no-export", action="store_true", help=no_export_help)
+    parser.add_argument("paths", type=str, nargs="+", help=paths_help)
+    args = parser.parse_args()
+    checkArguments(parser, args)
+    if args.output: parser.error("-o/--output names a single file and can't be used in batch mode")
+    if args.plot: parser.error("-p/--plot opens a window per capture and can't be used in batch mode, use -pf")
+    if args.follow: parser.error("-F/--follow watches a single file and can't be used in batch mode")
+    if args.profile: parser.error("-P/--profile profiles a single file and can't be used in batch mode")
+    if args.time_window or args.sample_range:
+        parser.error("-tw/--time-window and -sr/--sample-range cut a single file and can't be used in batch mode")
+    if args.workers < 1: parser.error("-w/--workers must be at least 1")
+
+    filenames = [filename for filename in findCsvFiles(args.paths, args.recursive)
+                 if os.path.abspath(filename) != os.path.abspath(args.summary)]
+    if not filenames:
+        print "<ERROR> no CSV files found, Exiting."
+        sys.exit(1)
+    print "<-> Processing {} files with {} workers..".format(len(filenames), min(args.workers, len(filenames)))
+    jobs = [(filename, args, not args.no_export) for filename in filenames]
+    if args.workers == 1 or len(filenames) == 1:
+        results = map(processFile, jobs)
+    else:
+        pool = multiprocessing.Pool(min(args.workers, len(filenames)))
+        try:
+            results = pool.map(processFile, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    failed = [summary for summary in results if summary["status"] != "ok"]
+    for summary in failed:
+        print "<WARNING> skipped {}; {}".format(summary["file"], summary["error"])
+    writeSummary(args.summary, results)
+    print "<+> Summary of {} files ({} skipped) saved to {}".format(len(results), len(failed), args.summary)
+    print "<!> Processing complete, Exiting"
+
+
+if __name__ == "__main__": main()
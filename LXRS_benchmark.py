@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from LXRS_csv_file_processor import MicroStrainData, CaptureExporter, columnExtremes, plotLines, renderPlots, \
+    captureFilenames, peakMemory, DEFAULT_NUM_CAPTURES
+from LXRS_data_generator import generateFile
+"""
+    This script times each stage of LXRS_csv_file_processor.py on synthetic Sensor Connect files of growing
+length made by LXRS_data_generator.py, for example,
+
+    LXRS_benchmark.py -z 1e4,1e6,1e7 -b benchmark_baseline.json
+
+    Every size is run in a fresh worker process so the peak memory of one doesn't carry over into the next. For each
+stage the time taken, the rows per second and the peak memory of the process by the end of the stage are reported.
+When a baseline file is given the run is compared against it and the script exits with status 1 if any stage has
+slowed down by more than the tolerance, -s saves the run as the new baseline instead.
+"""
+
+# constants
+# ------------------------
+STAGES = ["header", "parse", "peaks", "sliceMax", "sliceNumTriggers", "export", "plot"]
+DEFAULT_SIZES = "1e4,1e5,1e6"
+DEFAULT_NODES = 1
+DEFAULT_TOLERANCE = 0.25
+# stages quicker than this are too noisy to compare against the baseline
+MIN_COMPARED_SECONDS = 0.05
+
+
+def benchmarkFile(filename, captures=DEFAULT_NUM_CAPTURES):
+    """
+    runs every stage over one csv file, the parse stage includes the peak search and sample rate measurement.
+    MicroStrainData leaves those until they are first asked for, so the parse stage asks for them itself, otherwise
+    their cost would move into sliceMax and neither stage would compare with a baseline saved before they were lazy.
+    The peaks stage repeats the peak search on its own
+    :param filename: the csv file
+    :param captures: the number of captures sliceNumTriggers cuts
+    :return: a dictionary of stage name to a dictionary of seconds, rows, rowsPerSecond and peakMemory
+    """
+    results = {}
+    state = {}
+
+    def stage(name, rows, work):
+        started = time.time()
+        state[name] = work()
+        results[name] = {"seconds": time.time() - started, "rows": rows, "peakMemory": peakMemory()}
+    stage("header", 0, lambda: MicroStrainData(filename, stream=True, cache="off"))
+
+    def parse():
+        loaded = MicroStrainData(filename, cache="off")
+        loaded.maxExtremes, loaded.samplePeriod
+        return loaded
+    stage("parse", None, parse)
+    msd = state["parse"]
+    rows = results["parse"]["rows"] = msd.totalNumSamples
+    stage("peaks", rows, lambda: columnExtremes(msd.getSamples()[1], 1))
+    stage("sliceMax", rows, msd.sliceMax)
+    msd.setNumCaptures(captures)
+    stage("sliceNumTriggers", rows, msd.sliceNumTriggers)
+    sliced = state["sliceNumTriggers"]
+    names = captureFilenames(filename, len(sliced))
+    captureRows = sum(len(capture) for capture in sliced)
+
+    def export():
+        exporter = CaptureExporter()
+        for name, capture in zip(names, sliced):
+            exporter.write("csv", name, capture.timestamps, capture.channels, capture.names)
+        exporter.close()
+    stage("export", captureRows, export)
+    stage("plot", captureRows, lambda: renderPlots([(name[:-4] + ".png", plotLines(capture), name)
+                                                     for name, capture in zip(names, sliced)], workers=1))
+    for result in results.values():
+        result["rowsPerSecond"] = result["rows"] / result["seconds"] if result["rows"] and result["seconds"] else None
+    return results
+
+
+def benchmarkSize(job):
+    """
+    generates a file of the given size and benchmarks it, run in a worker process of its own
+    :param job: a tuple of the row count, the directory to work in, the node count and the capture count
+    :return: the results from benchmarkFile
+    """
+    rows, directory, nodes, captures = job
+    filename = os.path.join(directory, "bench_{}.csv".format(rows))
+    generateFile(filename, rows, nodes=nodes, events=max(captures, min(rows // 1000, 100)))
+    try:
+        return benchmarkFile(filename, captures)
+    finally:
+        for name in os.listdir(directory):
+            if name.startswith("bench_{}".format(rows)): os.remove(os.path.join(directory, name))
+
+
+def compareToBaseline(run, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    finds the stages that have slowed down since the baseline, sizes and stages missing from either are skipped
+    :param run: the results of this run, size to benchmarkFile results
+    :param baseline: the results of the baseline run
+    :param tolerance: the fraction a stage may slow down by before it counts
+    :return: a list of (size, stage, baselineSeconds, seconds) tuples, one per regression
+    """
+    regressions = []
+    for size, stages in sorted(run.items(), key=lambda item: int(item[0])):
+        for name in STAGES:
+            if name not in stages or name not in baseline.get(size, {}): continue
+            before, now = baseline[size][name]["seconds"], stages[name]["seconds"]
+            if now > MIN_COMPARED_SECONDS and now > before * (1 + tolerance):
+                regressions.append((size, name, before, now))
+    return regressions
+
+
+def printResults(run):
+    """
+    prints a table of the results of a run, one line per size and stage
+    :return: No return data.
+    """
+    print "{:>11} {:>17} {:>10} {:>14} {:>12}".format("rows", "stage", "seconds", "rows/sec", "peak MB")
+    for size, stages in sorted(run.items(), key=lambda item: int(item[0])):
+        for name in STAGES:
+            result = stages[name]
+            rate = "{:,.0f}".format(result["rowsPerSecond"]) if result["rowsPerSecond"] else "-"
+            memory = "{:.1f}".format(result["peakMemory"]) if result["peakMemory"] is not None else "-"
+            print "{:>11} {:>17} {:>10.4f} {:>14} {:>12}".format(size, name, result["seconds"], rate, memory)
+
+
+def main():
+    # argument data
+    sizes_help = "Sizes: a comma separated list of row counts to benchmark, 1e6 style allowed, up to 1e8. " + \
+                 "Default is %s" % DEFAULT_SIZES
+    nodes_help = "Nodes: the number of 3 channel wireless nodes in the generated files. Default is %d" % \
+                 DEFAULT_NODES
+    captures_help = "Captures: the number of captures sliced, exported and plotted. Default is %d" % \
+                    DEFAULT_NUM_CAPTURES
+    baseline_help = "Baseline: a json file of earlier results to compare against, the run fails if a stage is " + \
+                    "slower than it by more than the tolerance"
+    save_help = "Save: write the results of this run to the baseline file instead of comparing"
+    tolerance_help = "Tolerance: the fraction a stage may slow down by before it fails. Default is %s" % \
+                     DEFAULT_TOLERANCE
+    output_help = "Output: also write the results of this run to this json file"
+    directory_help = "Directory: where the generated files are written, default is a temporary directory"
+
+    # argument parsing section, setup and execution
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-z", "--sizes", type=str, default=DEFAULT_SIZES, help=sizes_help)
+    parser.add_argument("-N", "--nodes", type=int, default=DEFAULT_NODES, help=nodes_help)
+    parser.add_argument("-n", "--captures", type=int, default=DEFAULT_NUM_CAPTURES, help=captures_help)
+    parser.add_argument("-b", "--baseline", type=str, help=baseline_help)
+    parser.add_argument("-s", "--save", action="store_true", help=save_help)
+    parser.add_argument("-t", "--tolerance", type=float, default=DEFAULT_TOLERANCE, help=tolerance_help)
+    parser.add_argument("-o", "--output", type=str, help=output_help)
+    parser.add_argument("-d", "--directory", type=str, help=directory_help)
+    args = parser.parse_args()
+    try:
+        sizes = [int(float(size)) for size in args.sizes.split(",")]
+    except ValueError:
+        parser.error("-z/--sizes must be a comma separated list of numbers")
+    if args.save and not args.baseline: parser.error("-s/--save needs a baseline file, -b")
+
+    directory = args.directory or tempfile.mkdtemp(prefix="lxrs_bench_")
+    run = {}
+    try:
+        for rows in sizes:
+            print "<-> Benchmarking {:,} rows..".format(rows)
+            # a new process for every size so peak memory is measured from scratch
+            pool = multiprocessing.Pool(1)
+            try:
+                run[str(rows)] = pool.apply(benchmarkSize, ((rows, directory, args.nodes, args.captures),))
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        if not args.directory: shutil.rmtree(directory, ignore_errors=True)
+    print ""
+    printResults(run)
+    if args.output:
+        with open(args.output, 'wb') as outputFile:
+            json.dump(run, outputFile, indent=2, sort_keys=True)
+
+    if args.save:
+        with open(args.baseline, 'wb') as baselineFile:
+            json.dump(run, baselineFile, indent=2, sort_keys=True)
+        print "<+> Baseline saved to {}".format(args.baseline)
+    elif args.baseline:
+        with open(args.baseline, 'rb') as baselineFile:
+            regressions = compareToBaseline(run, json.load(baselineFile), args.tolerance)
+        for size, name, before, now in regressions:
+            print "<REGRESSION> {} rows, {}; {:.4f}s, was {:.4f}s".format(size, name, now, before)
+        if regressions:
+            print "<ERROR> {} stages slower than the baseline. Exiting.".format(len(regressions))
+            sys.exit(1)
+        print "<+> No stage slower than the baseline"
+    print "<!> Benchmark complete, Exiting"
+
+
+if __name__ == "__main__": main()
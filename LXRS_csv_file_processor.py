@@ -3,9 +3,28 @@ import argparse
 import os
 import sys
 import re
+import json
+import math
+import mmap
+import time
+import bisect
+import struct
+import string
+import hashlib
+import warnings
+import cProfile
+import multiprocessing
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from fractions import Fraction
-from datetime import datetime
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+try:
+    import resource
+except ImportError:  # not on Windows, peak memory is left out of the profile there
+    resource = None
 """
     This script if for processing of accelerometer *.csv data produced by LORD MicroStrain's Sensor Connect
 software. It takes one non-optional argument namely the sample file name for example,
@@ -20,10 +39,13 @@ arguments or in the constants block directly below this message.
 # constants
 # ------------------------
 # the x,y,z constants refer to which channel is which when you look at the device in such a way the writing on top
-# is oriented correctly
+# is oriented correctly, they apply to every node logging exactly three channels, any other node's channels keep
+# the chN names Sensor Connect gives them
 X_CHANNEL = 2
 Y_CHANNEL = 1
 Z_CHANNEL = 3
+AXIS_NAMES = "xyz"
+CHANNEL_NAME_RE = re.compile(r"ch(\d+)$")
 TIME_FORMAT = "%m/%d/%y %H:%M:%S.%f"
 MINUTES_ONLY = "%M:%S.%f"
 SECONDS_ONLY = "%S.%f"
@@ -37,82 +59,1962 @@ DEFAULT_TRIGGER_AXIS = "xyz"
 DEFAULT_SAMPLE_SIZE = 300
 DEFAULT_LOCATION_COEFFICIENT = Fraction(1, 5)
 DEFAULT_POLARITY = '+-'
+DEFAULT_NUM_PEAKS = 1
+# event mode finds every excursion of the trigger axes above THRESHOLD g, an event lasts until the signal drops back
+# under the re-arm threshold, which defaults to REARM_FRACTION of the threshold.  Events shorter than MIN_DURATION
+# samples are dropped and one starting less than HOLDOFF samples after the last ended is folded into it
+DEFAULT_EVENT_MODE = False
+DEFAULT_THRESHOLD = 2.0
+DEFAULT_REARM_FRACTION = 0.5
+DEFAULT_MIN_DURATION = 1
+DEFAULT_HOLDOFF = 0
+# captures are saved in one of EXPORT_FORMATS, each to its own file or all to one combined file.  Once the captures
+# are cut the files are formatted and written on EXPORT_THREADS background threads at the same time
+DEFAULT_EXPORT_FORMAT = "csv"
+EXPORT_FORMATS = ["csv", "npy", "npz", "bin"]
+DEFAULT_EXPORT_THREADS = 4
+CAPTURE_MAGIC = "LXRSCAPT"
+CAPTURE_VERSION = 1
+# follow mode checks the file for new rows every DEFAULT_FOLLOW_INTERVAL seconds, a capture is written at most that
+# long after the last row of its window reaches the disk
+DEFAULT_FOLLOW_INTERVAL = 0.25
+# the stages a StageProfiler times, stream is the whole single pass of stream mode (parse, peaks and slicing together)
+PROFILE_STAGES = ["open", "header", "sniff", "cache", "parse", "peaks", "sampleRate", "cacheSave", "slice", "stream",
+                  "events", "index", "window", "derive", "spectrum", "export", "plot"]
+EVENT_INDEX_COLUMNS = ["event", "start", "peak", "end", "startTime", "peakTime", "endTime", "peakValue", "channel"]
 DEFAULT_PLOT_TITLE = "G-Force Over Time"
 PLOT_LEGEND_LOCATION = "lower left"
+PLOT_STYLES = {"x": 'b-', "y": 'g-', "z": 'r-'}
+# every plotted channel is cut down to the minimum and maximum of DEFAULT_PLOT_POINTS buckets, plots saved to file
+# are drawn off screen by DEFAULT_PLOT_WORKERS processes at PLOT_SIZE inches and PLOT_DPI
+DEFAULT_PLOT_POINTS = 2000
+DEFAULT_PLOT_WORKERS = multiprocessing.cpu_count()
+PLOT_FORMATS = ["png", "svg"]
+PLOT_SIZE = (12, 6)
+PLOT_DPI = 100
+# the extremes of files with more than one node are searched for on this many threads, the single largest and
+# smallest values are found EXTREME_CHUNK_SIZE rows at a time
+PEAK_SEARCH_THREADS = multiprocessing.cpu_count()
+EXTREME_CHUNK_SIZE = 64 * 1024
+# sample data is held column wise, timestamps as int64 nanoseconds since the epoch and the channels as a contiguous
+# float matrix, float32 halves the memory footprint of very long logs at the cost of some precision
+DEFAULT_SAMPLE_DTYPE = np.float64
+# timestamps are either decoded from every row or, in synthesized mode, built from the first row and the sample
+# rate declared in the CHANNEL_INFO block, with every SPOT_CHECK_INTERVAL'th row decoded to catch dropped packets
+DEFAULT_TIMESTAMP_MODE = "parsed"
+TIMESTAMP_MODES = ["parsed", "synthesized"]
+SPOT_CHECK_INTERVAL = 4096
+# spacing between two samples beyond this multiple of the typical sample period is reported as a gap
+GAP_TOLERANCE = 1.5
+# number of bytes of the data region the csv dialect is sniffed from
+SNIFF_SIZE = 16 * 1024
+# number of bytes of the data region handed to the bulk parser at a time, a data region longer than one chunk is
+# split into chunk sized byte ranges parsed by DEFAULT_PARSE_WORKERS processes
+PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+# number of bytes at the start of a chunk looked at for empty fields to decide whether to fill them before the bulk
+# parse, the nodes of an unsynchronised multi-node file leave empty fields on most rows
+EMPTY_FIELD_PROBE = 64 * 1024
+DEFAULT_PARSE_WORKERS = multiprocessing.cpu_count()
+DIALECT_ATTRIBUTES = ["delimiter", "quotechar", "escapechar", "doublequote", "skipinitialspace", "lineterminator",
+                      "quoting"]
+# trigger candidates are ranked RANK_CHUNK_SIZE samples at a time and screened against the dead-zones
+# SELECTION_BATCH candidates at a time
+RANK_CHUNK_SIZE = 1024 * 1024
+SELECTION_BATCH = 4096
+TIMESTAMP_RE = re.compile(r"\s*(\d+)/(\d+)/(\d+)\s+(\d+):(\d+):(\d+(?:\.\d*)?)")
+SAMPLE_RATE_RE = re.compile(r"([\d.]+)\s*([kM]?)Hz$")
+SAMPLE_RATE_PREFIXES = {"": 1, "k": 1000, "M": 1000000}
+# parsed data is cached in a binary sidecar, "use" reads it when valid and writes it otherwise, "refresh" always
+# rebuilds it and "off" ignores it, a shared cache directory is trimmed back to DEFAULT_CACHE_LIMIT megabytes
+DEFAULT_CACHE_MODE = "use"
+CACHE_MODES = ["use", "refresh", "off"]
+DEFAULT_CACHE_LIMIT = 4096
+CACHE_EXTENSION = ".lxrs"
+CACHE_MAGIC = "LXRSCACHE"
+CACHE_VERSION = 2
+CACHE_ALIGNMENT = 64
+CACHE_HASH_BLOCK = 1024 * 1024
+# the sparse time index holds the byte offset and timestamp of every INDEX_INTERVAL'th data row, it is kept next
+# to the csv (or in the cache directory) and rebuilt whenever the csv's size or mtime changes
+INDEX_INTERVAL = 4096
+INDEX_EXTENSION = ".lxrsidx"
+INDEX_MAGIC = "LXRSINDEX"
+INDEX_VERSION = 1
+# captures of the same length are stacked and transformed together, every channel tapered by one of FFT_WINDOWS
+# after its mean is taken off.  The whole file is analysed by Welch's method in WELCH_SEGMENT sample segments
+# overlapping by half, fed SAMPLE_BLOCK_SIZE rows at a time, and the DOMINANT_FREQUENCIES strongest bins of every
+# channel are summarised
+FFT_WINDOWS = {"hann": np.hanning, "hamming": np.hamming, "blackman": np.blackman, "boxcar": np.ones}
+DEFAULT_FFT_WINDOW = "hann"
+DEFAULT_WELCH_SEGMENT = 1024
+DEFAULT_DOMINANT_FREQUENCIES = 3
+SAMPLE_BLOCK_SIZE = 256 * 1024
+SPECTRUM_SUMMARY_COLUMNS = ["capture", "channel", "rank", "frequency", "density"]
+# derived channels can trigger alongside the stored ones, -a mag is the resultant magnitude of a node's x, y and z
+# and hp5(z), lp50(x), dc(z) and rms64(mag) a first order high-pass or low-pass filter, the DC (gravity) removal
+# and the moving RMS of another channel.  A filter takes its cutoff in hertz and rms its window in samples, without
+# one they use DERIVED_DEFAULTS.  The filters run over FILTER_STRETCH_DECAY e-foldings of their feedback at a time
+DERIVED_RE = re.compile(r"(hp|lp|dc|rms)([\d.]*)\((.+)\)$")
+RESULTANT_NAME = "mag"
+DERIVED_DEFAULTS = {"hp": 1.0, "lp": 50.0, "dc": 0.5, "rms": 64}
+FILTER_STRETCH_DECAY = 20.0
+# a time of the day on its own, as given to -tw
+TIME_OF_DAY_RE = re.compile(r"\s*(\d+):(\d+):(\d+(?:\.\d*)?)\s*$")
+EPOCH = datetime(1970, 1, 1)
+NANOSECONDS_PER_SECOND = 1000000000
+NANOSECONDS_PER_DAY = 86400 * NANOSECONDS_PER_SECOND
 
 
-def printSampleData(data, lC=DEFAULT_LOCATION_COEFFICIENT):
+class MicroStrainDataError(Exception):
+    """
+    Raised when a csv file can't be read or doesn't hold Sensor Connect data.
+    """
+    pass
+
+
+def datetimeToNanoseconds(dt):
+    """
+    converts a datetime object into an integer count of nanoseconds since the epoch
+    :param dt: a naive datetime object
+    :return: nanoseconds since 1970-01-01 as an int
+    """
+    delta = dt - EPOCH
+    return (delta.days * 86400 + delta.seconds) * NANOSECONDS_PER_SECOND + delta.microseconds * 1000
+
+
+def nanosecondsToDatetime(ns):
+    """
+    converts nanoseconds since the epoch back into a datetime object, datetime only holds microseconds so the
+    last three digits are truncated
+    :param ns: nanoseconds since 1970-01-01
+    :return: a datetime object
+    """
+    return EPOCH + timedelta(microseconds=int(ns) // 1000)
+
+
+def parseSampleRate(rate):
+    """
+    reads a Sensor Connect sample rate string such as "512Hz" or "2kHz"
+    :param rate: the SampleRate column of the CHANNEL_INFO block
+    :return: samples per second as a float, or None if the string isn't a rate in hertz
+    """
+    match = SAMPLE_RATE_RE.match(rate.strip())
+    if not match: return None
+    return float(match.group(1)) * SAMPLE_RATE_PREFIXES[match.group(2)]
+
+
+def parseTime(text, day=None):
+    """
+    reads a time given on the command line, either a full Sensor Connect timestamp, 02/17/17 15:31:02.5, or a time
+    of the day, 15:31:02.5, on the day of the timestamp day
+    :param text: the time
+    :param day: nanoseconds since the epoch of any time on the day a time of the day is on
+    :return: nanoseconds since the epoch
+    """
+    match = TIMESTAMP_RE.match(text)
+    if match and match.end() == len(text.rstrip()):
+        return int(decodeTimestamps(np.array([[float(f) for f in match.groups()]]))[0])
+    match = TIME_OF_DAY_RE.match(text)
+    if not match or day is None: raise MicroStrainDataError("unreadable time '{}'".format(text))
+    hour, minute, second = [float(f) for f in match.groups()]
+    return day - day % NANOSECONDS_PER_DAY + int(round(((hour * 60 + minute) * 60 + second) * NANOSECONDS_PER_SECOND))
+
+
+def decodeTimestamps(fields):
+    """
+    turns the numeric fields of a block of timestamps into nanoseconds since the epoch, all nine fractional digits
+    Sensor Connect writes are kept
+    :param fields: an (n, 6) matrix of month, day, two digit year, hour, minute and seconds
+    :return: int64 array of nanoseconds since the epoch
+    """
+    month, day, year, hour, minute = fields[:, :5].astype(np.int64).T
+    # two digit years follow strptime's %y, 69-99 are the 1900s and 00-68 the 2000s
+    year = year + np.where(year < 69, 2000, 1900)
+    days = ((year - 1970) * 12 + month - 1).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    seconds = ((days + day - 1) * 24 + hour) * 3600 + minute * 60
+    return seconds * NANOSECONDS_PER_SECOND + np.rint(fields[:, 5] * NANOSECONDS_PER_SECOND).astype(np.int64)
+
+
+def parseDataBlock(block, numColumns, delimiter=","):
+    """
+    parses a block of raw data rows in bulk, the delimiter and the timestamp punctuation are all turned into
+    whitespace so numpy reads the whole block as one run of numbers, each row then reads as month, day, year,
+    hour, minute, seconds followed by the channel values.  Empty fields, the channels of a node that had no sample
+    on a row, are filled in with nan first so they read as NaN
+    :param block: complete rows of the data region as a string
+    :param numColumns: the number of columns in a row, the timestamp included
+    :param delimiter: the csv delimiter
+    :return: an (n, numColumns + 5) float64 matrix, or None when the block has malformed fields
+    """
+    text = block.strip()
+    numRows = text.count("\n") + 1 if text else 0
+    # the nodes of a multi-node file seldom log on the same rows, so a block whose first rows have empty fields is
+    # filled before it is read, any other block is only filled when the first read of it comes up short
+    filled = hasEmptyFields(text[:text.rfind("\n", 0, EMPTY_FIELD_PROBE) + 1], delimiter)
+    if filled: text = fillEmptyFields(text, delimiter)
+    numbers = readNumbers(text, delimiter)
+    if numbers.size != numRows * (numColumns + 5) and not filled and hasEmptyFields(text, delimiter):
+        numbers = readNumbers(fillEmptyFields(text, delimiter), delimiter)
+    if numbers.size != numRows * (numColumns + 5):
+        return None
+    return numbers.reshape(numRows, numColumns + 5)
+
+
+def readNumbers(text, delimiter=","):
+    """
+    :return: every number in a block of rows as one float64 array, the fields of the timestamps included
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return np.fromstring(text.translate(string.maketrans("/:\r\n" + delimiter, "     ")), sep=" ")
+
+
+def hasEmptyFields(text, delimiter=","):
+    """
+    :return: True when a block of rows has a field with nothing in it
+    """
+    return delimiter * 2 in text or delimiter + "\r" in text or delimiter + "\n" in text or text.endswith(delimiter)
+
+
+def fillEmptyFields(text, delimiter=","):
+    """
+    writes nan into the empty fields of a block of rows so they read as NaN in bulk
+    :return: the filled in text
+    """
+    empty, filled = delimiter * 2, delimiter + "nan" + delimiter
+    # a replace pass fills every other field of a run of empty ones, so a second pass fills the rest
+    text = text.replace(empty, filled).replace(empty, filled)
+    for end in ("\r", "\n"):
+        text = text.replace(delimiter + end, delimiter + "nan" + end)
+    return text + "nan" if text.endswith(delimiter) else text
+
+
+def parseDataFields(block, dialect, numColumns):
+    """
+    parses a block of raw data rows, in bulk with parseDataBlock when it can take the whole block, otherwise the
+    malformed rows, those with a field too many or too few or a blank line, are picked out and only they are read
+    row by row with parseDataRows while the rest are still read in bulk
+    :param block: complete rows of the data region as a string
+    :param dialect: the csv dialect of the file
+    :param numColumns: the number of columns in a row, the timestamp included
+    :return: an (n, numColumns + 5) float64 matrix laid out the same as parseDataBlock's
+    """
+    fields = parseDataBlock(block, numColumns, dialect.delimiter)
+    if fields is not None: return fields
+    lines = [line for line in block.splitlines() if line]
+    wellFormed = np.array([line.count(dialect.delimiter) == numColumns - 1 for line in lines], dtype=bool)
+    malformed = [line for line, good in zip(lines, wellFormed) if not good]
+    fields = parseDataBlock("\n".join(line for line, good in zip(lines, wellFormed) if good), numColumns,
+                            dialect.delimiter)
+    rows = parseDataRows("\n".join(malformed), dialect, numColumns)
+    # a bad value in a row that looks whole, or a quoted field running over a line end, sends the block row by row
+    if fields is None or len(rows) != len(malformed): return parseDataRows(block, dialect, numColumns)
+    merged = np.empty((len(lines), numColumns + 5))
+    merged[wellFormed], merged[~wellFormed] = fields, rows
+    return merged
+
+
+def parseDataRows(block, dialect, numColumns):
+    """
+    row by row fallback for rows parseDataBlock can't take in bulk, empty channel values come out as NaN
+    :param block: complete rows of the data region as a string
+    :param dialect: the csv dialect of the file
+    :param numColumns: the number of columns in a row, the timestamp included
+    :return: an (n, numColumns + 5) float64 matrix laid out the same as parseDataBlock's
+    """
+    rows = []
+    for row in csv.reader(block.splitlines(), dialect):
+        if not row: continue
+        match = TIMESTAMP_RE.match(row[0])
+        if not match:
+            raise MicroStrainDataError("unreadable timestamp '{}'".format(row[0]))
+        values = [float(v) if v.strip() else np.nan for v in row[1:numColumns]]
+        values += [np.nan] * (numColumns - 1 - len(values))
+        rows.append([float(f) for f in match.groups()] + values)
+    return np.array(rows, dtype=np.float64).reshape(-1, numColumns + 5)
+
+
+def scanPreamble(data):
+    """
+    finds the DATA_START tag of a Sensor Connect file and reads the preamble sections before it in one pass
+    :param data: the contents of the file, a string or a memory map of it
+    :return: a tuple of the preamble sections, section name (FILE_INFO, SESSION_INFO, CHANNEL_INFO, ...) to the list
+    of rows in that section split on commas, the offset of the column title row and the offset of the first data row
+    """
+    tag = data.find("DATA_START")
+    if tag < 0:
+        raise MicroStrainDataError('Did not find DATA_START tag in CSV file, ' +
+                                   'likely it did not come from the Sensor Connect software')
+    titleStart = data.find("\n", tag) + 1 or len(data)
+    dataStart = data.find("\n", titleStart) + 1 or len(data)
+    sections, rows = {}, None
+    for line in data[:data.rfind("\n", 0, tag) + 1].split("\n"):
+        line = line.strip()
+        if not line:
+            rows = None
+        elif rows is None:
+            rows = sections.setdefault(line, [])
+        else:
+            rows.append(line.split(","))
+    return sections, titleStart, dataStart
+
+
+def splitRanges(data, start, stop, size=PARSE_CHUNK_SIZE):
+    """
+    splits a stretch of the file into byte ranges of about size bytes that each end on a whole row
+    :return: a list of (start, stop) offsets covering start to stop
+    """
+    ranges = []
+    while start < stop:
+        end = data.find("\n", min(start + size, stop) - 1, stop) + 1 or stop
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def countRows(data, start, stop):
+    """
+    :return: the most rows data[start:stop] can hold, the number of line ends plus a last row without one
+    """
+    return data[start:stop].count("\n") + (1 if stop > start and data[stop - 1] != "\n" else 0)
+
+
+def parseRange(data, start, stop, numColumns, dialect, columns, dtype, spotFrom=None):
+    """
+    parses the whole rows of a byte range of the data region, in bulk where parseDataBlock can take them and row by
+    row otherwise
+    :param data: the contents of the file, a string or a memory map of it
+    :param numColumns: the number of columns in a row, the timestamp included
+    :param dialect: the csv dialect of the file
+    :param columns: the field of each stored channel in a row of the parseDataBlock matrix
+    :param dtype: the numpy type the channels are stored as
+    :param spotFrom: for synthesized timestamps, the row of the file the range starts at, only every
+    SPOT_CHECK_INTERVAL'th row of the file and the last row of the range then have their timestamps decoded
+    :return: a tuple of the rows of the range the timestamps belong to (None when every row is decoded), the
+    timestamp array and the channel matrix
+    """
+    block = data[start:stop]
+    fields = parseDataFields(block, dialect, numColumns)
+    if spotFrom is None: return None, decodeTimestamps(fields[:, :6]), fields[:, columns].astype(dtype)
+    spots = np.arange(-spotFrom % SPOT_CHECK_INTERVAL, len(fields), SPOT_CHECK_INTERVAL)
+    if len(fields): spots = np.append(spots, len(fields) - 1)
+    return spots, decodeTimestamps(fields[spots, :6]), fields[:, columns].astype(dtype)
+
+
+def buildDialect(attributes):
+    """
+    rebuilds a sniffed csv dialect from its attributes, the dialect classes the sniffer makes can't be pickled over
+    to a worker process but their attributes can
+    :param attributes: a dictionary of the DIALECT_ATTRIBUTES of the dialect
+    :return: the dialect
+    """
+    class SniffedDialect(csv.Dialect):
+        pass
+    for name, value in attributes.items():
+        setattr(SniffedDialect, name, value)
+    return SniffedDialect
+
+
+# the memory map and shared arrays of a parse worker process, set up once per process by initParseWorker
+parseWorkerState = {}
+
+
+def initParseWorker(filename, settings=None, timestampBuffer=None, channelBuffer=None):
+    """
+    maps the csv file into a parse worker process and, for the parse pass, views the shared arrays the rows are
+    written to
+    :param filename: the csv file
+    :param settings: a tuple of numColumns, the dialect attributes, columns, the channel dtype string and whether
+    the timestamps are synthesized
+    :param timestampBuffer: the shared timestamp array as a multiprocessing.RawArray of bytes, unused when the
+    timestamps are synthesized
+    :param channelBuffer: the shared channel matrix as a multiprocessing.RawArray of bytes
+    :return: No return data.
+    """
+    with open(filename, 'rb') as csvFile:
+        parseWorkerState["data"] = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ)
+    if settings is None: return
+    numColumns, attributes, columns, dtype, synthesize = settings
+    parseWorkerState["settings"] = (numColumns, buildDialect(attributes), columns, dtype, synthesize)
+    if not synthesize: parseWorkerState["timestamps"] = np.frombuffer(timestampBuffer, dtype=np.int64)
+    parseWorkerState["channels"] = np.frombuffer(channelBuffer, dtype=dtype).reshape(-1, len(columns))
+
+
+def countRangeWorker(byteRange):
+    """
+    :return: the countRows of a byte range of the file mapped by initParseWorker
+    """
+    return countRows(parseWorkerState["data"], *byteRange)
+
+
+def parseRangeWorker(job):
+    """
+    parses a byte range of the file mapped by initParseWorker straight into the shared arrays
+    :param job: a tuple of the start and stop of the byte range and the row of the shared arrays it starts at
+    :return: a tuple of the number of rows written and, when the timestamps are synthesized, the spot check rows
+    of the range and their timestamps as returned by parseRange
+    """
+    start, stop, offset = job
+    numColumns, dialect, columns, dtype, synthesize = parseWorkerState["settings"]
+    spots, timestamps, channels = parseRange(parseWorkerState["data"], start, stop, numColumns, dialect, columns,
+                                             dtype, offset if synthesize else None)
+    parseWorkerState["channels"][offset:offset + len(channels)] = channels
+    if synthesize: return len(channels), spots, timestamps
+    parseWorkerState["timestamps"][offset:offset + len(channels)] = timestamps
+    return len(channels), None, None
+
+
+def buildChannelMap(titles):
+    """
+    works out the channel map from the column titles of the data region, Sensor Connect titles every channel column
+    node:chN.  The channels of a node logging exactly three of them are named x, y and z following X_CHANNEL,
+    Y_CHANNEL and Z_CHANNEL and stored in that order, the channels of any other node keep their own names
+    :param titles: the column titles after the Time column
+    :return: a list of (node, name, column) tuples in the order the channels are stored, column is the position of
+    the channel in a data row counting from 1 after the timestamp
+    """
+    nodes, channels = [], {}
+    for column, title in enumerate(titles, 1):
+        node, separator, name = title.strip().rpartition(":")
+        if node not in channels:
+            nodes.append(node)
+            channels[node] = []
+        channels[node].append((name, column))
+    channelMap = []
+    for node in nodes:
+        numbers = [CHANNEL_NAME_RE.match(name) for name, column in channels[node]]
+        numbers = [int(match.group(1)) if match else position + 1 for position, match in enumerate(numbers)]
+        if sorted(numbers) == [1, 2, 3]:
+            columns = dict(zip(numbers, [column for name, column in channels[node]]))
+            channelMap += [(node, axis, columns[number])
+                           for axis, number in zip(AXIS_NAMES, [X_CHANNEL, Y_CHANNEL, Z_CHANNEL])]
+        else:
+            channelMap += [(node, name, column) for name, column in channels[node]]
+    return channelMap
+
+
+def columnExtremes(block, k, pool=None):
+    """
+    finds the k largest and k smallest values of every column of a block of channel values, an empty cell (NaN)
+    never counts as an extreme
+    :param block: an (n, m) matrix of channel values
+    :param k: the number of values wanted per column
+    :param pool: a thread pool to spread the work over, numpy lets go of the GIL for the passes over the block
+    :return: a list of largest and a list of smallest index arrays, one per column, as returned by topExtremes
+    """
+    run = pool.map if pool is not None else map
+    if k == 1 and len(block):
+        # reducing along the rows of the matrix is much quicker than an argmax down each column, so every chunk of
+        # rows is reduced to its extremes across all the nodes at once and the index is only looked for in the chunk
+        # an extreme first shows up in
+        reduced = run(lambda start: (np.fmax.reduce(block[start:start + EXTREME_CHUNK_SIZE], axis=0),
+                                     np.fmin.reduce(block[start:start + EXTREME_CHUNK_SIZE], axis=0)),
+                      range(0, len(block), EXTREME_CHUNK_SIZE))
+        found = []
+        for side, missing in ((0, -np.inf), (1, np.inf)):
+            chunks = np.array([extremes[side] for extremes in reduced])
+            chunks[np.isnan(chunks)] = missing
+            best = chunks.argmax(axis=0) if side == 0 else chunks.argmin(axis=0)
+            indexes = []
+            for col, chunk in enumerate(best):
+                start = chunk * EXTREME_CHUNK_SIZE
+                rows = block[start:start + EXTREME_CHUNK_SIZE, col]
+                indexes.append(np.array([start + np.argmax(rows == chunks[chunk, col])]))
+            found.append(indexes)
+        return found
+
+    def search(col):
+        column = block[:, col]
+        missing = np.isnan(column)
+        if not missing.any(): return topExtremes(column, k), topExtremes(-column, k)
+        return topExtremes(np.where(missing, -np.inf, column), k), topExtremes(np.where(missing, -np.inf, -column), k)
+    found = run(search, range(block.shape[1]))
+    return [high for high, low in found], [low for high, low in found]
+
+
+def topExtremes(column, k):
+    """
+    finds the k largest values of a column, only a partition of the column is needed rather than a full sort
+    :param column: a 1d array of values
+    :param k: the number of values wanted
+    :return: int array of up to k indexes, largest value first and the earlier sample first on a tie
+    """
+    if k == 1 and len(column):
+        return np.array([column.argmax()])
+    if k >= len(column):
+        candidates = np.arange(len(column))
+    else:
+        threshold = np.partition(column, len(column) - k)[len(column) - k]
+        candidates = np.flatnonzero(column >= threshold)
+    return candidates[np.lexsort((candidates, -column[candidates]))][:k]
+
+
+def triggerScores(channels, axes, polarity):
+    """
+    builds the matrix triggers are ranked on, one column per trigger axis, positive polarity ranks on the value,
+    negative on the negated value and both on the magnitude
+    :param channels: (n, m) channel matrix
+    :param axes: list of trigger axis columns, None when channels already holds just the trigger axes (as returned
+    by TriggerSources.feed)
+    :param polarity: "+", "-" or "+-"
+    :return: an (n, len(axes)) matrix of trigger scores
+    """
+    columns = channels if axes is None else channels[:, axes]
+    if polarity == "+":
+        return columns
+    if polarity == "-":
+        return -columns
+    return np.abs(columns)
+
+
+def fillForward(values, last):
+    """
+    :param values: a 1d array, NaN for an empty cell
+    :param last: the value before the first one
+    :return: a copy of values with every NaN replaced by the value before it
+    """
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[index], last)
+
+
+def firstOrderFilter(inputs, decay, state=0.0):
+    """
+    runs the recursion y[n] = decay * y[n - 1] + inputs[n] over a block without a loop per sample.  Inside a stretch
+    of rows it is a cumulative sum of the inputs weighted by decay ** -k, the stretches are kept short enough for
+    those weights to stay within exp(FILTER_STRETCH_DECAY) and are joined up by carrying the last output of each
+    into the next
+    :param inputs: the 1d block of inputs
+    :param decay: the feedback coefficient, between 0 and 1
+    :param state: the output before the first row of the block
+    :return: the outputs, as many as inputs
+    """
+    n = len(inputs)
+    if not n: return np.empty(0)
+    length = max(1, min(n, int(FILTER_STRETCH_DECAY / -math.log(decay))))
+    stretches = np.zeros(-(-n // length) * length)
+    stretches[:n] = inputs
+    stretches = stretches.reshape(-1, length)
+    powers = decay ** np.arange(length)
+    # the response of every stretch on its own, then what the output before it adds as it dies away
+    local = np.cumsum(stretches / powers, axis=1) * powers
+    decayed = powers * decay
+    carry = np.empty(len(stretches))
+    for j in range(len(stretches)):
+        carry[j] = state
+        state = local[j, -1] + decayed[-1] * state
+    return (local + carry[:, np.newaxis] * decayed).ravel()[:n]
+
+
+def movingRms(values, window, history):
+    """
+    works out the RMS of the last window samples at every row of a block, fewer at the start of the file
+    :param values: the 1d block of samples
+    :param window: the number of samples averaged
+    :param history: the squares of up to window - 1 samples before the block
+    :return: the RMS of every row and the history for the next block
+    """
+    squares = np.concatenate((history, values * values))
+    sums = np.concatenate(([0.0], np.cumsum(squares)))
+    rows = np.arange(len(history), len(squares)) + 1
+    counts = np.minimum(rows, window)
+    mean = np.maximum(sums[rows] - sums[rows - counts], 0) / counts
+    return np.sqrt(mean), squares[len(squares) - (window - 1):] if window > 1 else np.empty(0)
+
+
+class DerivedChannel:
+    """
+    A trigger source worked out from the stored channels, kind is RESULTANT_NAME for the resultant magnitude of the
+    store columns in source, or one of the DERIVED_RE filters of source, a store column or another DerivedChannel.
+    parameter is the filter cutoff in hertz or the RMS window in samples and name what -a calls it.
+    """
+    def __init__(self, name, kind, source, parameter=None):
+        self.name = name
+        self.kind = kind
+        self.source = source
+        self.parameter = parameter
+
+
+class DerivedState:
+    """
+    Works out a DerivedChannel a block of consecutive rows at a time, the filter outputs and the squares of the RMS
+    window are carried from one block to the next.  The filters start out settled on the first sample and an empty
+    cell is held at the sample before it, its own output is left empty.
+    """
+    def __init__(self, channel, sampleFrequency):
+        self.channel = channel
+        self.source = DerivedState(channel.source, sampleFrequency) if isinstance(channel.source, DerivedChannel) \
+            else channel.source
+        self.last = None
+        if channel.kind in ("hp", "lp", "dc"):
+            if not 0 < channel.parameter < sampleFrequency / 2.0:
+                raise MicroStrainDataError("the cutoff of {} must be above 0 and below {:g}Hz, half the sample "
+                                           "rate".format(channel.name, sampleFrequency / 2.0))
+            resistance = 1.0 / (2 * math.pi * channel.parameter)
+            self.decay = resistance / (resistance + 1.0 / sampleFrequency)
+
+    def feed(self, channels):
+        """
+        :param channels: the next (n, m) block of the channel matrix
+        :return: the derived channel over the block
+        """
+        kind = self.channel.kind
+        if kind == RESULTANT_NAME:
+            components = channels[:, self.source].astype(np.float64)
+            return np.sqrt((components * components).sum(axis=1))
+        values = self.source.feed(channels) if isinstance(self.source, DerivedState) else \
+            channels[:, self.source].astype(np.float64)
+        valid = ~np.isnan(values)
+        outputs = np.full(len(values), np.nan)
+        if not valid.any(): return outputs
+        if self.last is None:
+            self.last = values[valid][0]
+            self.output = 0.0 if kind == "hp" else self.last
+            self.history = np.empty(0)
+        values = fillForward(values, self.last)
+        if kind == "rms":
+            derived, self.history = movingRms(values, self.channel.parameter, self.history)
+        else:
+            inputs = self.decay * np.diff(values, prepend=self.last) if kind == "hp" else (1 - self.decay) * values
+            derived = firstOrderFilter(inputs, self.decay, self.output)
+            self.output = derived[-1]
+            if kind == "dc": derived = values - derived
+        self.last = values[-1]
+        outputs[valid] = derived[valid]
+        return outputs
+
+
+class TriggerSources:
+    """
+    Works out the trigger axes a block of consecutive rows at a time, store columns are taken as they are and
+    derived channels through a DerivedState each.  The filters need the sample rate, the measured one when given and
+    otherwise the typical spacing of the first block.
+    """
+    def __init__(self, axes, sampleFrequency=0.0):
+        self.axes = axes
+        self.sampleFrequency = sampleFrequency
+        self.states = None
+
+    def feed(self, timestamps, channels):
+        """
+        :param timestamps: the timestamps of the next block
+        :param channels: its (n, m) channel matrix
+        :return: an (n, len(axes)) matrix with a column per trigger axis
+        """
+        if self.states is None:
+            if not self.sampleFrequency and len(timestamps) > 1:
+                self.sampleFrequency = NANOSECONDS_PER_SECOND / float(np.median(np.diff(timestamps)) or 1)
+            self.states = [DerivedState(axis, self.sampleFrequency) if isinstance(axis, DerivedChannel) else axis
+                           for axis in self.axes]
+        if not any(isinstance(state, DerivedState) for state in self.states): return channels[:, self.states]
+        return np.column_stack([state.feed(channels) if isinstance(state, DerivedState) else channels[:, state]
+                                for state in self.states])
+
+
+def candidateLimit(numTriggers, numAxes, deadzone):
+    """
+    the number of ranked candidates that is guaranteed to hold every trigger selectTriggers would pick from the full
+    data, each candidate ranked above the last trigger is either a trigger itself or lies in the dead-zone of one,
+    and a dead-zone covers at most 2 * deadzone samples on each axis
+    :return: the candidate count as an int
+    """
+    return int(numTriggers * (1 + numAxes * max(2 * deadzone, 1)))
+
+
+def rankCandidates(scores, limit, offset=0, candidates=None):
+    """
+    picks the best trigger candidates out of a block of trigger scores, ranked on score with ties going to the
+    earlier trigger axis and then the earlier sample, only samples with a positive score can trigger
+    :param scores: (n, numAxes) matrix of trigger scores
+    :param limit: the number of candidates to keep
+    :param offset: sample index of the first row of scores
+    :param candidates: candidates kept from earlier blocks to be merged with the new ones
+    :return: a tuple of (score, axis, index) arrays in rank order, at most limit long
+    """
+    if limit <= 0:
+        return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    floor = candidates[0][-1] if candidates is not None and len(candidates[0]) >= limit else 0
+    with np.errstate(invalid="ignore"):
+        # the empty cells of a multi-node file score NaN and never pass either test
+        rows, axes = np.nonzero((scores > 0) & (scores >= floor))
+    values = scores[rows, axes]
+    if len(values) > limit:
+        # everything tied with the limit'th best score is kept so the tie break below stays exact
+        threshold = np.partition(values, len(values) - limit)[len(values) - limit]
+        keep = values >= threshold
+        rows, axes, values = rows[keep], axes[keep], values[keep]
+    index = rows.astype(np.int64) + offset
+    if candidates is not None:
+        values = np.concatenate((candidates[0], values))
+        axes = np.concatenate((candidates[1], axes))
+        index = np.concatenate((candidates[2], index))
+    order = np.lexsort((index, axes, -values))[:limit]
+    return values[order], axes[order], index[order]
+
+
+def selectTriggers(candidates, numTriggers, deadzone):
+    """
+    greedy selection over ranked candidates, the best candidate becomes a trigger and lays a dead-zone over the
+    samples [index - deadzone, index + deadzone) around it, the best candidate left outside every dead-zone is the
+    next trigger and so on.  The triggers are kept as a sorted list of positions so a dead-zone check is a binary
+    search, and each batch of candidates is screened against the triggers found so far in one go before the few
+    that are left are walked in rank order
+    :param candidates: (score, axis, index) arrays in rank order, as returned by rankCandidates
+    :param numTriggers: the number of triggers wanted
+    :param deadzone: the dead-zone half width in samples
+    :return: a list of (index, value) pairs in rank order, one per trigger, padded out with (0, 0) if the
+    candidates run out
+    """
+    values, index = candidates[0], candidates[2]
+    # a candidate at i is in the dead-zone of a trigger at t when i - below < t <= i + above, a trigger always
+    # covers its own sample even with no dead-zone
+    below, above = max(deadzone, 1), max(deadzone, 0)
+    positions = []
+    triggers = []
+    for start in range(0, len(index), SELECTION_BATCH):
+        batch = index[start:start + SELECTION_BATCH]
+        if positions:
+            taken = np.array(positions)
+            nearest = np.searchsorted(taken, batch - below, side="right")
+            clear = (nearest == len(taken)) | (taken[np.minimum(nearest, len(taken) - 1)] > batch + above)
+        else:
+            clear = np.ones(len(batch), dtype=bool)
+        for k in np.flatnonzero(clear):
+            i = int(batch[k])
+            nearest = bisect.bisect_right(positions, i - below)
+            if nearest < len(positions) and positions[nearest] <= i + above: continue
+            bisect.insort(positions, i)
+            triggers.append((i, values[start + k]))
+            if len(triggers) == numTriggers:
+                return triggers
+    return triggers + [(0, 0)] * (numTriggers - len(triggers))
+
+
+def detectEvents(score, threshold, rearm, minDuration=DEFAULT_MIN_DURATION, holdoff=DEFAULT_HOLDOFF):
+    """
+    finds every event in a trigger score with a hysteresis comparator, the comparator arms on a sample at or above
+    threshold and re-arms on one below rearm, samples in between and empty cells (NaN) keep the state of the sample
+    before them.  The state is filled forward with a running maximum of the index of the last sample that decided it
+    so the whole score is handled in a few array passes
+    :param score: 1d array of trigger scores, one per sample
+    :param threshold: the arm threshold
+    :param rearm: the re-arm threshold, no higher than threshold
+    :param minDuration: events shorter than this many samples are dropped
+    :param holdoff: an event starting less than this many samples after the end of the last is merged into it
+    :return: a tuple of start, peak and end sample index arrays in time order, end is one past the last sample of
+    the event and peak the first sample with the highest score in it
+    """
+    with np.errstate(invalid="ignore"):
+        high = score >= threshold
+        decided = high | (score < rearm)
+    last = np.where(decided, np.arange(len(score)), -1)
+    np.maximum.accumulate(last, out=last)
+    active = (last >= 0) & high[np.maximum(last, 0)]
+    edges = np.diff(active.view(np.int8), prepend=0, append=0)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = ends - starts >= minDuration
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) > 1:
+        first = np.concatenate(([True], starts[1:] - ends[:-1] >= holdoff))
+        starts, ends = starts[first], ends[np.append(first[1:], True)]
+    if not len(starts):
+        return starts, starts.copy(), ends
+    # the highest score of each event, reduced over the [start, end) pairs, and the first sample that reaches it
+    bounds = np.column_stack((starts, ends)).ravel()
+    if bounds[-1] == len(score): bounds = bounds[:-1]
+    best = np.fmax.reduceat(score, bounds)[::2]
+    with np.errstate(invalid="ignore"):
+        rows = np.flatnonzero(high)
+    event = np.searchsorted(starts, rows, side="right") - 1
+    isPeak = (event >= 0) & (rows < ends[event]) & (score[rows] == best[event])
+    found, first = np.unique(event[isPeak], return_index=True)
+    return starts, rows[isPeak][first], ends
+
+
+def spectralDensity(segments, sampleFrequency, window=DEFAULT_FFT_WINDOW):
+    """
+    works out the one-sided power spectral density of a stack of equal length segments, every channel of every
+    segment in one batched transform.  Each channel has its mean taken off before it is tapered, so the 1g of
+    gravity doesn't swamp the low bins, and an empty cell counts as 0
+    :param segments: an (n, length, m) array, n segments of m channels
+    :param sampleFrequency: the sample rate in hertz
+    :param window: one of FFT_WINDOWS
+    :return: the frequencies of the length // 2 + 1 bins and an (n, bins, m) array of densities in g^2/Hz
+    """
+    segments = np.nan_to_num(np.asarray(segments, dtype=np.float64))
+    length = segments.shape[1]
+    taper = FFT_WINDOWS[window](length)
+    spectra = np.fft.rfft((segments - segments.mean(axis=1, keepdims=True)) * taper[:, None], axis=1)
+    density = (spectra.real ** 2 + spectra.imag ** 2) / (sampleFrequency * (taper ** 2).sum())
+    # the power of the negative frequencies is folded in, the 0Hz and (for an even length) Nyquist bins have none
+    density[:, 1:(length + 1) // 2] *= 2
+    return np.fft.rfftfreq(length, 1.0 / sampleFrequency), density
+
+
+def dominantFrequencies(frequencies, density, k=DEFAULT_DOMINANT_FREQUENCIES):
+    """
+    picks the strongest bins of every channel, the 0Hz bin is left out
+    :param frequencies: the bin frequencies
+    :param density: a (..., bins, m) array of densities as returned by spectralDensity
+    :param k: the number of bins to pick, fewer when there aren't that many
+    :return: the frequencies and densities of the picked bins, strongest first, as (..., k, m) arrays
+    """
+    order = np.argsort(-density[..., 1:, :], axis=-2, kind="mergesort")[..., :k, :] + 1
+    return frequencies[order], np.take_along_axis(density, order, axis=-2)
+
+
+class WelchAccumulator:
+    """
+    Welch's method over sample blocks fed in one at a time, the overlapping segments of each block are transformed
+    in one batch and their densities summed.  Only the samples of the unfinished segment at the end of a block are
+    kept for the next, so memory use doesn't grow with the length of the recording.
+    """
+    def __init__(self, segment=DEFAULT_WELCH_SEGMENT, window=DEFAULT_FFT_WINDOW):
+        self.segment = segment
+        self.step = segment - segment // 2
+        self.window = window
+        self.total = None
+        self.count = 0
+        self.pending = None
+
+    def add(self, channels):
+        """
+        :param channels: the next (n, m) block of samples
+        :return: No return data.
+        """
+        pending = channels if self.pending is None else np.concatenate((self.pending, channels))
+        pending = np.ascontiguousarray(pending)
+        numSegments = (len(pending) - self.segment) // self.step + 1 if len(pending) >= self.segment else 0
+        if numSegments:
+            rowStride, columnStride = pending.strides
+            segments = np.lib.stride_tricks.as_strided(pending, (numSegments, self.segment, pending.shape[1]),
+                                                       (rowStride * self.step, rowStride, columnStride))
+            # at 1Hz, the densities are scaled to the real sample rate once at the end
+            density = spectralDensity(segments, 1.0, self.window)[1].sum(axis=0)
+            self.total = density if self.total is None else self.total + density
+            self.count += numSegments
+        self.pending = pending[numSegments * self.step:].copy()
+
+    def result(self, sampleFrequency):
+        """
+        :param sampleFrequency: the sample rate in hertz
+        :return: the bin frequencies and a (bins, m) array of the densities averaged over every segment
+        """
+        if not self.count:
+            raise MicroStrainDataError("fewer samples than one {} sample Welch segment".format(self.segment))
+        return np.fft.rfftfreq(self.segment, 1.0 / sampleFrequency), self.total / (self.count * sampleFrequency)
+
+
+def writeSpectrumSummary(filename, names, groups):
+    """
+    writes the strongest frequencies of every channel, one row per SPECTRUM_SUMMARY_COLUMNS with rank 1 the strongest
+    :param filename: the name of the output file
+    :param names: the names of the m channels
+    :param groups: a list of (numbers, frequencies, densities), the frequencies and densities of the picked bins as
+    (n, k, m) arrays as returned by dominantFrequencies and numbers the capture number of each of the n rows, None
+    for a whole file spectrum
+    :return: No return data.
+    """
+    with open(filename, 'wb') as outputFile:
+        summaryWriter = csv.writer(outputFile)
+        summaryWriter.writerow(SPECTRUM_SUMMARY_COLUMNS)
+        for numbers, frequencies, densities in groups:
+            for row in range(len(frequencies)):
+                for column, name in enumerate(names):
+                    for rank in range(frequencies.shape[1]):
+                        summaryWriter.writerow([numbers[row] if numbers is not None else "", name, rank + 1,
+                                                "{:.6f}".format(frequencies[row, rank, column]),
+                                                "{:.6g}".format(densities[row, rank, column])])
+
+
+def formatTimestamps(timestamps, digits=6):
+    """
+    formats a whole array of nanosecond timestamps into TIME_FORMAT strings in one go, the date part is only run
+    through strftime once per distinct day and the time of day is written digit by digit into a byte matrix with
+    integer arithmetic on the array
+    :param timestamps: int64 array of nanoseconds since the epoch
+    :param digits: the number of fractional digits, 6 as in TIME_FORMAT or 9 as Sensor Connect writes them
+    :return: a numpy array of strings, "MM/DD/YY hh:mm:ss.uuuuuu"
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    days, timeOfDay = np.divmod(timestamps, NANOSECONDS_PER_DAY)
+    uniqueDays, dayIndex = np.unique(days, return_inverse=True)
+    dates = np.array([nanosecondsToDatetime(d * NANOSECONDS_PER_DAY).strftime(TIME_FORMAT[:9]) for d in uniqueDays],
+                     dtype="S9").view(np.uint8).reshape(-1, 9)
+    out = np.empty((len(timestamps), 18 + digits), dtype=np.uint8)
+    if not len(timestamps): return out.view("S{}".format(18 + digits)).ravel()
+    out[:, :9] = dates[dayIndex]
+    seconds, fraction = np.divmod(timeOfDay // 10 ** (9 - digits), 10 ** digits)
+    minutes, seconds = np.divmod(seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+    for column, value, width in ((9, hours, 2), (12, minutes, 2), (15, seconds, 2), (18, fraction, digits)):
+        for k in range(width):
+            out[:, column + width - 1 - k] = value // 10 ** k % 10 + ord("0")
+    out[:, 11] = out[:, 14] = ord(":")
+    out[:, 17] = ord(".")
+    return out.view("S{}".format(18 + digits)).ravel()
+
+
+def formatRows(timestamps, channels, ids=None):
+    """
+    formats sample data into csv rows in bulk, a column at a time over the whole array rather than once per row
+    through csv.writer
+    :param timestamps: int64 array of nanoseconds since the epoch
+    :param channels: the matching (n, m) channel matrix
+    :param ids: optional capture number of every row, written as the first column
+    :return: a numpy array of strings, one row each without the line ending
+    """
+    lines = formatTimestamps(timestamps)
+    if ids is not None: lines = np.char.add(np.char.add(np.asarray(ids).astype(str), ","), lines)
+    for col in range(channels.shape[1]):
+        values = channels[:, col].astype(np.float64)
+        # an empty cell of a multi-node file is written back out empty
+        values = np.where(np.isnan(values), "", values.astype(str))
+        lines = np.char.add(np.char.add(lines, ","), values)
+    return lines
+
+
+def writeCsv(filename, timestamps, channels, names, ids=None):
+    """
+    writes sample data out in the same csv layout as the data region of a Sensor Connect file, without the titles
+    :param filename: the name of the output file
+    :param timestamps: int64 array of nanoseconds since the epoch
+    :param channels: the matching (n, m) channel matrix
+    :param names: the channel names, unused as the rows carry no titles
+    :param ids: optional capture number of every row, written as the first column
+    :return: No return data.
+    """
+    lines = formatRows(timestamps, channels, ids)
+    with open(filename, 'wb') as outputFile:
+        if len(lines): outputFile.write("\r\n".join(lines) + "\r\n")
+
+
+def writeNpy(filename, timestamps, channels, names, ids=None):
+    """
+    writes sample data as a numpy structured array with a time field in nanoseconds since the epoch and a field per
+    channel, led by a capture field when ids are given
+    :return: No return data.
+    """
+    fields = ([("capture", "<i4")] if ids is not None else []) + [("time", "<i8")] + \
+        [(str(name), channels.dtype.newbyteorder("<").str) for name in names]
+    records = np.empty(len(timestamps), dtype=fields)
+    if ids is not None: records["capture"] = ids
+    records["time"] = timestamps
+    for col, name in enumerate(names):
+        records[str(name)] = channels[:, col]
+    np.save(filename, records)
+
+
+def writeNpz(filename, timestamps, channels, names, ids=None):
+    """
+    writes sample data as a numpy .npz archive holding the arrays timestamps (nanoseconds since the epoch), channels
+    (one column per name), names and, when ids are given, capture
+    :return: No return data.
+    """
+    arrays = {"timestamps": np.asarray(timestamps, dtype=np.int64), "channels": channels,
+              "names": np.array(names, dtype=str)}
+    if ids is not None: arrays["capture"] = np.asarray(ids, dtype=np.int32)
+    np.savez(filename, **arrays)
+
+
+def writeBin(filename, timestamps, channels, names, ids=None):
+    """
+    writes sample data in a plain binary layout for tools without numpy, all numbers are little endian
+
+        CAPTURE_MAGIC, 8 bytes
+        format version, uint32, CAPTURE_VERSION
+        rows n and channels m, uint64 and uint32
+        value size, uint32, 4 for float32 values and 8 for float64
+        name length, uint32, then the channel names as ascii separated by commas
+        n capture numbers, int32, all 0 when the file holds a single capture
+        n timestamps, int64 nanoseconds since the epoch
+        n * m channel values, row by row, NaN for an empty cell
+
+    :return: No return data.
+    """
+    channels = np.ascontiguousarray(channels, dtype=channels.dtype.newbyteorder("<"))
+    text = ",".join(names)
+    with open(filename, 'wb') as outputFile:
+        outputFile.write(CAPTURE_MAGIC + struct.pack("<IQIII", CAPTURE_VERSION, len(timestamps), channels.shape[1],
+                                                     channels.dtype.itemsize, len(text)) + text)
+        ids = np.zeros(len(timestamps), dtype="<i4") if ids is None else np.asarray(ids, dtype="<i4")
+        outputFile.write(ids.tobytes())
+        outputFile.write(np.asarray(timestamps, dtype="<i8").tobytes())
+        outputFile.write(channels.tobytes())
+
+
+EXPORT_WRITERS = {"csv": writeCsv, "npy": writeNpy, "npz": writeNpz, "bin": writeBin}
+
+
+class CaptureExporter:
+    """
+    Writes captures out on a pool of background threads, write() queues a file and returns straight away so several
+    files are formatted and written at the same time, close() waits for every queued file and raises the first error
+    any of them hit.  A normal run cuts every capture before queuing the first, so only the writes overlap each
+    other, follow mode queues each capture as it is cut.  With a single thread the files are written on the spot.
+    """
+    def __init__(self, threads=DEFAULT_EXPORT_THREADS):
+        self.__pool = ThreadPool(threads) if threads > 1 else None
+        self.__pending = []
+
+    def write(self, fmt, filename, timestamps, channels, names, ids=None):
+        """
+        queues a file, the arrays must not change until close() returns
+        :param fmt: one of EXPORT_FORMATS
+        :return: No return data.
+        """
+        args = (filename, timestamps, channels, names, ids)
+        if self.__pool is None: EXPORT_WRITERS[fmt](*args)
+        else: self.__pending.append(self.__pool.apply_async(EXPORT_WRITERS[fmt], args))
+
+    def close(self):
+        """
+        waits for every queued file to be written
+        :return: No return data.
+        """
+        if self.__pool is None: return
+        # every file is written once its result is in, joining the pool would only add the tenth of a second its
+        # housekeeping thread sleeps for
+        self.__pool.close()
+        for result in self.__pending: result.get()
+
+
+def writeEventIndex(filename, events):
+    """
+    writes an event index, one row per event with the EVENT_INDEX_COLUMNS columns, the end is the last sample of the
+    event
+    :param filename: the name of the output file
+    :param events: the event dictionaries, as returned by MicroStrainData.findEvents
+    :return: No return data.
+    """
+    times = {}
+    for field in ["startTime", "peakTime", "endTime"]:
+        times[field] = formatTimestamps([event[field] for event in events])
+    with open(filename, 'wb') as outputFile:
+        eventWriter = csv.writer(outputFile)
+        eventWriter.writerow(EVENT_INDEX_COLUMNS)
+        for k, event in enumerate(events):
+            eventWriter.writerow([k + 1, event["start"], event["peak"], event["end"], times["startTime"][k],
+                                  times["peakTime"][k], times["endTime"][k], event["value"], event["channel"]])
+
+
+def decimateEnvelope(x, y, buckets=DEFAULT_PLOT_POINTS):
+    """
+    cuts a series down for plotting by splitting it into equal buckets and keeping only the lowest and highest
+    sample of each, in time order, so every peak survives however many samples are dropped
+    :param x: the sample times
+    :param y: the sample values, NaN for an empty cell
+    :param buckets: the number of buckets, a series of up to twice this many samples is returned unchanged
+    :return: the kept x and y values
+    """
+    if len(y) <= 2 * buckets: return x, y
+    size = -(-len(y) // buckets)
+    buckets = -(-len(y) // size)
+    padded = np.concatenate((y, np.full(buckets * size - len(y), np.nan))).reshape(buckets, size)
+    missing = np.isnan(padded)
+    low = np.where(missing, np.inf, padded).argmin(axis=1)
+    high = np.where(missing, -np.inf, padded).argmax(axis=1)
+    index = (np.sort(np.column_stack((low, high)), axis=1) + np.arange(buckets)[:, None] * size).ravel()
+    index = np.minimum(index, len(y) - 1)
+    return x[index], y[index]
+
+
+def plotLines(capture, channels=None, points=DEFAULT_PLOT_POINTS):
+    """
+    gets the lines of a capture plot ready, the time axis is in seconds from the trigger (from the first sample when
+    the trigger isn't in the capture) and every channel is decimated with decimateEnvelope
+    :param capture: a Capture object
+    :param channels: the names of the channels to plot, every channel of the capture by default
+    :param points: the number of decimation buckets
+    :return: a list of (name, seconds, values) tuples, one per plotted channel
+    """
+    if not len(capture): return []
+    origin = capture.triggerTime()
+    if origin is None: origin = capture.timestamps[0]
+    seconds = (np.asarray(capture.timestamps) - origin) / float(NANOSECONDS_PER_SECOND)
+    lines = []
+    for col, name in enumerate(capture.names):
+        if channels is not None and name not in channels: continue
+        x, y = decimateEnvelope(seconds, np.asarray(capture.channels[:, col], dtype=np.float64), points)
+        lines.append((name, x, y))
+    return lines
+
+
+def drawLines(axes, lines, title):
+    """
+    draws the lines from plotLines onto a set of matplotlib axes
+    :return: No return data.
+    """
+    for name, x, y in lines:
+        axes.plot(x, y, PLOT_STYLES.get(name.rpartition(":")[2], '-'), label=name)
+    if lines: axes.legend(loc=PLOT_LEGEND_LOCATION)
+    axes.set_title(title)
+    axes.set_ylabel("G-Force")
+    axes.set_xlabel("Seconds from trigger")
+
+
+def renderPlot(job):
+    """
+    draws a plot straight to a file with the Agg renderer, so it needs no display and can run in a worker process
+    :param job: a tuple of the filename, the lines from plotLines and the title, the format follows the extension
+    :return: the filename
+    """
+    filename, lines, title = job
+    figure = Figure(figsize=PLOT_SIZE)
+    FigureCanvasAgg(figure)
+    drawLines(figure.add_subplot(111), lines, title)
+    figure.savefig(filename, dpi=PLOT_DPI)
+    return filename
+
+
+def renderPlots(jobs, workers=DEFAULT_PLOT_WORKERS):
+    """
+    runs renderPlot over a list of jobs on a pool of worker processes
+    :param jobs: a list of renderPlot jobs
+    :param workers: the number of processes, with one the plots are drawn in this process
+    :return: the list of files written
+    """
+    if workers == 1 or len(jobs) < 2: return map(renderPlot, jobs)
+    pool = multiprocessing.Pool(min(workers, len(jobs)))
+    try:
+        return pool.map(renderPlot, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def printSampleData(data, lC=DEFAULT_LOCATION_COEFFICIENT, names=AXIS_NAMES):
     """
     this function takes a matrix of sample data and writes it too the screen all pretty like
     :param data: formatted data, [[time1, xVal1, yVal1, zVal1], [time2, xVal2, yVal2, ZVal2], ...]
     :param lC: the location coefficient, defined as the distance into the sample where the trigger
     is located.
+    :param names: the channel names, in the order of the values in a row
     :return: No return data.
     """
+    labels = [name.upper() for name in names]
     i = 0
-    for time, x, y, z in data:
-        outputStr = "<[{}] TIME={}, X=".format(i, time.strftime(MINUTES_ONLY)).rjust(29) + \
-                    "{}, Y=".format(x).rjust(13) + \
-                    "{}, Z=".format(y).rjust(13) + \
-                    "{}>".format(z).rjust(10)
+    for row in data:
+        time, values = row[0], row[1:]
+        outputStr = "<[{}] TIME={}, {}=".format(i, time.strftime(MINUTES_ONLY), labels[0]).rjust(29)
+        for value, label in zip(values[:-1], labels[1:]):
+            outputStr += "{}, {}=".format(value, label).rjust(13)
+        outputStr += "{}>".format(values[-1]).rjust(10)
         if i == round(len(data) * lC): outputStr += " <---- Trigger"
         print outputStr
         i += 1
 
 
-class MicroStrainData:
-    """
-    This class serves to encapsulate all the data and functions relating to grabbing data from a
-    properly formatted csv file, finding peaks, and outputting it in a usable format.
-    """
-    def __init__(self, csvFilename, v=DEFAULT_VERBOSITY):
-        self.__verbosity = v
-        self.numCaptures = DEFAULT_NUM_CAPTURES
-        self.plotMode = DEFAULT_PLOT_MODE
-        self.triggerAxis = DEFAULT_TRIGGER_AXIS
-        self.__AxisLst = self.__parseAxies(self.triggerAxis)
-        self.sampleSize = DEFAULT_SAMPLE_SIZE
-        self.locationCoefficient = DEFAULT_LOCATION_COEFFICIENT
-        self.polarity = DEFAULT_POLARITY
-        self.deadzone = DEFAULT_DEADZONE
-        self.__originalFilename = csvFilename
-        self.__sampleData = self.__parseFromFile(csvFilename)
-        self.maxPeaks, self.minPeaks = self.__findMaxMinPeaks(self.__sampleData)
-        self.totalNumSamples = len(self.__sampleData)
-        self.sampleRate = self.__findSampleRate(self.__sampleData)
+def peakMemory():
+    """
+    :return: the peak resident memory of this process so far in megabytes, or None where it can't be measured
+    """
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+class NullStage:
+    """
+    Stands in for a stage timer when profiling is off, entering and leaving it does nothing and rows can be set on it
+    all the same, so the instrumented code costs an attribute lookup and a method call per stage.
+    """
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+def profileStage(profiler, name):
+    """
+    :param profiler: a StageProfiler, or None when profiling is off
+    :return: a context manager timing the named stage, NULL_STAGE when there is no profiler
+    """
+    return NULL_STAGE if profiler is None else profiler.stage(name)
+
+
+class StageTimer:
+    """
+    Times one run of a stage for a StageProfiler, set rows on it to the number of rows the stage went through.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.rows = 0
+
+    def __enter__(self):
+        self.profiler.begin(self.name)
+        self.wall, self.cpu = time.time(), sum(os.times()[:2])
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.end(self.name, time.time() - self.wall, sum(os.times()[:2]) - self.cpu, self.rows)
+        return False
+
+
+class StageProfiler:
+    """
+    Collects the wall time, CPU time (user and system), rows processed and peak memory of every stage of a run,
+    totalled over every time the stage runs.  Optionally one stage is also run under cProfile and its function level
+    profile saved next to the stats, it can be read with the pstats module or a viewer such as snakeviz.
+    """
+    def __init__(self, profileStage=None):
+        assert profileStage is None or profileStage in PROFILE_STAGES
+        self.stages = []
+        self.records = {}
+        self.profileStage = profileStage
+        self.profile = cProfile.Profile() if profileStage is not None else None
+        self.started = time.time()
+
+    def stage(self, name):
+        """
+        :return: a context manager timing one run of the named stage
+        """
+        return StageTimer(self, name)
+
+    def begin(self, name):
+        if name == self.profileStage: self.profile.enable()
+
+    def end(self, name, wall, cpu, rows):
+        if name == self.profileStage: self.profile.disable()
+        if name not in self.records:
+            self.stages.append(name)
+            self.records[name] = {"wall": 0.0, "cpu": 0.0, "rows": 0, "calls": 0}
+        record = self.records[name]
+        record["wall"] += wall
+        record["cpu"] += cpu
+        record["rows"] += rows
+        record["calls"] += 1
+        record["peakMemory"] = peakMemory()
+
+    def stats(self):
+        """
+        :return: the stats as a dictionary, "stages" holds one dictionary per stage in the order they first ran
+        with the wall and cpu seconds, rows, rowsPerSecond, calls and the peak memory in megabytes of the process
+        by the end of the stage
+        """
+        stages = []
+        for name in self.stages:
+            record = dict(self.records[name], name=name)
+            record["rowsPerSecond"] = record["rows"] / record["wall"] if record["rows"] and record["wall"] else None
+            stages.append(record)
+        return {"stages": stages, "wall": time.time() - self.started, "peakMemory": peakMemory()}
+
+    def report(self):
+        """
+        :return: a table of the stats, one line per stage
+        """
+        lines = ["{:>12} {:>10} {:>10} {:>12} {:>14} {:>10}".format("stage", "wall", "cpu", "rows", "rows/sec",
+                                                                    "peak MB")]
+        for stage in self.stats()["stages"]:
+            lines.append("{:>12} {:>10.4f} {:>10.4f} {:>12} {:>14} {:>10}".format(
+                stage["name"], stage["wall"], stage["cpu"], stage["rows"],
+                "{:,.0f}".format(stage["rowsPerSecond"]) if stage["rowsPerSecond"] else "-",
+                "{:.1f}".format(stage["peakMemory"]) if stage["peakMemory"] is not None else "-"))
+        return "\n".join(lines)
+
+    def save(self, filename):
+        """
+        writes the stats to a json file, and the cProfile of the profiled stage to the same name ending in .prof
+        :return: the list of files written
+        """
+        with open(filename, 'wb') as statsFile:
+            json.dump(self.stats(), statsFile, indent=2, sort_keys=True)
+        if self.profile is None: return [filename]
+        profileFilename = os.path.splitext(filename)[0] + ".prof"
+        self.profile.dump_stats(profileFilename)
+        return [filename, profileFilename]
+
+
+class Capture:
+    """
+    A window of sample data cropped out of a MicroStrainData object, the timestamp and channel arrays are views
+    into the parent's store so cropping never copies sample data.  Iterating over a capture yields rows in the
+    [datetime, x, y, z] format used throughout the rest of the script, with one value per entry of names.  start is
+    the sample index of the first row, triggerIndex and triggerValue the sample index and value of the trigger the
+    capture was cut around.  Captures cut around events carry the event dictionary from findEvents.
+    """
+    def __init__(self, timestamps, channels, triggerIndex=None, start=0, triggerValue=None, names=AXIS_NAMES,
+                 event=None):
+        self.timestamps = timestamps
+        self.channels = channels
+        self.triggerIndex = triggerIndex
+        self.start = start
+        self.triggerValue = triggerValue
+        self.names = list(names)
+        self.event = event
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for i in range(len(self.timestamps)):
+            yield [nanosecondsToDatetime(self.timestamps[i])] + self.channels[i].tolist()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start = self.start + slice(i.start, i.stop).indices(len(self))[0]
+            return Capture(self.timestamps[i], self.channels[i], self.triggerIndex, start, self.triggerValue,
+                           self.names, self.event)
+        return [nanosecondsToDatetime(self.timestamps[i])] + self.channels[i].tolist()
+
+    def triggerTime(self):
+        """
+        :return: the timestamp of the trigger sample in nanoseconds, or None if it falls outside the capture
+        """
+        if self.triggerIndex is None or not 0 <= self.triggerIndex - self.start < len(self): return None
+        return int(self.timestamps[self.triggerIndex - self.start])
+
+
+class SampleCache:
+    """
+    A binary sidecar holding the parsed timestamp and channel arrays of a csv file along with its header, extremes
+    and gaps, so a rerun can memory-map the arrays instead of parsing the text again.  The file is laid out as
+
+        CACHE_MAGIC, the description length as an 8 byte little endian integer, the json description padded with
+        spaces to a multiple of CACHE_ALIGNMENT bytes, the timestamps as little endian int64, and from the next
+        multiple of CACHE_ALIGNMENT bytes the little endian channel matrix in C order
+
+    An entry is keyed on the csv's size, mtime and a hash of its first and last CACHE_HASH_BLOCK bytes, along with
+    the settings that change the parsed arrays.  With no cache directory the sidecar sits next to the csv, in a
+    shared directory the least recently used entries are evicted once the directory outgrows its size limit.
+    """
+    def __init__(self, csvFilename, cacheDir=None, limit=DEFAULT_CACHE_LIMIT):
+        self.csvFilename = csvFilename
+        self.cacheDir = cacheDir
+        self.limit = limit
+        if cacheDir is None:
+            self.path = csvFilename + CACHE_EXTENSION
+        else:
+            name = hashlib.sha1(os.path.abspath(csvFilename)).hexdigest()[:16]
+            self.path = os.path.join(cacheDir, "{}.{}{}".format(os.path.basename(csvFilename), name, CACHE_EXTENSION))
+
+    def key(self, **settings):
+        """
+        identifies the current contents of the csv file
+        :param settings: anything else the cached arrays depend on
+        :return: a dictionary of the file size, mtime, content hash and settings
+        """
+        stat = os.stat(self.csvFilename)
+        digest = hashlib.sha1()
+        with open(self.csvFilename, 'rb') as csvFile:
+            digest.update(csvFile.read(CACHE_HASH_BLOCK))
+            if stat.st_size > CACHE_HASH_BLOCK:
+                csvFile.seek(max(stat.st_size - CACHE_HASH_BLOCK, CACHE_HASH_BLOCK))
+                digest.update(csvFile.read())
+        key = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest.hexdigest()}
+        key.update(settings)
+        return key
+
+    def load(self, key):
+        """
+        memory-maps the cached arrays if the cache holds an entry for key
+        :param key: the key returned by key()
+        :return: a tuple of the description dictionary, the timestamp array and the channel matrix, or None on a miss
+        """
+        try:
+            with open(self.path, 'rb') as cacheFile:
+                if cacheFile.read(len(CACHE_MAGIC)) != CACHE_MAGIC: return None
+                length = struct.unpack("<Q", cacheFile.read(8))[0]
+                description = json.loads(cacheFile.read(length))
+        except (IOError, OSError, ValueError, struct.error):
+            return None
+        if description.get("version") != CACHE_VERSION or description.get("key") != key: return None
+        rows, dtype = description["rows"], np.dtype(str(description["dtype"]))
+        dataStart = self.__align(len(CACHE_MAGIC) + 8 + length)
+        # a sidecar cut short (a full disk, a copy that stopped part way) can't be mapped, it is parsed again instead
+        expected = dataStart + self.__align(rows * 8) + rows * description["columns"] * dtype.itemsize
+        try:
+            if os.path.getsize(self.path) != expected: return None
+        except OSError:
+            return None
+        if rows:
+            timestamps = np.memmap(self.path, dtype="<i8", mode="r", offset=dataStart, shape=(rows,))
+            channels = np.memmap(self.path, dtype=dtype, mode="r", offset=dataStart + self.__align(rows * 8),
+                                 shape=(rows, description["columns"]))
+        else:
+            timestamps, channels = np.empty(0, dtype=np.int64), np.empty((0, description["columns"]), dtype=dtype)
+        if self.cacheDir is not None: os.utime(self.path, None)  # marks the entry as recently used
+        return description, timestamps, channels
+
+    def save(self, key, timestamps, channels, **contents):
+        """
+        writes a new entry, the file is written under a temporary name and moved into place so a reader never sees
+        half of it
+        :param key: the key returned by key()
+        :param timestamps: the timestamp array
+        :param channels: the channel matrix
+        :param contents: anything else to keep in the json description
+        :return: No return data.
+        """
+        channels = np.ascontiguousarray(channels, dtype=channels.dtype.newbyteorder("<"))
+        description = dict(contents, version=CACHE_VERSION, key=key, rows=len(timestamps),
+                           columns=channels.shape[1], dtype=channels.dtype.str)
+        text = json.dumps(description)
+        text += " " * (self.__align(len(CACHE_MAGIC) + 8 + len(text)) - len(CACHE_MAGIC) - 8 - len(text))
+        if self.cacheDir is not None and not os.path.isdir(self.cacheDir): os.makedirs(self.cacheDir)
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, 'wb') as cacheFile:
+                cacheFile.write(CACHE_MAGIC + struct.pack("<Q", len(text)) + text)
+                cacheFile.write(np.asarray(timestamps, dtype="<i8").tobytes())
+                cacheFile.write("\0" * (self.__align(len(timestamps) * 8) - len(timestamps) * 8))
+                cacheFile.write(channels.tobytes())
+            if os.path.exists(self.path): os.remove(self.path)
+            os.rename(temporary, self.path)
+        finally:
+            # a write that failed part way leaves no half written entry behind
+            if os.path.exists(temporary): os.remove(temporary)
+        if self.cacheDir is not None: self.evict()
+
+    def evict(self):
+        """
+        removes the least recently used entries of the cache directory until it fits in the size limit, the entry
+        belonging to this csv is never removed
+        :return: a list of the removed files
+        """
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            path = os.path.join(self.cacheDir, name)
+            if name.endswith(CACHE_EXTENSION) and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for used, size, path in entries)
+        removed = []
+        for used, size, path in sorted(entries):
+            if total <= self.limit * 1024 * 1024: break
+            if os.path.abspath(path) == os.path.abspath(self.path): continue
+            os.remove(path)
+            removed.append(path)
+            total -= size
+        return removed
+
+    def remove(self):
+        """
+        deletes this csv's entry, if there is one
+        :return: No return data.
+        """
+        if os.path.exists(self.path): os.remove(self.path)
+
+    @staticmethod
+    def __align(offset):
+        return -(-offset // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+
+
+class TimeIndex:
+    """
+    A sparse index of a csv file's data region, the byte offset and timestamp of every INDEX_INTERVAL'th row, so a
+    window of the recording can be parsed on its own by seeking straight to it.  The file is laid out as
+
+        INDEX_MAGIC, the description length as an 8 byte little endian integer, the json description, then the
+        offsets and the timestamps as little endian int64
+
+    The index is valid while the csv keeps the size and mtime it was built from.  Rows are counted as lines, the
+    data region of a Sensor Connect file has no blank lines, and the timestamps are taken to never go backwards.
+    """
+    def __init__(self, csvFilename, cacheDir=None):
+        self.csvFilename = csvFilename
+        if cacheDir is None:
+            self.path = csvFilename + INDEX_EXTENSION
+        else:
+            name = hashlib.sha1(os.path.abspath(csvFilename)).hexdigest()[:16]
+            self.path = os.path.join(cacheDir, "{}.{}{}".format(os.path.basename(csvFilename), name, INDEX_EXTENSION))
+        self.rows = 0
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype=np.int64)
+        self.end = 0
+
+    def key(self):
+        """
+        :return: a dictionary of the csv's size and mtime
+        """
+        stat = os.stat(self.csvFilename)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load(self, dataStart):
+        """
+        reads the index if it was built from the file as it is now
+        :param dataStart: the offset of the first data row
+        :return: True if the index was valid, otherwise False
+        """
+        try:
+            with open(self.path, 'rb') as indexFile:
+                if indexFile.read(len(INDEX_MAGIC)) != INDEX_MAGIC: return False
+                length = struct.unpack("<Q", indexFile.read(8))[0]
+                description = json.loads(indexFile.read(length))
+                if description.get("version") != INDEX_VERSION or description.get("key") != self.key() or \
+                        description.get("dataStart") != dataStart or description.get("interval") != INDEX_INTERVAL:
+                    return False
+                entries = description["entries"]
+                arrays = np.fromfile(indexFile, dtype="<i8", count=2 * entries)
+        except (IOError, OSError, ValueError, KeyError, struct.error):
+            return False
+        if len(arrays) != 2 * entries: return False
+        self.offsets, self.times = arrays[:entries].astype(np.int64), arrays[entries:].astype(np.int64)
+        self.rows, self.end = description["rows"], description["end"]
+        return True
+
+    def build(self, dataStart):
+        """
+        scans the data region of the csv for the start of every INDEX_INTERVAL'th row, one PARSE_CHUNK_SIZE block of
+        the memory-mapped file at a time, and decodes the timestamps of those rows only
+        :param dataStart: the offset of the first data row
+        :return: No return data.
+        """
+        with open(self.csvFilename, 'rb') as csvFile:
+            size = os.fstat(csvFile.fileno()).st_size
+            data = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ) if size else ""
+        try:
+            offsets, numRows = [], 0
+            for start in range(dataStart, size, PARSE_CHUNK_SIZE):
+                count = min(PARSE_CHUNK_SIZE, size - start)
+                # a row starts at dataStart and after every line end that isn't the last byte of the file
+                ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8, count=count, offset=start) == 10) + start + 1
+                rowStarts = np.concatenate(([dataStart], ends)) if start == dataStart else ends
+                rowStarts = rowStarts[rowStarts < size]
+                offsets.append(rowStarts[-numRows % INDEX_INTERVAL::INDEX_INTERVAL])
+                numRows += len(rowStarts)
+            self.offsets = np.concatenate(offsets).astype(np.int64) if offsets else np.empty(0, dtype=np.int64)
+            fields = []
+            for offset in self.offsets.tolist():
+                match = TIMESTAMP_RE.match(data[offset:offset + 64])
+                if not match:
+                    raise MicroStrainDataError("unreadable timestamp at byte {} of {}".format(offset, self.csvFilename))
+                fields.append([float(f) for f in match.groups()])
+            self.times = decodeTimestamps(np.array(fields).reshape(-1, 6))
+            self.rows, self.end = numRows, size
+        finally:
+            if isinstance(data, mmap.mmap): data.close()
+
+    def save(self, dataStart):
+        """
+        writes the index under a temporary name and moves it into place
+        :param dataStart: the offset of the first data row
+        :return: No return data.
+        """
+        text = json.dumps({"version": INDEX_VERSION, "key": self.key(), "dataStart": dataStart,
+                           "interval": INDEX_INTERVAL, "entries": len(self.offsets), "rows": self.rows,
+                           "end": self.end})
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, 'wb') as indexFile:
+                indexFile.write(INDEX_MAGIC + struct.pack("<Q", len(text)) + text)
+                indexFile.write(self.offsets.astype("<i8").tobytes())
+                indexFile.write(self.times.astype("<i8").tobytes())
+            if os.path.exists(self.path): os.remove(self.path)
+            os.rename(temporary, self.path)
+        finally:
+            if os.path.exists(temporary): os.remove(temporary)
+
+    def timeSpan(self, start, stop):
+        """
+        :param start: the first timestamp wanted, nanoseconds since the epoch
+        :param stop: the last timestamp wanted
+        :return: the (row, startOffset, stopOffset) of the stretch of the file holding every row from start to stop,
+        row being the number of the row at startOffset
+        """
+        first = max(np.searchsorted(self.times, start, side="right") - 1, 0)
+        last = np.searchsorted(self.times, stop, side="right")
+        return self.__span(first, last)
+
+    def rowSpan(self, first, last):
+        """
+        :param first: the first row wanted
+        :param last: the row after the last one wanted
+        :return: the (row, startOffset, stopOffset) of the stretch of the file holding the rows first to last
+        """
+        return self.__span(first // INDEX_INTERVAL, -(-last // INDEX_INTERVAL))
+
+    def __span(self, first, last):
+        if not len(self.offsets): return 0, self.end, self.end
+        first = min(first, len(self.offsets) - 1)
+        stop = int(self.offsets[last]) if last < len(self.offsets) else self.end
+        return first * INDEX_INTERVAL, int(self.offsets[first]), stop
+
+
+class MicroStrainData(object):
+    """
+    This class serves to encapsulate all the data and functions relating to grabbing data from a
+    properly formatted csv file, finding peaks, and outputting it in a usable format.  Besides a filename it can be
+    built from an open file (fromFile), the contents of one (fromBytes) or sample arrays already in memory
+    (fromArrays).  The extremes, the sample rate and gaps, the triggers and the events are worked out the first time
+    they are asked for and kept, changing a setting through a set* accessor drops whatever depends on it.  Every
+    error is raised as a MicroStrainDataError.
+    """
+    def __init__(self, csvFilename, v=DEFAULT_VERBOSITY, dtype=DEFAULT_SAMPLE_DTYPE,
+                 timeMode=DEFAULT_TIMESTAMP_MODE, stream=False, numPeaks=DEFAULT_NUM_PEAKS,
+                 cache=DEFAULT_CACHE_MODE, cacheDir=None, cacheLimit=DEFAULT_CACHE_LIMIT, profiler=None,
+                 parseWorkers=DEFAULT_PARSE_WORKERS, data=None, arrays=None):
+        assert timeMode in TIMESTAMP_MODES
+        assert cache in CACHE_MODES
+        assert type(numPeaks) == int and numPeaks > 0
+        assert type(parseWorkers) == int and parseWorkers > 0
+        if stream and (data is not None or arrays is not None):
+            raise MicroStrainDataError("stream mode reads the file from disk, it needs a filename")
+        self.__verbosity = v
+        # the worker processes map the file by name, data held in memory is always parsed here
+        self.__parseWorkers = parseWorkers if data is None else 1
+        # a StageProfiler timing the stages of loading and slicing, None leaves them untimed
+        self.__profiler = profiler
+        self.__numPeaks = numPeaks
+        self.__stream = stream
+        self.__dtype = dtype
+        self.__timeMode = timeMode
+        self.header = {}
+        self.channelInfo = {}
+        self.declaredSampleRate = None
+        # channelMap holds a (node, name, column) tuple per stored channel as returned by buildChannelMap, nodes
+        # the node ids in file order and channelNames the name of each stored channel, prefixed with its node
+        # when the file holds more than one
+        self.channelMap, self.nodes, self.channelNames = [], [], []
+        self.__titles = []
+        self.numCaptures = DEFAULT_NUM_CAPTURES
+        self.plotMode = DEFAULT_PLOT_MODE
+        self.triggerAxis = DEFAULT_TRIGGER_AXIS
+        self.selectedNodes = None
+        self.__AxisLst = []
+        self.sampleSize = DEFAULT_SAMPLE_SIZE
+        self.locationCoefficient = DEFAULT_LOCATION_COEFFICIENT
+        self.polarity = DEFAULT_POLARITY
+        self.deadzone = DEFAULT_DEADZONE
+        self.threshold = DEFAULT_THRESHOLD
+        self.rearmThreshold = None
+        self.minDuration = DEFAULT_MIN_DURATION
+        self.holdoff = DEFAULT_HOLDOFF
+        self.__originalFilename = csvFilename
+        self.__dialect = None
+        self.__dataStart = 0
+        # the sparse TimeIndex window extraction seeks with in stream mode, loaded or built on first use
+        self.__cacheDir = cacheDir
+        self.__timeIndex = None
+        # the (maxExtremes, minExtremes) lists and the (samplePeriod, gaps) pair, found on first use and served by
+        # the properties of the same names, and the triggers and events of the current settings
+        self.__extremes = None
+        self.__sampleTiming = None
+        self.__results = {}
+        # the derived trigger channels worked out over the whole file, by name
+        self.__derived = {}
+        self.totalNumSamples = 0
+        # only files read from disk by name are cached, there is nothing to key the cache on otherwise
+        fromDisk = data is None and arrays is None
+        self.__cache = None if stream or cache == "off" or not fromDisk else \
+            SampleCache(csvFilename, cacheDir, cacheLimit)
+        # timestamps; int64 nanoseconds since the epoch, channels; an (n, m) matrix with a column per channelMap
+        # entry, x, y, z g-force values for a single accelerometer.  They are memory-mapped from the cache when
+        # valid.  In stream mode only the header is read here, the data is read block by block when a slice method
+        # is called and the attributes above are filled in then
+        if self.__cache is not None and cache == "use":
+            with self.__stage("cache") as stage:
+                loaded = self.__loadCache()
+                stage.rows = loaded or 0
+            if loaded is not False: return
+        if arrays is not None:
+            self.__timestamps, self.__channels = self.__takeArrays(*arrays)
+        elif data is not None:
+            self.__timestamps, self.__channels = self.__parseData(data)
+        else:
+            self.__timestamps, self.__channels = self.__parseFromFile(csvFilename)
+        if not stream:
+            self.totalNumSamples = len(self.__timestamps)
+            # there are no peaks, sample rate or triggers to find in a file with only a header
+            if not self.totalNumSamples: raise MicroStrainDataError("no data rows in the file")
+        if self.__cache is not None:
+            # the cache keeps the extremes and sample rate as well, so they are worked out now for the next run
+            with self.__stage("cacheSave") as stage:
+                stage.rows = self.totalNumSamples
+                self.__saveCache()
+
+    @classmethod
+    def fromFile(cls, csvFile, **settings):
+        """
+        reads an open csv file, from its current position, without it having to have a name on disk.  A real file
+        is memory-mapped rather than read in
+        :param csvFile: the file object, opened in binary mode
+        :param settings: any of the constructor's keyword arguments, the cache is always off
+        :return: the MicroStrainData object
+        """
+        name = getattr(csvFile, "name", "<file>")
+        try:
+            data = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            # not a real file (a socket, a StringIO) or an empty one
+            return cls.fromBytes(csvFile.read(), name, **settings)
+        try:
+            position = csvFile.tell()
+            return cls.fromBytes(data if position == 0 else data[position:], name, **settings)
+        finally:
+            data.close()
+
+    @classmethod
+    def fromBytes(cls, data, name="<bytes>", **settings):
+        """
+        parses the contents of a csv file held in memory, nothing is read from or written to disk
+        :param data: the contents of the file, a string or anything sliceable like one such as a memory map
+        :param name: what to call the data in reports
+        :param settings: any of the constructor's keyword arguments, the cache is always off
+        :return: the MicroStrainData object
+        """
+        return cls(name, data=data, **dict(settings, cache="off"))
+
+    @classmethod
+    def fromArrays(cls, timestamps, channels, titles, header=None, name="<arrays>", **settings):
+        """
+        wraps sample data already in memory, the arrays are used as they are when they already have the right types
+        :param timestamps: the timestamps of the samples, nanoseconds since the epoch
+        :param channels: an (n, m) matrix of the channel values, one column per title
+        :param titles: the channel titles as in the data region of a Sensor Connect file, node:ch1 and so on, titles
+        without a node all belong to one unnamed node
+        :param header: the preamble sections, as in the header attribute, if there are any
+        :param name: what to call the data in reports
+        :param settings: any of the constructor's keyword arguments, the cache is always off
+        :return: the MicroStrainData object
+        """
+        return cls(name, arrays=(timestamps, channels, titles, header or {}), **dict(settings, cache="off"))
+
+    def __takeArrays(self, timestamps, channels, titles, header):
+        """
+        sets the header and channel map up for fromArrays and puts the channels in channelMap order
+        :return: a tuple of the timestamp array and the channel matrix
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        channels = np.asarray(channels, dtype=self.__dtype)
+        if channels.ndim != 2 or channels.shape != (len(timestamps), len(titles)):
+            raise MicroStrainDataError("expected a {} by {} channel matrix, got {}".format(
+                len(timestamps), len(titles), "x".join(str(size) for size in channels.shape)))
+        self.header = dict(header)
+        self.__readChannelInfo()
+        self.__setChannelMap(titles)
+        order = [column - 1 for node, name, column in self.channelMap]
+        if order != range(len(titles)): channels = channels[:, order]
+        return timestamps, channels
+
+    @property
+    def maxExtremes(self):
+        return self.__peaks()[0]
+
+    @property
+    def minExtremes(self):
+        return self.__peaks()[1]
+
+    @property
+    def maxPeaks(self):
+        return [peaks[0] for peaks in self.maxExtremes] if self.maxExtremes is not None else None
+
+    @property
+    def minPeaks(self):
+        return [peaks[0] for peaks in self.minExtremes] if self.minExtremes is not None else None
+
+    @property
+    def samplePeriod(self):
+        return self.__timing()[0]
+
+    @property
+    def gaps(self):
+        return self.__timing()[1]
+
+    @property
+    def sampleFrequency(self):
+        """
+        samplePeriod is in nanoseconds and sampleFrequency in hertz, both measured from the timestamps, sampleRate
+        is the same period as a timedelta
+        """
+        return NANOSECONDS_PER_SECOND / self.samplePeriod if self.samplePeriod else 0.0
+
+    @property
+    def sampleRate(self):
+        return timedelta(microseconds=self.samplePeriod / 1000)
+
+    def __peaks(self):
+        """
+        :return: the (maxExtremes, minExtremes) lists, found the first time they are asked for.  In stream mode they
+        are only known once a slice method has read the file, (None, None) until then
+        """
+        if self.__extremes is None and not self.__stream:
+            with self.__stage("peaks") as stage:
+                stage.rows = self.totalNumSamples
+                self.__setPeaks(self.__findMaxMinPeaks(self.__timestamps, self.__channels, self.__numPeaks))
+        return self.__extremes or (None, None)
+
+    def __timing(self):
+        """
+        :return: the (samplePeriod, gaps) pair, measured the first time it is asked for, (0.0, []) in stream mode
+        until a slice method has read the file
+        """
+        if self.__sampleTiming is None and not self.__stream:
+            with self.__stage("sampleRate") as stage:
+                stage.rows = self.totalNumSamples
+                self.__sampleTiming = self.__findSampleRate(self.__timestamps)
+        return self.__sampleTiming or (0.0, [])
+
+    def __result(self, name, compute):
+        """
+        :return: the kept result of the given name, computed with compute() when there isn't one, nothing is kept in
+        stream mode where every slice goes back over the file
+        """
+        if self.__stream: return compute()
+        if name not in self.__results: self.__results[name] = compute()
+        return self.__results[name]
+
+    def __invalidate(self, *names):
+        """
+        drops the kept results a changed setting affects
+        :return: No return data.
+        """
+        for name in names: self.__results.pop(name, None)
+
+    def __stage(self, name):
+        """
+        :return: a context manager timing the named stage, one that does nothing when there is no profiler
+        """
+        return profileStage(self.__profiler, name)
+
+    def __cacheKey(self):
+        return self.__cache.key(dtype=np.dtype(self.__dtype).str, timeMode=self.__timeMode)
+
+    def __loadCache(self):
+        """
+        fills in the sample data, header, extremes and gaps from the cache
+        :return: the number of samples loaded if the cache held valid data for the file, otherwise False
+        """
+        if not os.access(self.__originalFilename, os.R_OK): return False
+        if self.__verbosity: print '<-> Checking cache {}..'.format(self.__cache.path)
+        cached = self.__cache.load(self.__cacheKey())
+        if cached is None:
+            if self.__verbosity: print '<-> No valid cache, parsing the CSV file'
+            return False
+        description, self.__timestamps, self.__channels = cached
+        self.header = description["header"]
+        self.__readChannelInfo()
+        self.__setChannelMap(description["titles"])
+        self.totalNumSamples = len(self.__timestamps)
+        # with too few extremes cached they are searched for again when first asked for
+        if description["numPeaks"] >= self.__numPeaks:
+            extremes = [[[[i, nanosecondsToDatetime(self.__timestamps[i]), float(self.__channels[i, col])]
+                          for i in indexes[:self.__numPeaks]] for col, indexes in enumerate(side)]
+                        for side in description["extremes"]]
+            self.__setPeaks(extremes)
+        gaps = [[i, nanosecondsToDatetime(self.__timestamps[i]), timedelta(microseconds=duration / 1000.0), missing]
+                for i, duration, missing in description["gaps"]]
+        self.__sampleTiming = description["samplePeriod"], gaps
+        if self.__verbosity: print '<+> Loaded {} samples from cache'.format(self.totalNumSamples)
+        return self.totalNumSamples
+
+    def __saveCache(self):
+        """
+        writes the parsed sample data, header, extremes and gaps to the cache, a cache that can't be written is
+        skipped with a warning
+        :return: No return data.
+        """
+        extremes = [[[peak[0] for peak in peaks] for peaks in side] for side in (self.maxExtremes, self.minExtremes)]
+        gaps = [[index, int(self.__timestamps[index] - self.__timestamps[index - 1]), missing]
+                for index, time, duration, missing in self.gaps]
+        try:
+            self.__cache.save(self.__cacheKey(), self.__timestamps, self.__channels, header=self.header,
+                              titles=self.__titles, numPeaks=self.__numPeaks, extremes=extremes,
+                              samplePeriod=self.samplePeriod, gaps=gaps)
+        except (IOError, OSError) as e:
+            print "<WARNING> unable to write cache {}; {}".format(self.__cache.path, e)
+            return
+        if self.__verbosity: print '<+> Saved cache to {}'.format(self.__cache.path)
+
+    def __setPeaks(self, extremes):
+        """
+        stores the extremes found by __findMaxMinPeaks, the first of each list is that channel's peak
+        :param extremes: the (maxExtremes, minExtremes) lists
+        :return: No return data.
+        """
+        self.__extremes = tuple(extremes)
+
+    def __setChannelMap(self, titles):
+        """
+        builds channelMap, nodes and channelNames from the column titles of the data region
+        :param titles: the column titles after the Time column
+        :return: No return data.
+        """
+        self.__titles = list(titles)
+        self.channelMap = buildChannelMap(titles)
+        self.nodes = []
+        for node, name, column in self.channelMap:
+            if node not in self.nodes: self.nodes.append(node)
+        self.channelNames = [name if len(self.nodes) == 1 else "{}:{}".format(node, name)
+                             for node, name, column in self.channelMap]
 
     def __repr__(self):
         """
         prints out a short text representation of the sample data
         :return:
         """
-        line1 = "<{}; containing {} samples, {}.{} seconds per sample>\n".format(self.__originalFilename,
-                                                                                 self.totalNumSamples,
-                                                                                 self.sampleRate.seconds,
-                                                                                 self.sampleRate.microseconds)
-        line2 = "<xMax; {}@{}, yMax; {}@{}, zMax, {}@{}>\n".format(self.maxPeaks[0][2],
-                                                                   self.maxPeaks[0][1].strftime(MINUTES_ONLY),
-                                                                   self.maxPeaks[1][2],
-                                                                   self.maxPeaks[1][1].strftime(MINUTES_ONLY),
-                                                                   self.maxPeaks[2][2],
-                                                                   self.maxPeaks[2][1].strftime(MINUTES_ONLY))
-        line3 = "<xMin; {}@{}, yMin; {}@{}, zMin, {}@{}>".format(self.minPeaks[0][2],
-                                                                 self.minPeaks[0][1].strftime(MINUTES_ONLY),
-                                                                 self.minPeaks[1][2],
-                                                                 self.minPeaks[1][1].strftime(MINUTES_ONLY),
-                                                                 self.minPeaks[2][2],
-                                                                 self.minPeaks[2][1].strftime(MINUTES_ONLY))
+        line1 = "<{}; containing {} samples, {:.9f} seconds per sample ({:.3f}Hz), {} gaps>\n".format(
+            self.__originalFilename, self.totalNumSamples, self.samplePeriod / NANOSECONDS_PER_SECOND,
+            self.sampleFrequency, len(self.gaps))
+        if self.maxPeaks is None:
+            # stream mode, nothing is known about the peaks until the file has been read through
+            return line1 + "<peaks not found yet>"
+        line2 = "<{}>\n".format(", ".join("{}Max; {}@{}".format(name, peak[2], peak[1].strftime(MINUTES_ONLY))
+                                           for name, peak in zip(self.channelNames, self.maxPeaks)))
+        line3 = "<{}>".format(", ".join("{}Min; {}@{}".format(name, peak[2], peak[1].strftime(MINUTES_ONLY))
+                                       for name, peak in zip(self.channelNames, self.minPeaks)))
         return line1 + line2 + line3
 
+    def gapReport(self):
+        """
+        lists every gap found in the timestamps, one per line
+        :return: the report as a string, empty when there are no gaps
+        """
+        lines = []
+        for index, time, duration, missing in self.gaps:
+            lines.append("<Gap before sample #{} at {}; {:.6f} seconds, about {} samples missing>".format(
+                index, time.strftime(TIME_FORMAT), duration.total_seconds(), missing))
+        return "\n".join(lines)
+
+    def peakReport(self):
+        """
+        lists the numPeaks largest and smallest values of every channel, the extremes are found when the data is
+        loaded so this never goes back over the samples
+        :return: the report as a string, one line per channel and polarity
+        """
+        lines = []
+        for name, axis in zip(self.channelNames, range(len(self.maxExtremes))):
+            for label, extremes in (("Max", self.maxExtremes[axis]), ("Min", self.minExtremes[axis])):
+                peaks = ", ".join("{}@{} (#{})".format(value, time.strftime(MINUTES_ONLY), index)
+                                  for index, time, value in extremes)
+                lines.append("<{}{}; {}>".format(name, label, peaks))
+        return "\n".join(lines)
+
     def sliceMax(self):
         """
-        This function slices the data in self.__sampleData around the maximum peak, using the sampleSize and
+        This function slices the sample data around the maximum peak, using the sampleSize and
         locationCoefficient values to determine slice size and location the the trigger within
-        :return: a sliced down copy of self.__sampleData
+        :return: a Capture viewing the sliced down sample data
         """
         self.__AxisLst = self.__parseAxies(self.triggerAxis)
+        if self.__stream: return self.__streamSlices(maxMode=True)[0]
+        with self.__stage("slice"):
+            return self.__cropData(*self.__maxTrigger())
+
+    def __maxTrigger(self):
+        """
+        picks the largest of the peaks on the trigger axes that matches the polarity
+        :return: the sample index and magnitude of the peak
+        """
         val, index = 0, 0
         for axis in self.__AxisLst:
+            if isinstance(axis, DerivedChannel):
+                values = self.__derivedValues(axis)
+                if "+" in self.polarity and np.nanmax(values) > val:
+                    index = int(np.nanargmax(values))
+                    val = float(values[index])
+                if "-" in self.polarity and abs(np.nanmin(values)) > val:
+                    index = int(np.nanargmin(values))
+                    val = abs(float(values[index]))
+                continue
             if "+" in self.polarity:
                 if self.maxPeaks[axis][2] > val:
                     val = self.maxPeaks[axis][2]
@@ -121,49 +2023,567 @@ class MicroStrainData:
                 if abs(self.minPeaks[axis][2]) > val:
                     val = abs(self.minPeaks[axis][2])
                     index = self.minPeaks[axis][0]
-        return self.__cropData(index)
+        return index, val
 
     def sliceNumTriggers(self):
         """
-        similar to the sliceMax method only this version allows for multiple captures
-        :return: cropped version of sample data
+        similar to the sliceMax method only this version allows for multiple captures, each trigger is the largest
+        value on the trigger axes outside the dead-zones of the triggers before it
+        :return: a list of Capture objects, one per trigger
         """
         self.__AxisLst = self.__parseAxies(self.triggerAxis)
-        newLst = []
-        val = []
-        index = []
-        deadzone = []
-        for x in range(self.numCaptures):
-            if self.__verbosity: print "<-> Cropping data from trigger #{}".format(x+1)
-            val.append(0)
-            index.append(0)
-            for axis in self.__AxisLst:
-                i = 0
-                for row in self.__sampleData:
-                    if "+" in self.polarity:
-                        if row[axis+1] > val[x]:
-                            if i not in deadzone:
-                                val[x] = row[axis+1]
-                                index[x] = i
-                                deadzone.extend(range(i - self.deadzone, i + self.deadzone))
-                    if "-" in self.polarity:
-                        if abs(row[axis+1]) > val[x]:
-                            if i not in deadzone:
-                                val[x] = abs(row[axis+1])
-                                index[x] = i
-                                deadzone.extend(range(i - self.deadzone, i + self.deadzone))
-                    i += 1
-            if self.__verbosity: print "<+> Found trigger at sample #{}, value; {}".format(index[x], val[x])
-        for i in index:
-            newLst.append(self.__cropData(i))
-        return newLst
-
-    def __cropData(self, index):
+        if self.__stream: return self.__streamSlices(maxMode=False)
+        with self.__stage("slice") as stage:
+            stage.rows = self.totalNumSamples
+            triggers = self.__result("triggers", self.__findTriggers)
+            self.__reportTriggers(triggers)
+            return [self.__cropData(i, val) for i, val in triggers]
+
+    def __findTriggers(self):
+        """
+        :return: the (index, value) of every trigger sliceNumTriggers cuts around
+        """
+        # candidates are ranked a chunk of rows at a time so the score matrix never has to exist for the whole file
+        limit = candidateLimit(self.numCaptures, len(self.__AxisLst), self.deadzone)
+        candidates = None
+        for start in range(0, max(self.totalNumSamples, 1), RANK_CHUNK_SIZE):
+            scores = triggerScores(self.__triggerColumns(slice(start, start + RANK_CHUNK_SIZE)), None, self.polarity)
+            candidates = rankCandidates(scores, limit, start, candidates)
+        return selectTriggers(candidates, self.numCaptures, self.deadzone)
+
+    def findEvents(self):
+        """
+        finds every event on the trigger axes in one pass, an event starts when the trigger axes reach threshold and
+        ends when they drop back under the re-arm threshold, the polarity is applied as in sliceNumTriggers
+        :return: a list of event dictionaries in time order holding the start, peak and end (last) sample index,
+        their timestamps in nanoseconds as startTime, peakTime and endTime, the value at the peak, its trigger score
+        and the name of the channel it is on
+        """
+        if self.__stream:
+            raise MicroStrainDataError("event detection needs the whole file and can't be used in stream mode")
+        return list(self.__result("events", self.__findEvents))
+
+    def __findEvents(self):
+        """
+        :return: the events findEvents returns, worked out afresh
+        """
+        axes = self.__AxisLst = self.__parseAxies(self.triggerAxis)
+        rearm = self.rearmThreshold if self.rearmThreshold is not None else self.threshold * DEFAULT_REARM_FRACTION
+        with self.__stage("events") as stage:
+            stage.rows = self.totalNumSamples
+            score = np.empty(self.totalNumSamples)
+            for start in range(0, self.totalNumSamples, RANK_CHUNK_SIZE):
+                scores = triggerScores(self.__triggerColumns(slice(start, start + RANK_CHUNK_SIZE)), None,
+                                       self.polarity)
+                score[start:start + len(scores)] = np.fmax.reduce(scores, axis=1)
+            starts, peaks, ends = detectEvents(score, self.threshold, rearm, self.minDuration, self.holdoff)
+        peakValues = self.__triggerColumns(peaks)
+        peakScores = triggerScores(peakValues, None, self.polarity)
+        peakAxes = np.where(np.isnan(peakScores), -np.inf, peakScores).argmax(axis=1)
+        names = self.triggerChannels()
+        events = []
+        for k, (start, peak, end, axis) in enumerate(zip(starts, peaks, ends, peakAxes)):
+            events.append({"start": int(start), "peak": int(peak), "end": int(end) - 1,
+                           "startTime": int(self.__timestamps[start]), "peakTime": int(self.__timestamps[peak]),
+                           "endTime": int(self.__timestamps[end - 1]), "value": float(peakValues[k, axis]),
+                           "score": float(score[peak]), "channel": names[axis]})
+        return events
+
+    def sliceEvents(self):
+        """
+        cuts a capture around the peak of every event findEvents finds, the same way sliceNumTriggers cuts around
+        its triggers
+        :return: a list of Capture objects in time order, one per event
+        """
+        events = self.findEvents()
+        if self.__verbosity: print "<+> Found {} events".format(len(events))
+        self.__reportTriggers([(event["peak"], event["value"]) for event in events])
+        captures = []
+        for event in events:
+            capture = self.__cropData(event["peak"], event["score"])
+            capture.event = event
+            captures.append(capture)
+        return captures
+
+    def extractWindow(self, start, stop):
+        """
+        cuts out the samples timestamped from start to stop, both included.  With the sample data loaded they are
+        sliced out of it, in stream mode only the rows between the nearest entries of the sparse time index either
+        side of the window are parsed
+        :param start: the first time wanted, a datetime or nanoseconds since the epoch
+        :param stop: the last time wanted
+        :return: a Capture of the selected nodes, start being the sample index of its first row
+        """
+        start, stop = [datetimeToNanoseconds(t) if isinstance(t, datetime) else int(t) for t in (start, stop)]
+        if stop < start: raise MicroStrainDataError("the window ends before it starts")
+        if not self.__stream:
+            timestamps, channels, row = self.__timestamps, self.__channels, 0
+        else:
+            row, startOffset, stopOffset = self.__loadTimeIndex().timeSpan(start, stop)
+            timestamps, channels = self.__parseSpan(startOffset, stopOffset)
+        first, last = np.searchsorted(timestamps, [start, stop + 1])
+        return self.__windowCapture(timestamps[first:last], channels[first:last], row + first)
+
+    def extractRange(self, first, last):
+        """
+        cuts out the samples numbered first up to (not including) last, in stream mode through the sparse time index
+        the same way as extractWindow
+        :param first: the first sample wanted, 0 for the first row of the file
+        :param last: the sample after the last one wanted, cut short at the end of the file
+        :return: a Capture of the selected nodes
+        """
+        if not 0 <= first <= last: raise MicroStrainDataError("bad sample range {}:{}".format(first, last))
+        if not self.__stream:
+            return self.__windowCapture(self.__timestamps[first:last], self.__channels[first:last],
+                                        min(first, self.totalNumSamples))
+        row, startOffset, stopOffset = self.__loadTimeIndex().rowSpan(first, last)
+        timestamps, channels = self.__parseSpan(startOffset, stopOffset)
+        skip, stop = first - row, last - row
+        return self.__windowCapture(timestamps[skip:stop], channels[skip:stop], row + min(skip, len(timestamps)))
+
+    def startTime(self):
+        """
+        :return: the timestamp of the first sample in nanoseconds, read from the time index in stream mode
+        """
+        times = self.__loadTimeIndex().times if self.__stream else self.__timestamps
+        if not len(times): raise MicroStrainDataError("no data rows in the file")
+        return int(times[0])
+
+    def __loadTimeIndex(self):
+        """
+        :return: the TimeIndex of the file, read from disk while it is still valid and otherwise built and saved,
+        an index that can't be saved is used for this run only
+        """
+        if self.__timeIndex is not None: return self.__timeIndex
+        with self.__stage("index") as stage:
+            index = TimeIndex(self.__originalFilename, self.__cacheDir)
+            if not index.load(self.__dataStart):
+                if self.__verbosity: print '<-> Building time index {}..'.format(index.path)
+                index.build(self.__dataStart)
+                try:
+                    index.save(self.__dataStart)
+                except (IOError, OSError) as e:
+                    print "<WARNING> unable to save the time index; {}".format(e)
+            stage.rows = index.rows
+        self.__timeIndex = index
+        return index
+
+    def __parseSpan(self, startOffset, stopOffset):
+        """
+        parses the whole rows between two byte offsets of the data region
+        :return: a tuple of the timestamp array and the channel matrix
+        """
+        columns = [column + 5 for node, name, column in self.channelMap]
+        with self.__stage("window") as stage, open(self.__originalFilename, 'rb') as csvFile:
+            data = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ) if stopOffset > startOffset else ""
+            try:
+                firstRowEnd = data.find("\n", self.__dataStart)
+                numColumns = data[self.__dataStart:firstRowEnd if firstRowEnd >= 0 else len(data)].count(
+                    self.__dialect.delimiter) + 1
+                parsed = [parseRange(data, start, stop, numColumns, self.__dialect, columns, self.__dtype)[1:]
+                          for start, stop in splitRanges(data, startOffset, stopOffset, PARSE_CHUNK_SIZE)]
+            finally:
+                if isinstance(data, mmap.mmap): data.close()
+            timestamps = np.concatenate([t for t, c in parsed]) if parsed else np.empty(0, dtype=np.int64)
+            channels = np.concatenate([c for t, c in parsed]) if parsed else \
+                np.empty((0, len(columns)), dtype=self.__dtype)
+            stage.rows = len(timestamps)
+        return timestamps, channels
+
+    def __windowCapture(self, timestamps, channels, start):
+        """
+        :return: a Capture of the selected nodes' columns of a window, with no trigger
+        """
+        selected = self.__selectedColumns()
+        if len(selected) != len(self.channelMap): channels = channels[:, selected]
+        return Capture(timestamps, channels, None, start, None, [self.channelNames[col] for col in selected])
+
+    def captureSpectra(self, captures, window=DEFAULT_FFT_WINDOW):
+        """
+        works out the power spectral density of every channel of every capture at the measured sample rate, the
+        captures of each length are stacked into one (n, length, m) array and transformed in one batched call
+        :param captures: a list of Capture objects, as returned by the slice methods
+        :param window: one of FFT_WINDOWS
+        :return: a list of (positions, frequencies, density) groups, one per capture length in the order they first
+        appear, positions being the indexes in captures of the group's captures and density an (n, bins, m) array
+        """
+        if not self.sampleFrequency: raise MicroStrainDataError("the sample rate isn't known, slice the file first")
+        lengths = {}
+        for position, capture in enumerate(captures):
+            if len(capture) > 1: lengths.setdefault(len(capture), []).append(position)
+        groups = []
+        with self.__stage("spectrum") as stage:
+            for positions in sorted(lengths.values()):
+                segments = np.stack([captures[position].channels for position in positions])
+                groups.append((positions,) + spectralDensity(segments, self.sampleFrequency, window))
+            stage.rows = sum(len(capture) for capture in captures)
+        return groups
+
+    def welchSpectrum(self, segment=DEFAULT_WELCH_SEGMENT, window=DEFAULT_FFT_WINDOW):
+        """
+        works out the power spectral density of the whole recording by Welch's method, the samples are fed to a
+        WelchAccumulator SAMPLE_BLOCK_SIZE rows at a time (read from the file block by block in stream mode), so it
+        runs in the same memory however long the file is
+        :param segment: the length of a Welch segment in samples, the segments overlap by half
+        :param window: one of FFT_WINDOWS
+        :return: the bin frequencies and a (bins, m) array of densities with a column per channel of the selected
+        nodes
+        """
+        selected = self.__selectedColumns()
+        welch = WelchAccumulator(segment, window)
+        period, numRows = self.samplePeriod, 0
+        with self.__stage("spectrum") as stage:
+            for timestamps, channels in self.__sampleBlocks():
+                # in stream mode the sample period is only measured by a slice method, until then the typical
+                # spacing of the first block is used as __streamSlices does
+                if not period and len(timestamps) > 1: period = float(np.median(np.diff(timestamps)))
+                welch.add(channels[:, selected] if len(selected) != len(self.channelMap) else channels)
+                numRows += len(timestamps)
+            stage.rows = numRows
+        if not period: raise MicroStrainDataError("the sample rate can't be measured from fewer than two samples")
+        return welch.result(NANOSECONDS_PER_SECOND / period)
+
+    def __sampleBlocks(self):
+        """
+        :return: a generator of (timestamps, channels) blocks of up to SAMPLE_BLOCK_SIZE rows covering the whole
+        file, views of the sample data or in stream mode parsed from the file one block at a time
+        """
+        if not self.__stream:
+            for start in range(0, self.totalNumSamples, SAMPLE_BLOCK_SIZE):
+                stop = start + SAMPLE_BLOCK_SIZE
+                yield self.__timestamps[start:stop], self.__channels[start:stop]
+            return
+        columns = [column + 5 for node, name, column in self.channelMap]
+        with open(self.__originalFilename, 'rb') as csvFile:
+            csvFile.seek(self.__dataStart)
+            for fields in self.__readDataBlocks(csvFile, self.__dialect):
+                timestamps = decodeTimestamps(fields[:, :6])
+                channels = fields[:, columns].astype(self.__dtype)
+                for start in range(0, len(fields), SAMPLE_BLOCK_SIZE):
+                    stop = start + SAMPLE_BLOCK_SIZE
+                    yield timestamps[start:stop], channels[start:stop]
+
+    def selectedChannels(self):
+        """
+        :return: the names of the channels of the selected nodes, the channels of a capture or window
+        """
+        return [self.channelNames[col] for col in self.__selectedColumns()]
+
+    def triggerChannels(self):
+        """
+        :return: the names of the channels the trigger axis picks out of the selected nodes
+        """
+        return [axis.name if isinstance(axis, DerivedChannel) else self.channelNames[axis]
+                for axis in self.__parseAxies(self.triggerAxis)]
+
+    def plotChannels(self):
+        """
+        :return: the names of the stored channels the trigger axis picks out, a derived channel standing for the
+        channels it is worked out from since a capture only holds stored channels
+        """
+        columns = []
+        sources = self.__parseAxies(self.triggerAxis)[::-1]
+        while sources:
+            source = sources.pop()
+            if isinstance(source, DerivedChannel): source = source.source
+            if isinstance(source, list): sources.extend(source[::-1])
+            elif isinstance(source, DerivedChannel): sources.append(source)
+            elif source not in columns: columns.append(source)
+        return [self.channelNames[col] for col in columns]
+
+    def derivedChannel(self, name):
+        """
+        works out a derived channel over the whole file, as -a would trigger on it
+        :param name: the derived channel as given to -a, hp5(523:z) or 523:rms64(mag) for example
+        :return: the derived channel as a float64 array, one value per sample
+        """
+        axes = [axis for axis in self.__parseAxies(name) if isinstance(axis, DerivedChannel)]
+        if len(axes) != 1: raise MicroStrainDataError("'{}' names {} derived channels, not one".format(name, len(axes)))
+        return self.__derivedValues(axes[0])
+
+    def __triggerColumns(self, rows):
+        """
+        :param rows: a slice or an array of sample indexes
+        :return: an (n, len(__AxisLst)) matrix of the trigger axes at the rows
+        """
+        axes = self.__AxisLst
+        if not any(isinstance(axis, DerivedChannel) for axis in axes):
+            return self.__channels[rows, axes] if isinstance(rows, slice) else self.__channels[rows][:, axes]
+        return np.column_stack([self.__derivedValues(axis)[rows] if isinstance(axis, DerivedChannel) else
+                                self.__channels[rows, axis] for axis in axes])
+
+    def __derivedValues(self, channel):
+        """
+        :param channel: a DerivedChannel
+        :return: the derived channel over the whole file, worked out SAMPLE_BLOCK_SIZE rows at a time the first time
+        it is asked for and kept after that
+        """
+        if self.__stream: raise MicroStrainDataError("stream mode keeps no samples to work out {} over".format(
+            channel.name))
+        if channel.name not in self.__derived:
+            values = np.empty(self.totalNumSamples)
+            sources = TriggerSources([channel], self.sampleFrequency)
+            with self.__stage("derive") as stage:
+                for start in range(0, self.totalNumSamples, SAMPLE_BLOCK_SIZE):
+                    stop = start + SAMPLE_BLOCK_SIZE
+                    values[start:stop] = sources.feed(self.__timestamps[start:stop], self.__channels[start:stop])[:, 0]
+                stage.rows = self.totalNumSamples
+            self.__derived[channel.name] = values
+        return self.__derived[channel.name]
+
+    def __reportTriggers(self, triggers):
+        if not self.__verbosity: return
+        for x, (i, val) in enumerate(triggers):
+            print "<-> Cropping data from trigger #{}".format(x+1)
+            print "<+> Found trigger at sample #{}, value; {}".format(i, val)
+
+    def __streamSlices(self, maxMode):
+        """
+        the stream mode version of sliceMax and sliceNumTriggers, the file is read one block at a time and only a
+        bounded set of trigger candidates, the samples around them and the last few samples (the pre-trigger context
+        for candidates at the start of the next block) are kept, so memory use doesn't grow with the file.  The
+        triggers are only final once the end of the file has been seen, the captures are cut then
+        :param maxMode: pick the single largest peak the way sliceMax does instead of numCaptures triggers
+        :return: a list of Capture objects, one per trigger
+        """
+        if self.__verbosity: print '<-> Streaming CSV file..'
+        axes = self.__AxisLst
+        limit = candidateLimit(self.numCaptures, len(axes), self.deadzone)
+        pre = max(int(math.ceil(self.sampleSize * self.locationCoefficient)), 0) + 1
+        post = max(self.sampleSize - int(math.floor(self.sampleSize * self.locationCoefficient)), 0) + 1
+        contextSize = max(self.sampleSize, pre)
+        candidates = None
+        sources = TriggerSources(axes, self.declaredSampleRate or 0.0)
+        self.__extremes, gaps = None, []
+        keptIndex = np.empty(0, dtype=np.int64)
+        keptTimes = np.empty(0, dtype=np.int64)
+        keptChannels = np.empty((0, len(self.channelMap)), dtype=self.__dtype)
+        columns = [column + 5 for node, name, column in self.channelMap]
+        numRows = 0
+        spacing = [0, 0]  # the total and count of sample spacings that aren't gaps
+        typicalSpacing = None
+        gapSteps = []
+        with self.__stage("stream") as stage, open(self.__originalFilename, 'rb') as csvFile:
+            csvFile.seek(self.__dataStart)
+            for fields in self.__readDataBlocks(csvFile, self.__dialect):
+                timestamps = decodeTimestamps(fields[:, :6])
+                channels = fields[:, columns].astype(self.__dtype)
+                blockIndex = np.arange(numRows, numRows + len(fields), dtype=np.int64)
+                self.__mergePeaks(self.__findMaxMinPeaks(timestamps, channels, self.__numPeaks), numRows)
+                # sample spacing and gaps, steps[k] is the spacing before row k of the block, the typical spacing is
+                # taken from the first block
+                steps = np.diff(timestamps, prepend=timestamps[0] if numRows == 0 else keptTimes[-1])
+                if typicalSpacing is None: typicalSpacing = np.median(steps[1:]) if len(steps) > 1 else 0
+                gapMask = steps > typicalSpacing * GAP_TOLERANCE
+                if numRows == 0: gapMask[0] = False
+                spacing[0] += int(steps[~gapMask].sum())
+                spacing[1] += int((~gapMask).sum()) - (1 if numRows == 0 else 0)
+                for i in np.flatnonzero(gapMask):
+                    gapSteps.append(steps[i])
+                    gaps.append([int(numRows + i), nanosecondsToDatetime(timestamps[i]),
+                                 timedelta(microseconds=steps[i] / 1000.0), 0])
+                scores = triggerScores(sources.feed(timestamps, channels), None, self.polarity)
+                candidates = rankCandidates(scores, limit, numRows, candidates)
+                # keep the samples any candidate or running peak may still need plus the pre-trigger context
+                numRows += len(fields)
+                stage.rows = numRows
+                peaks = sum(self.maxExtremes + self.minExtremes, [])
+                centres = np.concatenate((candidates[2], [p[0] for p in peaks]))
+                keptIndex = np.concatenate((keptIndex, blockIndex))
+                keptTimes = np.concatenate((keptTimes, timestamps))
+                keptChannels = np.concatenate((keptChannels, channels))
+                keep = self.__windowMask(keptIndex, centres - pre, centres + post) | \
+                    (keptIndex >= numRows - contextSize)
+                keptIndex, keptTimes, keptChannels = keptIndex[keep], keptTimes[keep], keptChannels[keep]
+        self.totalNumSamples = numRows
+        if not numRows: raise MicroStrainDataError("no data rows in the file")
+        samplePeriod = float(spacing[0]) / spacing[1] if spacing[1] else float(typicalSpacing or 0)
+        for gap, step in zip(gaps, gapSteps):
+            gap[3] = int(round(step / samplePeriod)) - 1
+        self.__sampleTiming = samplePeriod, gaps
+        if self.__verbosity: print '<+> CSV file successfully streamed'
+        if maxMode and not any(isinstance(axis, DerivedChannel) for axis in axes):
+            triggers = [self.__maxTrigger()]
+        elif maxMode:
+            # no extremes are kept of derived channels, the best scoring candidate is the same sample
+            triggers = selectTriggers(candidates, 1, self.deadzone)
+        else:
+            triggers = selectTriggers(candidates, self.numCaptures, self.deadzone)
+            self.__reportTriggers(triggers)
+        captures = []
+        selected = self.__selectedColumns()
+        for i, val in triggers:
+            start, stop = self.__cropBounds(i)
+            rows = np.searchsorted(keptIndex, np.arange(start, stop))
+            captures.append(Capture(keptTimes[rows], keptChannels[rows][:, selected], i, start, val,
+                                    [self.channelNames[col] for col in selected]))
+        return captures
+
+    def follow(self, onCapture, interval=DEFAULT_FOLLOW_INTERVAL, timeout=None):
+        """
+        watches a csv file Sensor Connect is still writing to and cuts captures out of it as the rows come in, the
+        header has already been read by the constructor (in stream mode) so only the newly appended rows are parsed
+        each time.  A sample on the trigger axes reaching threshold becomes a trigger unless it falls in the
+        dead-zone of the one before, a higher sample inside the dead-zone of a trigger that isn't final yet takes its
+        place, and a trigger is final once the dead-zone after it has passed.  Each capture is handed to onCapture as
+        soon as its window is complete, only the samples a capture may still need are kept.  The file is checked
+        every interval seconds, between checks the process sleeps
+        :param onCapture: called with each Capture in trigger order
+        :param interval: seconds between checks for new rows
+        :param timeout: stop after this many seconds without new rows, by default follow until interrupted
+        :return: the number of captures found
+        """
+        if not self.__stream:
+            raise MicroStrainDataError("follow needs the file opened in stream mode")
+        axes = self.__AxisLst = self.__parseAxies(self.triggerAxis)
+        sources = TriggerSources(axes, self.declaredSampleRate or 0.0)
+        selected = self.__selectedColumns()
+        names = [self.channelNames[col] for col in selected]
+        columns = [column + 5 for node, name, column in self.channelMap]
+        numColumns = len(self.__titles) + 1
+        deadzone = max(self.deadzone, 1)
+        pre = max(int(math.ceil(self.sampleSize * self.locationCoefficient)), 0) + 1
+        keptTimes = np.empty(0, dtype=np.int64)
+        keptChannels = np.empty((0, len(self.channelMap)), dtype=self.__dtype)
+        keptStart, numRows, position = 0, 0, self.__dataStart
+        pending, final = None, []  # the trigger that may still move and the final ones waiting on their windows
+        found, idle = 0, 0.0
+        if self.__verbosity: print '<-> Following {}, stop with Ctrl-C..'.format(self.__originalFilename)
+        try:
+            with open(self.__originalFilename, 'rb') as csvFile:
+                while timeout is None or idle < timeout:
+                    size = os.fstat(csvFile.fileno()).st_size
+                    if size < position:
+                        print "<WARNING> {} got shorter, it was likely restarted, stopping".format(
+                            self.__originalFilename)
+                        break
+                    csvFile.seek(position)
+                    block = csvFile.read(min(size - position, PARSE_CHUNK_SIZE))
+                    block = block[:block.rfind("\n") + 1]  # a row still being written is left for the next check
+                    if not block:
+                        time.sleep(interval)
+                        idle += interval
+                        continue
+                    idle = 0.0
+                    position += len(block)
+                    fields = parseDataFields(block, self.__dialect, numColumns)
+                    channels = fields[:, columns].astype(self.__dtype)
+                    timestamps = decodeTimestamps(fields[:, :6])
+                    keptTimes = np.concatenate((keptTimes, timestamps))
+                    keptChannels = np.concatenate((keptChannels, channels))
+                    with np.errstate(invalid="ignore"):
+                        score = np.fmax.reduce(triggerScores(sources.feed(timestamps, channels), None, self.polarity),
+                                               axis=1)
+                        candidates = np.flatnonzero(score >= self.threshold)
+                    for i in candidates:
+                        index, value = numRows + int(i), float(score[i])
+                        if pending is not None and index >= pending[0] + deadzone:
+                            final.append(pending)
+                            pending = None
+                        if pending is not None:
+                            if value > pending[1]: pending = (index, value)
+                        elif not final or index >= final[-1][0] + deadzone:
+                            pending = (index, value)
+                    numRows += len(fields)
+                    if pending is not None and numRows >= pending[0] + deadzone:
+                        final.append(pending)
+                        pending = None
+                    self.totalNumSamples = numRows
+                    # a capture is written once the last sample __cropData would take is in
+                    while final and numRows >= int(final[0][0] + (self.sampleSize -
+                                                                  self.sampleSize * self.locationCoefficient)):
+                        found += 1
+                        onCapture(self.__followCapture(final.pop(0), keptTimes, keptChannels, keptStart,
+                                                       selected, names))
+                    # drop the samples no trigger can reach any more
+                    waiting = final + ([pending] if pending is not None else [])
+                    keep = min([numRows - pre] + [index - pre for index, value in waiting])
+                    if keep > keptStart:
+                        keptTimes, keptChannels = keptTimes[keep - keptStart:], keptChannels[keep - keptStart:]
+                        keptStart = keep
+        except KeyboardInterrupt:
+            if self.__verbosity: print '<-> Interrupted'
+        # the last triggers get whatever part of their window was written
+        for trigger in final + ([pending] if pending is not None else []):
+            found += 1
+            onCapture(self.__followCapture(trigger, keptTimes, keptChannels, keptStart, selected, names))
+        if self.__verbosity: print '<+> Stopped following after {} samples'.format(numRows)
+        return found
+
+    def __followCapture(self, trigger, times, channels, offset, selected, names):
+        """
+        cuts the capture of a follow mode trigger out of the samples kept, as __cropData would from the whole file
+        :param trigger: the (index, value) of the trigger
+        :param times: the kept timestamps
+        :param channels: the kept channel matrix
+        :param offset: the sample index of the first kept sample
+        :return: a Capture holding copies of the samples
+        """
+        index, value = trigger
+        if self.__verbosity: print "<+> Found trigger at sample #{}, value; {}".format(index, value)
+        start, stop = self.__cropBounds(index)
+        return Capture(times[start - offset:stop - offset].copy(), channels[start - offset:stop - offset][:, selected],
+                       index, start, value, names)
+
+    def __mergePeaks(self, extremes, offset):
+        """
+        folds the extremes of one block into the running maxExtremes and minExtremes, the earlier sample wins a tie
+        :param extremes: the (maxExtremes, minExtremes) of the block as returned by __findMaxMinPeaks
+        :param offset: sample index of the first row of the block
+        :return: No return data.
+        """
+        for peak in sum(extremes[0] + extremes[1], []): peak[0] += offset
+        if self.maxExtremes is not None:
+            for axis in range(len(self.maxExtremes)):
+                extremes[0][axis] = sorted(self.maxExtremes[axis] + extremes[0][axis],
+                                           key=lambda p: (-p[2], p[0]))[:self.__numPeaks]
+                extremes[1][axis] = sorted(self.minExtremes[axis] + extremes[1][axis],
+                                           key=lambda p: (p[2], p[0]))[:self.__numPeaks]
+        self.__setPeaks(extremes)
+
+    @staticmethod
+    def __windowMask(index, starts, ends):
+        """
+        marks which of a sorted array of sample indexes fall inside any of the windows [starts[k], ends[k])
+        :return: a boolean array the length of index
+        """
+        if not len(starts): return np.zeros(len(index), dtype=bool)
+        order = np.argsort(starts)
+        starts, ends = starts[order], np.maximum.accumulate(ends[order])
+        position = np.searchsorted(starts, index, side="right") - 1
+        return (position >= 0) & (index < ends[np.maximum(position, 0)])
+
+    def __cropData(self, index, value=None):
         """
         Slices a piece of the sample data from the greater whole of samples
         :param index: the index of the peak data being looked at, note sample size and coefficient are considered
         also
-        :return: the cropped data
+        :param value: the trigger value, kept on the capture
+        :return: a Capture holding views of the cropped data
+        """
+        start, stop = self.__cropBounds(index)
+        selected = self.__selectedColumns()
+        channels = self.__channels[start:stop]
+        if len(selected) != len(self.channelMap): channels = channels[:, selected]
+        return Capture(self.__timestamps[start:stop], channels, index, start, value,
+                       [self.channelNames[col] for col in selected])
+
+    def __selectedColumns(self):
+        """
+        :return: the store columns of the selected nodes, every column when no nodes are selected
+        """
+        if self.selectedNodes is None: return range(len(self.channelMap))
+        unknown = [node for node in self.selectedNodes if node not in self.nodes]
+        if unknown:
+            raise MicroStrainDataError("no node {} in the file, the nodes are; {}".format(
+                ", ".join(unknown), ", ".join(self.nodes)))
+        return [col for col, (node, name, column) in enumerate(self.channelMap) if node in self.selectedNodes]
+
+    def __cropBounds(self, index):
+        """
+        works out which samples __cropData takes for a trigger
+        :param index: the index of the peak data being looked at
+        :return: the (start, stop) sample indexes, stop is never before start
         """
         # beginning index = positionalIndex - (size * coefficient)
         # ending index = positionalIndex + (size - (size * coefficient))
@@ -171,155 +2591,352 @@ class MicroStrainData:
         lC = self.locationCoefficient
         bI = int(index - (s * lC))
         eI = int(index + (s - (s * lC)))
-        return self.__sampleData[bI:eI]
+        start, stop, step = slice(bI, eI).indices(self.totalNumSamples)
+        return start, max(start, stop)
 
-    @staticmethod
-    def __parseAxies(axisStr):
+    def __parseAxies(self, axisStr):
         """
-        takes a string containing any combination of x, y, and z and places the sample data index number into a list
-        to be used by the cropping tool to identify which columns can initiate peak triggers
-        :param axisStr: Any combination of x, y and z in a string
-        :return: A list of 0, 1, or 2 corresponding to x, y, z
+        takes a comma separated list of channels and places their store column numbers into a list to be used by the
+        cropping tool to identify which columns can initiate peak triggers.  Each entry is any combination of x, y
+        and z, a channel name such as ch4 or * for every channel, optionally prefixed with a node as in 523:z, without
+        a node it applies to every selected node.  An entry can also be a derived channel, mag or one of the
+        DERIVED_RE filters of a channel, hp5(z) for example, worked out for every selected node that has the channels
+        it needs
+        :param axisStr: the channel list, "xyz" for example
+        :return: A list of store columns and DerivedChannel objects
         """
+        selected = self.__selectedColumns()
         new = []
-        for char in axisStr:
-            if char == 'x':
-                assert 1 not in new
-                new.append(0)
-            elif char == 'y':
-                assert 2 not in new
-                new.append(1)
-            elif char == 'z':
-                assert 3 not in new
-                new.append(2)
+        for entry in axisStr.split(","):
+            node, separator, names = entry.strip().rpartition(":")
+            if names == RESULTANT_NAME or DERIVED_RE.match(names):
+                for channelNode in self.nodes:
+                    if separator and channelNode != node: continue
+                    derived = self.__bindDerived(names, channelNode, selected)
+                    if isinstance(derived, DerivedChannel) and derived.name not in [
+                            axis.name for axis in new if isinstance(axis, DerivedChannel)]:
+                        new.append(derived)
+                continue
+            names = list(names) if names and set(names) <= set(AXIS_NAMES) else [names]
+            for name in names:
+                for col in selected:
+                    channelNode, channelName, column = self.channelMap[col]
+                    if separator and channelNode != node: continue
+                    if (name == "*" or name == channelName) and col not in new: new.append(col)
+        if not new:
+            raise MicroStrainDataError("no channel matches the trigger axis '{}', the channels are; {}".format(
+                axisStr, ", ".join(self.channelNames[col] for col in selected)))
         return new
 
+    def __bindDerived(self, spec, node, selected):
+        """
+        resolves a derived channel of __parseAxies for one node
+        :param spec: mag, a channel name or a DERIVED_RE filter of one of those
+        :param node: the node whose channels it is worked out from
+        :param selected: the store columns of the selected nodes
+        :return: a DerivedChannel, the store column for a plain channel name, or None when the node doesn't have
+        the channels it needs
+        """
+        prefix = "{}:".format(node) if len(self.nodes) > 1 else ""
+        columns = dict((name, col) for col in selected for channelNode, name, column in [self.channelMap[col]]
+                       if channelNode == node)
+        if spec == RESULTANT_NAME:
+            if not set(AXIS_NAMES) <= set(columns): return None
+            return DerivedChannel(prefix + spec, spec, [columns[name] for name in AXIS_NAMES])
+        match = DERIVED_RE.match(spec)
+        if not match: return columns.get(spec)
+        kind, parameter, inner = match.groups()
+        source = self.__bindDerived(inner.strip(), node, selected)
+        if source is None: return None
+        try:
+            parameter = float(parameter) if parameter else DERIVED_DEFAULTS[kind]
+        except ValueError:
+            raise MicroStrainDataError("bad parameter in the derived channel '{}'".format(spec))
+        if kind == "rms":
+            parameter = int(parameter)
+            if parameter < 1: raise MicroStrainDataError("the RMS window of '{}' must be at least 1".format(spec))
+        innerName = source.name[len(prefix):] if isinstance(source, DerivedChannel) else self.channelMap[source][1]
+        return DerivedChannel("{}{}{:g}({})".format(prefix, kind, parameter, innerName), kind, source, parameter)
+
     @staticmethod
-    def __findSampleRate(data):
+    def __findSampleRate(timestamps):
         """
-        finds the mean sample rate over all samples
-        :rtype: datetime.timedelta
+        measures the sample period from the spacing of the timestamps, any spacing well beyond the typical one is a
+        gap (dropped packets or paused logging) and is left out of the average
+        :param timestamps: the parsed timestamp array
+        :return: the mean sample period in nanoseconds and a list of gaps in the following format
+        [[indexAfterGap, timestampAfterGap, gapDuration, missingSamples], ...]
         """
-        return (data[-1][0] - data[0][0]) / len(data)
+        if len(timestamps) < 2:
+            return 0.0, []
+        spacing = np.diff(timestamps)
+        gapMask = spacing > np.median(spacing) * GAP_TOLERANCE
+        period = float(spacing[~gapMask].mean()) if not gapMask.all() else float(np.median(spacing))
+        gaps = []
+        for i in np.flatnonzero(gapMask):
+            gaps.append([int(i) + 1, nanosecondsToDatetime(timestamps[i + 1]),
+                         timedelta(microseconds=spacing[i] / 1000.0), int(round(spacing[i] / period)) - 1])
+        return period, gaps
 
     @staticmethod
-    def __findMaxMinPeaks(data):
-        """
-        Does stuff to data and returns peak data
-        :param data: the parsed CSV data
-        :return: maximum and minimum peak data in the following format
-        [maxIndex, maxTimestamp, maxValue], [minIndex, minTimestamp, minValue]
-        """
-        aMax = sys.maxint
-        aMin = sys.maxint * -1
-        newMax = [[], [], []]
-        newMin = [[], [], []]
-        buffMax = [aMin, aMin, aMin]
-        buffMin = [aMax, aMax, aMax]
-        for row in data:
-            for col in range(1, 4):
-                if row[col] > buffMax[col - 1]:
-                    buffMax[col - 1] = row[col]
-                    newMax[col - 1] = [data.index(row), row[0], row[col]]
-                if row[col] < buffMin[col - 1]:
-                    buffMin[col - 1] = row[col]
-                    newMin[col - 1] = [data.index(row), row[0], row[col]]
+    def __findMaxMinPeaks(timestamps, channels, k=DEFAULT_NUM_PEAKS):
+        """
+        Finds the k largest and k smallest values of every channel with vectorized passes over the channel matrix,
+        a tie goes to the earliest sample.  With more channels than a single accelerometer has the passes are
+        spread over a pool of PEAK_SEARCH_THREADS threads, threads share the matrix where worker processes would
+        each need a copy of it
+        :param timestamps: the parsed timestamp array
+        :param channels: the parsed channel matrix
+        :param k: the number of extremes wanted per channel and polarity
+        :return: one list of up to k peaks per channel for the maximums and the minimums, most extreme first, in
+        the following format [[[maxIndex, maxTimestamp, maxValue], ...], ...], [[[minIndex, minTimestamp, minValue],
+        ...], ...]
+        """
+        pool = None
+        if channels.shape[1] > len(AXIS_NAMES) and PEAK_SEARCH_THREADS > 1: pool = ThreadPool(PEAK_SEARCH_THREADS)
+        try:
+            maxIndexes, minIndexes = columnExtremes(channels, k, pool)
+        finally:
+            if pool is not None: pool.close()
+        newMax, newMin = [], []
+        for col, highest, lowest in zip(range(channels.shape[1]), maxIndexes, minIndexes):
+            newMax.append([[int(i), nanosecondsToDatetime(timestamps[i]), float(channels[i, col])] for i in highest])
+            newMin.append([[int(i), nanosecondsToDatetime(timestamps[i]), float(channels[i, col])] for i in lowest])
         return newMax, newMin
 
     def __parseFromFile(self, csvFilename):
         """
-        opens the csv file, checks for valid data the parses the data into a matrix list and returns
+        opens the csv file and memory-maps it for __parseData
         :param csvFilename: the name of the csv file being worked with
-        :return: the matrix of data [[datetime1, x1, y1, z1], [datetime2, x2, y2, z2], ...]
+        :return: a tuple of the timestamp array [t1, t2, ...] in nanoseconds and the channel matrix
+        [[x1, y1, z1], [x2, y2, z2], ...]
         """
         if self.__verbosity: print '<-> Opening CSV file..'
-        try:
+        with self.__stage("open"):
             if not os.access(csvFilename, os.F_OK):
-                print "<ERROR> file does not exist"
-                raise OSError(csvFilename)
+                raise MicroStrainDataError("file does not exist; {}".format(csvFilename))
             if not os.access(csvFilename, os.R_OK):
-                print "<ERROR> unable to read file, check permissions"
-                raise OSError(csvFilename)
-        except OSError:
-            sys.exit(1)
-        with open(csvFilename, 'rb') as csvFilename:
+                raise MicroStrainDataError("unable to read file, check permissions; {}".format(csvFilename))
+            with open(csvFilename, 'rb') as csvFile:
+                # an empty file can't be mapped, it has no DATA_START tag either way
+                data = mmap.mmap(csvFile.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(csvFile.fileno()).st_size \
+                    else ""
+        try:
             if self.__verbosity: print '<+> File opened successfully'
-            if self.__verbosity: print '<-> Checking validity..'
-            dialect = self.__checkCsvValidity(csvFilename)
-            if self.__verbosity:
-                print '<+> Valid file'
-                print '<-> Loading file into CSV parser..'
-            self.__findDataStart(csvFilename)
-            while True:
-                if csvFilename.read(1) == "\n": break  # skip over the column title line
-            csvReadObj = csv.reader(csvFilename, dialect)
-            # convert the reader object to a linked list
-            samples = []
-            for row in csvReadObj:
-                # the samples list is filled with the parsed csv data in this format
-                #    0 = a datetime object that matches the timestamp of the csv row
-                #    1 = the x axis g-force value as a floating point number object
-                #    2 = the y axis in the same format
-                #    3 = the z axis in the same format
-                x = float(row[X_CHANNEL])
-                y = float(row[Y_CHANNEL])
-                z = float(row[Z_CHANNEL])
-                samples.append([datetime.strptime(row[0][:24], TIME_FORMAT), x, y, z])
-            if self.__verbosity: print '<+> CSV file successfully parsed'
-        return samples
+            return self.__parseData(data)
+        finally:
+            if isinstance(data, mmap.mmap): data.close()
 
-    @staticmethod
-    def __checkCsvValidity(csvFile):
+    def __parseData(self, data):
+        """
+        checks the contents of a csv file for valid data and parses it, the preamble is found in one scan and the
+        data region is then parsed a byte range at a time
+        :param data: the contents of the file, a string or a memory map
+        :return: a tuple of the timestamp array [t1, t2, ...] in nanoseconds and the channel matrix
+        [[x1, y1, z1], [x2, y2, z2], ...]
+        """
+        if self.__verbosity: print '<-> Checking validity..'
+        with self.__stage("header"):
+            sections, titleStart, dataStart = scanPreamble(data)
+            self.header.update(sections)
+        with self.__stage("sniff"):
+            dialect = self.__checkCsvValidity(data[titleStart:titleStart + SNIFF_SIZE])
+        if self.__verbosity:
+            print '<+> Valid file'
+            print '<-> Loading file into CSV parser..'
+        self.__readChannelInfo()
+        titles = next(csv.reader([data[titleStart:dataStart]], dialect), [])
+        self.__setChannelMap(titles[1:])
+        self.__dialect, self.__dataStart = dialect, dataStart
+        if self.__stream:
+            if self.__verbosity: print '<+> Header read, the data will be streamed'
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.channelMap)), dtype=self.__dtype)
+        synthesize = self.__timeMode == "synthesized"
+        if synthesize and not self.declaredSampleRate:
+            print "<WARNING> CHANNEL_INFO has no single sample rate to synthesize timestamps from, parsing them"
+            synthesize = False
+        with self.__stage("parse") as stage:
+            parsed = self.__parseDataRegion(data, dataStart, dialect, synthesize)
+            if parsed is None:
+                # a spot check failed, the synthesized timestamps can't be trusted so decode every row instead
+                parsed = self.__parseDataRegion(data, dataStart, dialect, False)
+            stage.rows = len(parsed[0])
+        if self.__verbosity: print '<+> CSV file successfully parsed'
+        return parsed
+
+    def __parseDataRegion(self, data, dataStart, dialect, synthesize):
         """
-        This function takes a CSV file produced by LORD corp's Sensor Connect software and checks for proper CSV
-        formatting if found it returns a CSV library's dialect object
-        :param csvFile: an open csv file of the right format
-        :return: no return value
+        parses every data row from dataStart to the end of the file, the data region is split into whole row byte
+        ranges of PARSE_CHUNK_SIZE bytes that are each parsed in bulk, by a pool of worker processes when there is
+        more than one range
+        :param data: the memory-mapped file
+        :param dataStart: the offset of the first data row
+        :param dialect: the csv dialect of the file
+        :param synthesize: build the timestamps from the declared sample rate instead of decoding every row
+        :return: a tuple of the timestamp array and the channel matrix, or None if synthesized timestamps failed
+        a spot check
         """
-        MicroStrainData.__findDataStart(csvFile)
+        # the rows are packed into numpy arrays
+        #    timestamps = nanoseconds since the epoch matching the timestamp of the csv row
+        #    channels   = one row per sample, the channel values in channelMap order
+        columns = [column + 5 for node, name, column in self.channelMap]
+        ranges = splitRanges(data, dataStart, len(data), PARSE_CHUNK_SIZE)
+        firstRowEnd = data.find("\n", dataStart)
+        numColumns = data[dataStart:firstRowEnd if firstRowEnd >= 0 else len(data)].count(dialect.delimiter) + 1
+        # worker processes of a pool (the batch processor's) can't start a pool of their own
+        workers = min(self.__parseWorkers, len(ranges))
+        if workers > 1 and not multiprocessing.current_process().daemon:
+            timestamps, channels, spotIndex, spotTimes = self.__parseRanges(ranges, numColumns, dialect, columns,
+                                                                            workers, synthesize)
+        else:
+            timestamps, channels, spotIndex, spotTimes = [], [], [], []
+            numRows = 0
+            for start, stop in ranges:
+                spots, times, block = parseRange(data, start, stop, numColumns, dialect, columns, self.__dtype,
+                                                 numRows if synthesize else None)
+                if synthesize:
+                    spotIndex.append(numRows + spots)
+                    spotTimes.append(times)
+                else:
+                    timestamps.append(times)
+                channels.append(block)
+                numRows += len(block)
+            channels = np.concatenate(channels) if channels else np.empty((0, len(columns)), dtype=self.__dtype)
+            timestamps = np.concatenate(timestamps) if timestamps else np.empty(0, dtype=np.int64)
+            if synthesize and spotIndex: spotIndex, spotTimes = np.concatenate(spotIndex), np.concatenate(spotTimes)
+        if not synthesize or not len(channels):
+            return timestamps, channels
+        period = NANOSECONDS_PER_SECOND / self.declaredSampleRate
+        timestamps = spotTimes[0] + np.rint(np.arange(len(channels)) * period).astype(np.int64)
+        drift = np.abs(spotTimes - timestamps[spotIndex])
+        if (drift > period / 2).any():
+            failed = spotIndex[np.argmax(drift > period / 2)]
+            print "<WARNING> timestamps stop following the {}Hz sample rate before sample #{}, ".format(
+                self.declaredSampleRate, failed) + "likely dropped packets, decoding every timestamp instead"
+            return None
+        return timestamps, channels
+
+    def __parseRanges(self, ranges, numColumns, dialect, columns, workers, synthesize):
+        """
+        parses the byte ranges of the data region on a pool of worker processes that each map the file, the rows
+        in every range are counted first so the parsed rows can be written straight into shared arrays at the
+        right place, rather than being sent back and joined together
+        :param ranges: the (start, stop) byte ranges from splitRanges
+        :param numColumns: the number of columns in a row, the timestamp included
+        :param dialect: the csv dialect of the file
+        :param columns: the field of each stored channel in a row of the parseDataBlock matrix
+        :param workers: the number of worker processes
+        :param synthesize: only decode the timestamps of the spot check rows
+        :return: a tuple of the timestamp array (empty when synthesizing), the channel matrix, and the rows and
+        timestamps of the spot checks (empty lists unless synthesizing)
+        """
+        pool = multiprocessing.Pool(workers, initParseWorker, (self.__originalFilename,))
         try:
-            dialect = csv.Sniffer().sniff(csvFile.read(1024))
-            csvFile.seek(0)
-            return dialect
-        except csv.Error:
-            print "<ERROR> improper formatting of CSV file, Exiting."
-            sys.exit(1)
+            bounds = pool.map(countRangeWorker, ranges, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        total, dtype = sum(bounds), np.dtype(self.__dtype)
+        offsets = np.cumsum([0] + bounds[:-1]).tolist()
+        timestampBuffer = multiprocessing.RawArray("b", 8 if synthesize else total * 8)
+        channelBuffer = multiprocessing.RawArray("b", total * len(columns) * dtype.itemsize)
+        settings = (numColumns, dict((name, getattr(dialect, name)) for name in DIALECT_ATTRIBUTES), columns, dtype.str,
+                    synthesize)
+        pool = multiprocessing.Pool(workers, initParseWorker, (self.__originalFilename, settings, timestampBuffer,
+                                                               channelBuffer))
+        try:
+            results = pool.map(parseRangeWorker, [(start, stop, offset) for (start, stop), offset in
+                                                  zip(ranges, offsets)], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        counts = [count for count, spots, times in results]
+        timestamps = np.empty(0, dtype=np.int64) if synthesize else np.frombuffer(timestampBuffer, dtype=np.int64)
+        channels = np.frombuffer(channelBuffer, dtype=dtype).reshape(total, len(columns))
+        if counts != bounds:
+            # blank lines were counted as rows, close up the rows they left unused
+            keep = np.concatenate([np.arange(offset, offset + count) for offset, count in zip(offsets, counts)])
+            channels = channels[keep]
+            if not synthesize: timestamps = timestamps[keep]
+        if not synthesize: return timestamps, channels, [], []
+        firstRows = np.cumsum([0] + counts[:-1])
+        spotIndex = np.concatenate([first + spots for first, (count, spots, times) in zip(firstRows, results)])
+        spotTimes = np.concatenate([times for count, spots, times in results])
+        return timestamps, channels, spotIndex, spotTimes
+
+    @staticmethod
+    def __readDataBlocks(csvFile, dialect):
+        """
+        reads the data region from the current position of the file to its end in blocks of PARSE_CHUNK_SIZE bytes
+        (rounded out to whole rows) and parses each in bulk
+        :param csvFile: the open csv file, positioned at the first data row
+        :param dialect: the csv dialect of the file
+        :return: a generator of (n, numColumns + 5) field matrices as returned by parseDataBlock
+        """
+        numColumns = None
+        while True:
+            block = csvFile.read(PARSE_CHUNK_SIZE)
+            if not block: break
+            block += csvFile.readline()
+            if numColumns is None: numColumns = block[:block.find("\n")].count(dialect.delimiter) + 1
+            fields = parseDataFields(block, dialect, numColumns)
+            if len(fields): yield fields
+
+    def __readChannelInfo(self):
+        """
+        builds the channelInfo dictionary out of the CHANNEL_INFO block of the header, it maps each channel name
+        to a dictionary of its CHANNEL_INFO columns, the declared sample rate is set if all channels share one
+        :return: No return data.
+        """
+        rows = self.header.get("CHANNEL_INFO", [])
+        if not rows: return
+        for row in rows[1:]:
+            self.channelInfo[row[0]] = dict(zip(rows[0], row))
+        rates = set(parseSampleRate(info.get("SampleRate", "")) for info in self.channelInfo.values())
+        if len(rates) == 1 and None not in rates:
+            self.declaredSampleRate = rates.pop()
 
     @staticmethod
-    def __findDataStart(csvFile):
+    def __checkCsvValidity(sample):
         """
-        This function takes a CSV file produced by LORD corp's Sensor Connect software and searches for the beginning of
-        raw data, this is tagged 'DATA_START', if none is found it throws the error message and exits
-        :param csvFile: The current open csv file
-        :return: The same file but now at the appropriate line where raw data begins
+        This function takes the start of the data region of a CSV file produced by LORD corp's Sensor Connect
+        software and checks for proper CSV formatting if found it returns a CSV library's dialect object
+        :param sample: up to SNIFF_SIZE bytes from the column title row on
+        :return: the csv dialect
         """
         try:
-            while True:
-                line = csvFile.readline()
-                if "" == line:
-                    raise EOFError
-                if 'DATA_START' in line:
-                    return csvFile
-        except EOFError:
-            print '<ERROR> Did not find DATA_START tag in CSV file, ' + \
-                  'likely it did not come from the Sensor Connect software. Exiting.'
-            sys.exit(1)
+            # only whole rows are sniffed, a row cut short throws off the delimiter count of wide multi-node files
+            return csv.Sniffer().sniff(sample[:sample.rfind("\n") + 1] or sample)
+        except csv.Error:
+            # the title row alone isn't always enough to tell the delimiter
+            if len([row for row in sample.splitlines() if row.strip()]) < 2:
+                raise MicroStrainDataError("no data rows in the file")
+            raise MicroStrainDataError("improper formatting of CSV file")
 
     # the rest of these are just accessor functions
+    def getSamples(self):
+        """
+        :return: the timestamp array and the channel matrix, empty in stream mode
+        """
+        return self.__timestamps, self.__channels
+
     def setVerbosity(self, v):
         assert type(v) == bool
         self.__verbosity = v
 
     def setMaxMode(self):
         self.numCaptures = 1
+        self.__invalidate("triggers")
 
     def setNumCaptures(self, c):
         assert type(c) == int
         self.numCaptures = c
+        self.__invalidate("triggers")
 
     def setDeadzone(self, d):
         assert type(d) == int
         self.deadzone = d
+        self.__invalidate("triggers")
 
     def setPlotMode(self, p):
         assert type(p) == bool
@@ -328,6 +2945,12 @@ class MicroStrainData:
     def setTriggerAxis(self, t):
         assert type(t) == str
         self.triggerAxis = t
+        self.__invalidate("triggers", "events")
+
+    def setNodes(self, n):
+        assert n is None or type(n) == list
+        self.selectedNodes = n
+        self.__invalidate("triggers", "events")
 
     def setSampleSize(self, s):
         assert type(s) == int
@@ -336,13 +2959,39 @@ class MicroStrainData:
     def setPolarity(self, p):
         assert p in ["+", "-", "+-"]
         self.polarity = p
+        self.__invalidate("triggers", "events")
 
     def setLocationCoefficient(self, lc):
         assert type(lc) == Fraction
         self.locationCoefficient = lc
 
+    def setThreshold(self, t, rearm=None):
+        assert t > 0 and (rearm is None or rearm <= t)
+        self.threshold = t
+        self.rearmThreshold = rearm
+        self.__invalidate("events")
 
-def main():
+    def setMinDuration(self, d):
+        assert type(d) == int and d > 0
+        self.minDuration = d
+        self.__invalidate("events")
+
+    def setHoldoff(self, h):
+        assert type(h) == int and h >= 0
+        self.holdoff = h
+        self.__invalidate("events")
+
+    def setProfiler(self, profiler):
+        assert profiler is None or isinstance(profiler, StageProfiler)
+        self.__profiler = profiler
+
+
+def buildArgumentParser():
+    """
+    sets up the command line options shared by this script and the batch processor, the input file arguments
+    are left for the caller to add
+    :return: an argparse.ArgumentParser
+    """
     # argument data
     verbose_help = "Verbose: Prints a lot more data to the screen concerning what the parser is doing"
     max_help = "Maximum mode: This mode finds the largest spike on the specified axis and truncates that " + \
@@ -351,13 +3000,21 @@ def main():
                   " default value is %s.  This is the default mode." % \
                   DEFAULT_NUM_CAPTURES + \
                   " maximum mode though setting the value to 1 essentially does the same thing. "
-    deadzone_help = "Dead-zone: when preforming multiple captures this value creates a dead-zone of N captures" + \
-                    "both before and after the trigger. When the next highest peak is within the dead-zone it will" + \
-                    "not initiate the next trigger, done to avoid all triggers within one graph, default is {}," + \
-                    "usually 1/4 of sample size.".format(DEFAULT_DEADZONE)
+    deadzone_help = ("Dead-zone: when preforming multiple captures this value creates a dead-zone of N captures " +
+                     "both before and after the trigger. When the next highest peak is within the dead-zone it will " +
+                     "not initiate the next trigger, done to avoid all triggers within one graph, default is {}, " +
+                     "usually 1/4 of sample size. Each trigger is the largest value left outside the dead-zones " +
+                     "of the triggers picked before it, only those triggers make dead-zones").format(DEFAULT_DEADZONE)
     axis_help = "Axis: This is where to specify the axis or axises that will initiate triggering " + \
-                " default is to use all axises(xyz)."
-    axis_choices = ["x", "y", "z", "xy", "xz", "yz", "xyz"]
+                " default is to use all axises(xyz). Takes a comma separated list of x, y, z combinations, " + \
+                "channel names such as ch4 or * for every channel, each optionally prefixed by a node, 523:z. " + \
+                "Derived channels trigger too; mag is the resultant of x, y and z, hpF(ch) and lpF(ch) a high- " + \
+                "or low-pass filter at F Hz, dcF(ch) the channel with gravity and offset below F Hz taken off " + \
+                "and rmsN(ch) the moving RMS of N samples, they nest, rms64(hp5(mag)) for example"
+    nodes_help = "Nodes: a comma separated list of the wireless nodes to trigger on and export, default is every " + \
+                 "node in the file"
+    per_node_help = "Per Node: trigger and export every node on its own, the captures of each node are saved to " + \
+                    "their own files, sample_node523_trunc1.csv"
     plot_help = "Plot: When this mode is active a plot is drawn to the screen after file processing"
     title_help = 'Title: Allows for changing of the plot title, make sure to put the new title in quotation ' + \
                  'marks, "title"'
@@ -365,14 +3022,80 @@ def main():
     size_help = "Sample Size: the number of samples to include in each truncated export file. Default is %d." % \
                 DEFAULT_SAMPLE_SIZE
     polarity_help = "Polarity: Sets triggering to activate on positive spike, negative spike, or both. " + \
-                    " Default is %s" % DEFAULT_POLARITY
+                    "+ ranks samples on their value, - on their negated value (only negative spikes) and +- on " + \
+                    "their magnitude. Default is %s" % DEFAULT_POLARITY
     coefficient_help = "Location Coefficient: This a fraction that details how far into the cropped sample the " + \
                        "detected peak should be, default is %s" % DEFAULT_LOCATION_COEFFICIENT
-    file_help = "File: the absolute path of the CSV file being parsed\n"
     output_help = "Output: specify the name of an output file, the default is the input filename appended " + \
                   " with a '_trunc.csv' at the end. specified output files need to end with a .csv also if " + \
                   " creating multiple output files they will be numbered regardless of whether the user " + \
                   " specifies a new file or not. Example; sample.csv >> sample_trunc1.csv"
+    timestamps_help = "Timestamps: 'parsed' decodes the timestamp of every row, 'synthesized' builds them from the " + \
+                      "first row and the SampleRate in the CHANNEL_INFO block, spot checking rows along the way " + \
+                      "and falling back to parsing if packets were dropped. Default is %s" % DEFAULT_TIMESTAMP_MODE
+    stream_help = "Stream: reads the file one block at a time keeping only the trigger candidates and the samples " + \
+                  "around them in memory, for files too large to load whole. Gives the same captures as the " + \
+                  "default mode, timestamps are always parsed"
+    peaks_help = "Peaks: the number of largest and smallest values per axis to find while loading, in verbose mode " + \
+                 "they are listed after the file summary. Default is %d" % DEFAULT_NUM_PEAKS
+    cache_help = "Cache: 'use' loads the parsed samples from a binary cache file when it matches the CSV file and " + \
+                 "writes one after parsing, 'refresh' always parses and rewrites the cache, 'off' neither reads nor " + \
+                 "writes it. Default is %s" % DEFAULT_CACHE_MODE
+    cache_dir_help = "Cache Directory: keep cache files in this shared directory instead of next to the CSV file, " + \
+                     "the least recently used are deleted once it grows past the cache limit"
+    cache_limit_help = "Cache Limit: the size in megabytes a shared cache directory is trimmed back to. " + \
+                       "Default is %d" % DEFAULT_CACHE_LIMIT
+    events_help = "Events: capture every event on the trigger axes instead of a set number of peaks, an event " + \
+                  "starts at the threshold and ends once the signal falls back under the re-arm threshold, an " + \
+                  "index of the events is saved to sample_events.csv"
+    threshold_help = "Threshold: the g-force an event starts at in event mode. Default is %s" % DEFAULT_THRESHOLD
+    rearm_help = "Re-arm: the g-force the signal has to fall under to end an event, default is %s of the " % \
+                 DEFAULT_REARM_FRACTION + "threshold"
+    min_duration_help = "Minimum Duration: events lasting fewer samples than this are ignored. Default is %d" % \
+                        DEFAULT_MIN_DURATION
+    format_help = "Format: the file format captures are saved in, csv, npy (a numpy structured array), npz " + \
+                  "(numpy arrays) or bin (a plain binary layout, see writeBin). Default is %s" % DEFAULT_EXPORT_FORMAT
+    combined_help = "Combined: save all the captures to one file, sample_captures.csv, with the capture number " + \
+                    "as the first column"
+    export_threads_help = "Export Threads: the number of background threads formatting and writing capture " + \
+                          "files at the same time, once every capture has been cut (as each is cut with -F). " + \
+                          "Default is %d" % DEFAULT_EXPORT_THREADS
+    plot_format_help = "Plot Format: draw the plots off screen and save them next to the captures as png or svg " + \
+                       "files, sample_trunc1.png, instead of opening a window for each"
+    plot_workers_help = "Plot Workers: the number of processes drawing plots to file. Default is %d" % \
+                        DEFAULT_PLOT_WORKERS
+    plot_points_help = "Plot Points: each plotted channel keeps the lowest and highest sample of this many " + \
+                       "stretches of the capture so long captures plot quickly without losing peaks. Default is %d" % \
+                       DEFAULT_PLOT_POINTS
+    follow_help = "Follow: keep watching a file Sensor Connect is still writing and save each capture as soon as " + \
+                  "the samples after its trigger are in, a trigger is any sample reaching the threshold (-th) " + \
+                  "outside the dead-zone of the one before. Stop with Ctrl-C"
+    follow_interval_help = "Follow Interval: seconds between checks for new rows in follow mode. Default is %s" % \
+                           DEFAULT_FOLLOW_INTERVAL
+    follow_timeout_help = "Follow Timeout: stop following once no rows have been added for this many seconds"
+    profile_help = "Profile: save the wall time, CPU time, rows processed and peak memory of every stage of the " + \
+                   "run to this json file"
+    profile_stage_help = "Profile Stage: also run this stage under cProfile and save the profile next to the " + \
+                         "stats file with a .prof extension, one of %s" % ", ".join(PROFILE_STAGES)
+    parse_workers_help = "Parse Workers: the number of processes parsing a file longer than %d MB. Default is %d" % \
+                         (PARSE_CHUNK_SIZE // (1024 * 1024), DEFAULT_PARSE_WORKERS)
+    time_window_help = "Time Window: save only the samples from START to END, given as START,END, START,+SECONDS " + \
+                       "or TIME~SECONDS for the SECONDS around TIME.  Times are Sensor Connect timestamps or times " + \
+                       "of the day (on the day the recording starts), 15:31:02~10 for example.  Only the rows of " + \
+                       "the window are parsed, through a sparse time index saved next to the file"
+    sample_range_help = "Sample Range: save only the samples FIRST:LAST, counted from 0 with LAST left out, " + \
+                        "parsed through the time index the same way as -tw"
+    spectrum_help = "Spectrum: save the power spectral density of every channel of every capture to " + \
+                    "sample_spectra.npz and its strongest frequencies to sample_spectra.csv"
+    welch_help = "Welch: save the power spectral density of the whole recording by Welch's method to " + \
+                 "sample_welch.npz and its strongest frequencies to sample_welch.csv, this works in stream mode"
+    welch_segment_help = "Welch Segment: the length in samples of the half overlapping Welch segments. Default is " + \
+                         "%d" % DEFAULT_WELCH_SEGMENT
+    fft_window_help = "FFT Window: the taper applied before each transform. Default is %s" % DEFAULT_FFT_WINDOW
+    dominant_help = "Dominant: the number of strongest frequencies of each channel listed in the spectrum " + \
+                    "summaries. Default is %d" % DEFAULT_DOMINANT_FREQUENCIES
+    holdoff_help = "Holdoff: an event starting within this many samples of the end of the one before is part of " + \
+                   "it. Default is %d" % DEFAULT_HOLDOFF
 
     # argument parsing section, setup and execution
     parser = argparse.ArgumentParser()
@@ -383,99 +3106,522 @@ def main():
     parser.add_argument("-p", "--plot", action="store_true", help=plot_help)
     parser.add_argument("-t", "--title", type=str, help=title_help)
     parser.add_argument("-po", "--printout", action="store_true", help=printout_help)
-    parser.add_argument("-a", "--axis", type=str, choices=axis_choices, default=DEFAULT_TRIGGER_AXIS,
-                        help=axis_help)
+    parser.add_argument("-a", "--axis", type=str, default=DEFAULT_TRIGGER_AXIS, help=axis_help)
+    parser.add_argument("-N", "--nodes", type=str, help=nodes_help)
+    parser.add_argument("-pn", "--per-node", action="store_true", help=per_node_help)
     parser.add_argument("-s", "--size", type=int, default=DEFAULT_SAMPLE_SIZE, help=size_help)
     parser.add_argument("-pol", "--polarity", type=str, choices=["+", "-", "+-"],
                         default=DEFAULT_POLARITY, help=polarity_help)
     parser.add_argument("-c", "--coefficient", type=Fraction, default=DEFAULT_LOCATION_COEFFICIENT,
                         help=coefficient_help)
     parser.add_argument("-o", "--output", type=str, help=output_help)
-    parser.add_argument("filename", type=str, help=file_help)
-    args = parser.parse_args()
+    parser.add_argument("-ts", "--timestamps", type=str, choices=TIMESTAMP_MODES, default=DEFAULT_TIMESTAMP_MODE,
+                        help=timestamps_help)
+    parser.add_argument("-st", "--stream", action="store_true", help=stream_help)
+    parser.add_argument("-k", "--peaks", type=int, default=DEFAULT_NUM_PEAKS, help=peaks_help)
+    parser.add_argument("-ca", "--cache", type=str, choices=CACHE_MODES, default=DEFAULT_CACHE_MODE, help=cache_help)
+    parser.add_argument("-cd", "--cache-dir", type=str, help=cache_dir_help)
+    parser.add_argument("-cl", "--cache-limit", type=int, default=DEFAULT_CACHE_LIMIT, help=cache_limit_help)
+    parser.add_argument("-e", "--events", action="store_true", help=events_help)
+    parser.add_argument("-th", "--threshold", type=float, default=DEFAULT_THRESHOLD, help=threshold_help)
+    parser.add_argument("-ra", "--rearm", type=float, help=rearm_help)
+    parser.add_argument("-md", "--min-duration", type=int, default=DEFAULT_MIN_DURATION, help=min_duration_help)
+    parser.add_argument("-ho", "--holdoff", type=int, default=DEFAULT_HOLDOFF, help=holdoff_help)
+    parser.add_argument("-f", "--format", type=str, choices=EXPORT_FORMATS, default=DEFAULT_EXPORT_FORMAT,
+                        help=format_help)
+    parser.add_argument("-cb", "--combined", action="store_true", help=combined_help)
+    parser.add_argument("-et", "--export-threads", type=int, default=DEFAULT_EXPORT_THREADS, help=export_threads_help)
+    parser.add_argument("-F", "--follow", action="store_true", help=follow_help)
+    parser.add_argument("-fi", "--follow-interval", type=float, default=DEFAULT_FOLLOW_INTERVAL,
+                        help=follow_interval_help)
+    parser.add_argument("-ft", "--follow-timeout", type=float, help=follow_timeout_help)
+    parser.add_argument("-pf", "--plot-format", type=str, choices=PLOT_FORMATS, help=plot_format_help)
+    parser.add_argument("-pw", "--plot-workers", type=int, default=DEFAULT_PLOT_WORKERS, help=plot_workers_help)
+    parser.add_argument("-pp", "--plot-points", type=int, default=DEFAULT_PLOT_POINTS, help=plot_points_help)
+    parser.add_argument("-tw", "--time-window", type=str, help=time_window_help)
+    parser.add_argument("-sr", "--sample-range", type=str, help=sample_range_help)
+    parser.add_argument("-fft", "--spectrum", action="store_true", help=spectrum_help)
+    parser.add_argument("-W", "--welch", action="store_true", help=welch_help)
+    parser.add_argument("-ws", "--welch-segment", type=int, default=DEFAULT_WELCH_SEGMENT, help=welch_segment_help)
+    parser.add_argument("-fw", "--fft-window", type=str, choices=sorted(FFT_WINDOWS), default=DEFAULT_FFT_WINDOW,
+                        help=fft_window_help)
+    parser.add_argument("-df", "--dominant", type=int, default=DEFAULT_DOMINANT_FREQUENCIES, help=dominant_help)
+    parser.add_argument("-j", "--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS, help=parse_workers_help)
+    parser.add_argument("-P", "--profile", type=str, help=profile_help)
+    parser.add_argument("-Ps", "--profile-stage", type=str, choices=PROFILE_STAGES, help=profile_stage_help)
+    return parser
 
-    verbose = args.verbose if args.verbose != DEFAULT_VERBOSITY else DEFAULT_VERBOSITY
 
-    # Handle the above data via our new class
-    msd = MicroStrainData(args.filename, v=verbose)
+def loadFromArguments(filename, args, profiler=None):
+    """
+    opens a csv file as a MicroStrainData object and applies the command line settings to it
+    :param filename: the csv file
+    :param args: the parsed command line arguments
+    :param profiler: a StageProfiler to time the stages with, if any
+    :return: the MicroStrainData object
+    """
+    verbose = args.verbose if args.verbose != DEFAULT_VERBOSITY else DEFAULT_VERBOSITY
+    # a window only needs the header, its rows are parsed when it is cut
+    stream = bool(args.stream or args.follow or args.time_window or args.sample_range)
+    msd = MicroStrainData(filename, v=verbose, timeMode=args.timestamps, stream=stream,
+                          numPeaks=args.peaks, cache=args.cache, cacheDir=args.cache_dir,
+                          cacheLimit=args.cache_limit, profiler=profiler, parseWorkers=args.parse_workers)
     if args.maximum: msd.setMaxMode()
     if args.number != DEFAULT_NUM_CAPTURES: msd.setNumCaptures(args.number)
     if args.plot != DEFAULT_PLOT_MODE: msd.setPlotMode(args.plot)
     if args.axis != DEFAULT_TRIGGER_AXIS: msd.setTriggerAxis(args.axis)
+    if args.nodes: msd.setNodes([node.strip() for node in args.nodes.split(",")])
     if args.size != DEFAULT_SAMPLE_SIZE: msd.setSampleSize(args.size)
     if args.deadzone != DEFAULT_DEADZONE: msd.setDeadzone(args.deadzone)
     if args.polarity != DEFAULT_POLARITY: msd.setPolarity(args.polarity)
     if args.coefficient != DEFAULT_LOCATION_COEFFICIENT: msd.setLocationCoefficient(args.coefficient)
+    if args.threshold != DEFAULT_THRESHOLD or args.rearm is not None: msd.setThreshold(args.threshold, args.rearm)
+    if args.min_duration != DEFAULT_MIN_DURATION: msd.setMinDuration(args.min_duration)
+    if args.holdoff != DEFAULT_HOLDOFF: msd.setHoldoff(args.holdoff)
+    return msd
+
+
+def checkArguments(parser, args):
+    """
+    rejects combinations of the shared command line options that can't work together
+    :param parser: the argparse.ArgumentParser, as returned by buildArgumentParser
+    :param args: the parsed command line arguments
+    :return: No return data.
+    """
+    if args.events and args.maximum: parser.error("-e/--events and -m/--maximum can't be used together")
+    if args.events and args.stream:
+        parser.error("-e/--events needs the whole file and can't be used with -st/--stream")
+    if args.threshold <= 0: parser.error("-th/--threshold must be above 0")
+    if args.rearm is not None and args.rearm > args.threshold:
+        parser.error("-ra/--rearm can't be above the threshold")
+    if args.min_duration < 1: parser.error("-md/--min-duration must be at least 1")
+    if args.holdoff < 0: parser.error("-ho/--holdoff can't be negative")
+    if args.export_threads < 1: parser.error("-et/--export-threads must be at least 1")
+    if args.plot_workers < 1: parser.error("-pw/--plot-workers must be at least 1")
+    if args.parse_workers < 1: parser.error("-j/--parse-workers must be at least 1")
+    if args.plot_points < 1: parser.error("-pp/--plot-points must be at least 1")
+    if args.welch_segment < 2: parser.error("-ws/--welch-segment must be at least 2")
+    if args.dominant < 1: parser.error("-df/--dominant must be at least 1")
+    if args.follow_interval <= 0: parser.error("-fi/--follow-interval must be above 0")
+    if args.profile_stage and not args.profile: parser.error("-Ps/--profile-stage needs a stats file, -P")
+    if args.time_window and args.sample_range: parser.error("-tw/--time-window and -sr/--sample-range can't be used "
+                                                            "together")
+    for option, name in ((args.maximum, "-m/--maximum"), (args.events, "-e/--events"), (args.follow, "-F/--follow"),
+                         (args.per_node, "-pn/--per-node"), (args.combined, "-cb/--combined"),
+                         (args.spectrum or args.welch, "-fft/--spectrum and -W/--welch")):
+        if (args.time_window or args.sample_range) and option:
+            parser.error("-tw/--time-window and -sr/--sample-range can't be used with {}".format(name))
+    for option, name in ((args.maximum, "-m/--maximum"), (args.events, "-e/--events"),
+                         (args.per_node, "-pn/--per-node"), (args.combined, "-cb/--combined"),
+                         (args.plot or args.plot_format, "plotting"),
+                         (args.spectrum or args.welch, "-fft/--spectrum and -W/--welch")):
+        if args.follow and option: parser.error("-F/--follow can't be used with {}".format(name))
+
+
+def isMaxMode(msd, args):
+    """
+    :return: True when a single capture is cut around the largest peak the way sliceMax does
+    """
+    return (msd.numCaptures == 1 or args.maximum) and not args.events
+
 
-    if verbose:
-        print ""
-        print msd
-        print ""
+def sliceFromArguments(msd, args):
+    """
+    cuts the captures the command line asks for, in per node mode every selected node is triggered and cut on its
+    own and a node none of the trigger axes match is skipped
+    :param msd: the MicroStrainData object, as returned by loadFromArguments
+    :param args: the parsed command line arguments
+    :return: a list of (node, captures) pairs, node is None when the nodes are triggered together
+    """
+    maxMode = isMaxMode(msd, args)
 
-    if msd.numCaptures == 1 or args.maximum:  # maximum mode
-        postCroppedSamples = [[]]
-        postCroppedSamples[0] = msd.sliceMax()
+    def cut():
+        if args.events: return msd.sliceEvents()
+        return [msd.sliceMax()] if maxMode else msd.sliceNumTriggers()
+    if not args.per_node:
+        return [(None, cut())]
+    selectedNodes = msd.selectedNodes
+    groups = []
+    try:
+        for node in selectedNodes or msd.nodes:
+            msd.setNodes([node])
+            try:
+                msd.triggerChannels()
+            except MicroStrainDataError:
+                print "<WARNING> no trigger channel on node {}, skipping it".format(node)
+                continue
+            groups.append((node, cut()))
+    finally:
+        msd.setNodes(selectedNodes)
+    return groups
 
-        if args.printout: printSampleData(postCroppedSamples[0])
 
-        if verbose: print "<-> Saving data.."
-        filenameRe = re.compile(r"(.*)\.csv")
-        matchRe = filenameRe.match(args.filename)
-        outputFilename = matchRe.group(1) + "_trunc.csv" if not args.output else args.output
+def captureFilenames(filename, count, output=None, maxMode=False, node=None):
+    """
+    works out the names captures are saved under, in maximum mode the single capture goes to sample_trunc.csv,
+    otherwise they are numbered sample_trunc1.csv, sample_trunc2.csv, ... or after the output name when given.
+    Captures of a single node carry the node in their name, sample_node523_trunc1.csv
+    :param filename: the csv file the captures came from
+    :param count: the number of captures
+    :param output: the output filename from the command line, if any
+    :param maxMode: True when the capture came from sliceMax
+    :param node: the node the captures were cut from in per node mode
+    :return: a list of filenames, one per capture
+    """
+    matchRe = re.match(r"(.*)\.csv", filename)
+    stem = matchRe.group(1) if matchRe else filename
+    nodeSuffix = "_node{}".format(node) if node is not None else ""
+    if maxMode:
+        outputFilename = stem + nodeSuffix + "_trunc.csv" if not output else output
         if outputFilename[-4:] != ".csv":
             outputFilename += ".csv"
+        if output and node is not None: outputFilename = outputFilename[:-4] + nodeSuffix + ".csv"
+        return [outputFilename]
+    if not output:
+        return [stem + nodeSuffix + "_trunc{}.csv".format(i + 1) for i in range(count)]
+    stem = output if output[-4:] != ".csv" else output[:-4]
+    return [stem + nodeSuffix + "{}.csv".format(i + 1) for i in range(count)]
+
+
+def eventIndexFilename(filename, output=None, node=None):
+    """
+    works out the name an event index is saved under, sample_events.csv or the output name with _events added, with
+    the node added in per node mode as in captureFilenames
+    :return: the filename
+    """
+    matchRe = re.match(r"(.*)\.csv", output or filename)
+    stem = matchRe.group(1) if matchRe else output or filename
+    return stem + ("_node{}".format(node) if node is not None else "") + "_events.csv"
+
+
+def saveEventIndex(filename, captures, output=None, node=None):
+    """
+    writes the events the captures were cut around to an event index, named by eventIndexFilename
+    :return: the name of the file written
+    """
+    outputFilename = eventIndexFilename(filename, output, node)
+    print "<-> Saving event index to {}".format(outputFilename)
+    writeEventIndex(outputFilename, [capture.event for capture in captures])
+    return outputFilename
+
+
+def spectrumFilenames(filename, output=None, node=None, name="spectra"):
+    """
+    works out the names a spectrum is saved under, sample_spectra.npz for the arrays and sample_spectra.csv for the
+    summary, or after the output name when given, with the node added in per node mode as in captureFilenames
+    :param name: spectra for the capture spectra, welch for the whole file
+    :return: a tuple of the npz and csv filenames
+    """
+    matchRe = re.match(r"(.*)\.csv", output or filename)
+    stem = matchRe.group(1) if matchRe else output or filename
+    stem += ("_node{}".format(node) if node is not None else "") + "_" + name
+    return stem + ".npz", stem + ".csv"
+
+
+def saveCaptureSpectra(filename, msd, captures, args, node=None):
+    """
+    works out the spectra of the captures and writes them out, the npz archive holds the names of the channels, the
+    sample rate and for the captures of each length, numbered from 0, the arrays captures<g> (capture numbers
+    counting from 1), frequencies<g> and density<g> ((n, bins, m) in g^2/Hz)
+    :param msd: the MicroStrainData object the captures were cut from
+    :param captures: the captures
+    :param args: the parsed command line arguments
+    :param node: the node the captures were cut from in per node mode
+    :return: the list of files written
+    """
+    arraysFilename, summaryFilename = spectrumFilenames(filename, args.output, node)
+    names = captures[0].names if captures else []
+    groups = msd.captureSpectra(captures, args.fft_window)
+    print "<-> Saving the spectra of {} captures to {}".format(len(captures), arraysFilename)
+    arrays = {"names": np.array(names, dtype=str), "sampleFrequency": msd.sampleFrequency}
+    summary = []
+    for g, (positions, frequencies, density) in enumerate(groups):
+        numbers = np.array(positions, dtype=np.int32) + 1
+        arrays["captures{}".format(g)] = numbers
+        arrays["frequencies{}".format(g)] = frequencies
+        arrays["density{}".format(g)] = density
+        summary.append((numbers,) + dominantFrequencies(frequencies, density, args.dominant))
+    np.savez(arraysFilename, **arrays)
+    writeSpectrumSummary(summaryFilename, names, summary)
+    return [arraysFilename, summaryFilename]
+
+
+def saveWelchSpectrum(filename, msd, args):
+    """
+    works out the Welch spectrum of the whole recording and writes it out, the npz archive holds the arrays names,
+    sampleFrequency, frequencies and density ((bins, m) in g^2/Hz)
+    :param msd: the MicroStrainData object
+    :param args: the parsed command line arguments
+    :return: the list of files written
+    """
+    arraysFilename, summaryFilename = spectrumFilenames(filename, args.output, name="welch")
+    frequencies, density = msd.welchSpectrum(args.welch_segment, args.fft_window)
+    names = msd.selectedChannels()
+    print "<-> Saving the Welch spectrum to {}".format(arraysFilename)
+    np.savez(arraysFilename, names=np.array(names, dtype=str), sampleFrequency=frequencies[1] * args.welch_segment,
+             frequencies=frequencies, density=density)
+    writeSpectrumSummary(summaryFilename, names,
+                         [(None,) + dominantFrequencies(frequencies, density[np.newaxis], args.dominant)])
+    return [arraysFilename, summaryFilename]
+
+
+def combinedFilename(filename, output=None, node=None, fmt=DEFAULT_EXPORT_FORMAT):
+    """
+    works out the name the captures are saved under together, sample_captures.csv or the output name, with the node
+    added in per node mode as in captureFilenames
+    :return: the filename
+    """
+    matchRe = re.match(r"(.*)\.csv", output or filename)
+    stem = matchRe.group(1) if matchRe else output or filename
+    return stem + ("_node{}".format(node) if node is not None else "") + ("" if output else "_captures") + "." + fmt
+
+
+def saveCaptures(filename, captures, output=None, maxMode=False, verbose=DEFAULT_VERBOSITY, node=None,
+                 fmt=DEFAULT_EXPORT_FORMAT, combined=False, exporter=None):
+    """
+    writes every capture to its own file named by captureFilenames, or all of them to one file named by
+    combinedFilename with the capture number of every row, 1 for the first capture
+    :param fmt: one of EXPORT_FORMATS, the file extension follows it
+    :param combined: write the captures to one file
+    :param exporter: a CaptureExporter to queue the files on, without one they are written before returning
+    :return: the list of files written
+    """
+    if verbose: print "<-> Saving data.."
+    queue = exporter or CaptureExporter(1)
+    if combined:
+        outputFilename = combinedFilename(filename, output, node, fmt)
+        print "<-> Saving {} captures to {}".format(len(captures), outputFilename)
+        names = captures[0].names if captures else []
+        ids = np.repeat(np.arange(1, len(captures) + 1, dtype=np.int32), [len(capture) for capture in captures])
+        timestamps = np.concatenate([capture.timestamps for capture in captures]) if captures else \
+            np.empty(0, dtype=np.int64)
+        channels = np.concatenate([capture.channels for capture in captures]) if captures else np.empty((0, 0))
+        queue.write(fmt, outputFilename, timestamps, channels, names, ids)
+        return [outputFilename]
+    outputFilenames = [name[:-4] + "." + fmt for name in captureFilenames(filename, len(captures), output, maxMode,
+                                                                           node)]
+    for outputFilename, capture in zip(outputFilenames, captures):
         print "<-> Saving data to {}".format(outputFilename)
-        with open(outputFilename, 'wb') as outputFile:
-            outputWriter = csv.writer(outputFile)
-            for row in postCroppedSamples[0]:
-                time = row[0].strftime(TIME_FORMAT)
-                outputWriter.writerow([time, row[1], row[2], row[3]])
-        print "<+> Data saved!"
-
-    else:  # number mode
-        postCroppedSamples = msd.sliceNumTriggers()
-        if args.printout:
-            for capture in postCroppedSamples:
-                print ""
-                print "Capture number {}:".format(postCroppedSamples.index(capture) + 1)
-                print "-" * 60
-                printSampleData(capture, lC=msd.locationCoefficient)
-                print ""
-        if verbose: print "<-> Saving data.."
-        for capture in postCroppedSamples:
-            filenameRe = re.compile(r"(.*)\.csv")
-            if not args.output:
-                matchRe = filenameRe.match(args.filename)
-                outputFilename = matchRe.group(1) + "_trunc{}.csv".format(postCroppedSamples.index(capture) + 1)
+        queue.write(fmt, outputFilename, capture.timestamps, capture.channels, capture.names)
+    return outputFilenames
+
+
+def plotCaptures(filename, groups, channels, args, maxMode=False, workers=None):
+    """
+    plots the captures, to a window each with -p or to files named after the captures with -pf, numbered in the
+    title when there is more than one
+    :param filename: the csv file the captures came from
+    :param groups: the (node, captures) pairs from sliceFromArguments
+    :param channels: the names of the channels to plot
+    :param args: the parsed command line arguments
+    :param maxMode: True when the captures came from sliceMax, for naming the files as captureFilenames does
+    :param workers: the number of processes drawing plots to file, args.plot_workers by default
+    :return: the list of plot files written, empty when the plots went to windows
+    """
+    jobs = []
+    total = sum(len(captures) for node, captures in groups)
+    for node, captures in groups:
+        names = captureFilenames(filename, len(captures), args.output, maxMode, node)
+        for name, capture in zip(names, captures):
+            title = (args.title or filename) + (" {}".format(len(jobs) + 1) if total > 1 else "")
+            jobs.append((name[:-4] + "." + (args.plot_format or "png"), plotLines(capture, channels, args.plot_points),
+                         title))
+    if args.plot_format:
+        print "<-> Drawing {} plots..".format(len(jobs))
+        return renderPlots(jobs, workers or args.plot_workers)
+    for name, lines, title in jobs:
+        drawLines(plt.figure(figsize=PLOT_SIZE).add_subplot(111), lines, title)
+    print "<+> Drawing {} plots, close the plot windows to finish..".format(len(jobs))
+    plt.show()
+    return []
+
+
+def followFromArguments(filename, args, profiler=None):
+    """
+    runs follow mode from the command line, each capture is saved as it is found, numbered the same way as
+    saveCaptures numbers them
+    :param filename: the csv file being written
+    :param args: the parsed command line arguments
+    :param profiler: a StageProfiler to time the stages with, if any
+    :return: the number of captures saved
+    """
+    msd = loadFromArguments(filename, args, profiler)
+    exporter = CaptureExporter(args.export_threads)
+    saved = []
+
+    def save(capture):
+        saved.append(captureFilenames(filename, len(saved) + 1, args.output)[-1][:-4] + "." + args.format)
+        print "<-> Saving data to {}".format(saved[-1])
+        exporter.write(args.format, saved[-1], capture.timestamps, capture.channels, capture.names)
+    try:
+        msd.follow(save, args.follow_interval, args.follow_timeout)
+    finally:
+        exporter.close()
+    return len(saved)
+
+
+def parseWindow(text, day):
+    """
+    reads a -tw time window, START,END or START,+SECONDS or TIME~SECONDS, see parseTime for the times
+    :param text: the window
+    :param day: nanoseconds since the epoch of the first sample, times of the day are taken to be on its day
+    :return: the (start, stop) nanoseconds since the epoch
+    """
+    try:
+        if "~" in text:
+            centre, seconds = text.split("~")
+            half = int(round(float(seconds) * NANOSECONDS_PER_SECOND / 2))
+            centre = parseTime(centre, day)
+            return centre - half, centre + half
+        start, stop = text.split(",")
+        start = parseTime(start, day)
+        if stop.strip().startswith("+"): return start, start + int(round(float(stop) * NANOSECONDS_PER_SECOND))
+        return start, parseTime(stop, day)
+    except ValueError:
+        raise MicroStrainDataError("unreadable time window '{}', expected START,END or TIME~SECONDS".format(text))
+
+
+def windowFilename(filename, output=None, fmt=DEFAULT_EXPORT_FORMAT):
+    """
+    works out the name a window is saved under, sample_window.csv or the output name, with the extension of fmt
+    :return: the filename
+    """
+    matchRe = re.match(r"(.*)\.csv", output or filename)
+    stem = matchRe.group(1) if matchRe else output or filename
+    return stem + ("" if output else "_window") + "." + fmt
+
+
+def windowFromArguments(filename, args, profiler=None):
+    """
+    runs the -tw and -sr options from the command line, the window is cut, saved and printed or plotted if asked
+    :param filename: the csv file
+    :param args: the parsed command line arguments
+    :param profiler: a StageProfiler to time the stages with, if any
+    :return: the name of the file the window was saved to
+    """
+    msd = loadFromArguments(filename, args, profiler)
+    if args.time_window:
+        capture = msd.extractWindow(*parseWindow(args.time_window, msd.startTime()))
+    else:
+        try:
+            first, last = [int(row) for row in args.sample_range.split(":")]
+        except ValueError:
+            raise MicroStrainDataError("unreadable sample range '{}', expected FIRST:LAST".format(args.sample_range))
+        capture = msd.extractRange(first, last)
+    if not len(capture): raise MicroStrainDataError("no samples in the window")
+    outputFilename = windowFilename(filename, args.output, args.format)
+    if args.printout: printSampleData(capture, names=capture.names)
+    with profileStage(profiler, "export") as stage:
+        stage.rows = len(capture)
+        print "<-> Saving {} samples from sample #{} to {}".format(len(capture), capture.start, outputFilename)
+        EXPORT_WRITERS[args.format](outputFilename, capture.timestamps, capture.channels, capture.names)
+    if args.plot or args.plot_format:
+        with profileStage(profiler, "plot") as stage:
+            stage.rows = len(capture)
+            lines = plotLines(capture, points=args.plot_points)
+            if args.plot_format:
+                plotted = renderPlots([(outputFilename[:-len(args.format)] + args.plot_format, lines,
+                                        args.title or filename)], 1)
+                print "<+> Plot saved to {}".format(", ".join(plotted))
             else:
-                outputFilename = args.output if args.output[-4:] != ".csv" else args.output[:-4]
-                outputFilename += "{}.csv".format(postCroppedSamples.index(capture) + 1)
-            print "<-> Saving data to {}".format(outputFilename)
-            with open(outputFilename, 'wb') as outputFile:
-                outputWriter = csv.writer(outputFile)
-                for row in postCroppedSamples[0]:
-                    time = row[0].strftime(TIME_FORMAT)
-                    outputWriter.writerow([time, row[1], row[2], row[3]])
-            print "<+> Data saved!"
-
-    if msd.plotMode:
-        for data in postCroppedSamples:
-            print "<+> Drawing plot number {}, Exit plot window to view the next.."\
-                .format(postCroppedSamples.index(data) + 1)
-            rotatedData = [[time.strftime(SECONDS_ONLY), x, y, z] for time, x, y, z in data]
-            rotatedData = zip(*rotatedData)
-            if "x" in msd.triggerAxis: plt.plot(rotatedData[0], rotatedData[1], 'b-', label="x")
-            if "y" in msd.triggerAxis: plt.plot(rotatedData[0], rotatedData[2], 'g-', label="y")
-            if "z" in msd.triggerAxis: plt.plot(rotatedData[0], rotatedData[3], 'r-', label="z")
-            plt.legend(loc=PLOT_LEGEND_LOCATION)
-            if len(postCroppedSamples) > 1: plotNum = postCroppedSamples.index(data) + 1
-            else: plotNum = ""
-            plt.title(args.title + " " + str(plotNum)) if args.title\
-                else plt.title(args.filename) + "" + str(plotNum)
-            plt.ylabel("G-Force")
-            plt.xlabel("Timestamp (Shows only seconds & microseconds)")
-            plt.show()
+                drawLines(plt.figure(figsize=PLOT_SIZE).add_subplot(111), lines, args.title or filename)
+                plt.show()
+    return outputFilename
+
+
+def saveProfile(profiler, filename, verbose=DEFAULT_VERBOSITY):
+    """
+    writes the stats of a StageProfiler to the -P file, printing them first when verbose
+    :return: No return data.
+    """
+    if verbose: print "\n{}\n".format(profiler.report())
+    print "<+> Profile saved to {}".format(", ".join(profiler.save(filename)))
+
+
+def main():
+    file_help = "File: the absolute path of the CSV file being parsed\n"
+    parser = buildArgumentParser()
+    parser.add_argument("filename", type=str, help=file_help)
+    args = parser.parse_args()
+    checkArguments(parser, args)
+
+    verbose = args.verbose if args.verbose != DEFAULT_VERBOSITY else DEFAULT_VERBOSITY
+    profiler = StageProfiler(args.profile_stage) if args.profile else None
+
+    if args.follow:
+        try:
+            print "<+> {} captures saved".format(followFromArguments(args.filename, args, profiler))
+        except MicroStrainDataError as e:
+            print "<ERROR> {}. Exiting.".format(e)
+            sys.exit(1)
+        if profiler: saveProfile(profiler, args.profile, verbose)
+        print "<!> Processing complete, Exiting"
+        return
+
+    if args.time_window or args.sample_range:
+        try:
+            print "<+> Window saved to {}".format(windowFromArguments(args.filename, args, profiler))
+        except MicroStrainDataError as e:
+            print "<ERROR> {}. Exiting.".format(e)
+            sys.exit(1)
+        if profiler: saveProfile(profiler, args.profile, verbose)
+        print "<!> Processing complete, Exiting"
+        return
+
+    # Handle the above data via our new class
+    try:
+        msd = loadFromArguments(args.filename, args, profiler)
+
+        if verbose and not args.stream:
+            print ""
+            print msd
+            if msd.gaps: print msd.gapReport()
+            if args.peaks > 1: print msd.peakReport()
+            print ""
+
+        maxMode = isMaxMode(msd, args)
+        groups = sliceFromArguments(msd, args)
+        triggerChannels = set(msd.plotChannels())
+    except MicroStrainDataError as e:
+        print "<ERROR> {}. Exiting.".format(e)
+        sys.exit(1)
+    if verbose and args.stream: print "\n{}\n".format(msd)
+
+    with profileStage(profiler, "export") as stage:
+        stage.rows = sum(len(capture) for node, captures in groups for capture in captures)
+        exporter = CaptureExporter(args.export_threads)
+        for node, captures in groups:
+            if args.printout:
+                for captureNum, capture in enumerate(captures):
+                    if not maxMode:
+                        print ""
+                        print "Capture number {}:".format(captureNum + 1) + \
+                              (" (node {})".format(node) if node is not None else "")
+                        print "-" * 60
+                    printSampleData(capture, lC=msd.locationCoefficient, names=capture.names)
+                    if not maxMode: print ""
+            saveCaptures(args.filename, captures, args.output, maxMode, verbose, node, args.format, args.combined,
+                         exporter)
+            if args.events: saveEventIndex(args.filename, captures, args.output, node)
+        exporter.close()
+    print "<+> Data saved!"
+
+    try:
+        for node, captures in groups:
+            if args.spectrum: saveCaptureSpectra(args.filename, msd, captures, args, node)
+        if args.welch: saveWelchSpectrum(args.filename, msd, args)
+    except MicroStrainDataError as e:
+        print "<ERROR> {}. Exiting.".format(e)
+        sys.exit(1)
+
+    if msd.plotMode or args.plot_format:
+        # with -p the plot stage includes the time the windows are open
+        with profileStage(profiler, "plot") as stage:
+            stage.rows = sum(len(capture) for node, captures in groups for capture in captures)
+            plotted = plotCaptures(args.filename, groups, triggerChannels, args, maxMode)
+        if plotted: print "<+> Plots saved to {}".format(", ".join(plotted))
 
+    if profiler: saveProfile(profiler, args.profile, verbose)
     print "<!> Processing complete, Exiting"
 
 
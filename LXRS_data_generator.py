@@ -0,0 +1,180 @@
+import sys
+import json
+import argparse
+import numpy as np
+from datetime import datetime
+from LXRS_csv_file_processor import formatTimestamps, datetimeToNanoseconds, Z_CHANNEL, NANOSECONDS_PER_SECOND
+"""
+    This script writes synthetic Sensor Connect v5.0.0 *.csv files for testing and benchmarking
+LXRS_csv_file_processor.py on recordings far longer than the sample data, for example,
+
+    LXRS_data_generator.py -r 10000000 -N 4 -e 50 long_run.csv
+
+    writes ten million rows of four 3 channel nodes at 512Hz with 50 impacts. The file has the FILE_INFO,
+SESSION_INFO, DEVICE_INFO and CHANNEL_INFO preamble and DATA_START header of a real export, the channels carry
+sensor noise on top of gravity (-1 g on the z channel of a 3 channel node) and every impact is a decaying ring on one
+channel of one node.  Where the impacts went is saved to long_run.csv.events.json.
+"""
+
+# constants
+# ------------------------
+DEFAULT_ROWS = 100000
+DEFAULT_RATE = 512.0
+DEFAULT_NODES = 1
+DEFAULT_CHANNELS = 3
+DEFAULT_EVENTS = 10
+DEFAULT_SEED = 0
+DEFAULT_NOISE = 0.005
+FIRST_NODE = 523
+START_TIME = datetime(2017, 2, 17, 15, 30, 31)
+# an impact rings at EVENT_FREQUENCY hertz and dies away with a time constant of EVENT_DECAY seconds, it is cut off
+# after EVENT_LENGTH time constants, its starting amplitude is drawn from EVENT_AMPLITUDE g
+EVENT_FREQUENCY = 40.0
+EVENT_DECAY = 0.02
+EVENT_LENGTH = 5
+EVENT_AMPLITUDE = (4.0, 12.0)
+# rows are generated and written CHUNK_ROWS at a time
+CHUNK_ROWS = 1000000
+EVENTS_EXTENSION = ".events.json"
+
+
+def channelTitles(nodes, channels):
+    """
+    :return: the node:chN column titles of every channel, node by node
+    """
+    return ["{}:ch{}".format(node, ch) for node in nodes for ch in range(1, channels + 1)]
+
+
+def preamble(titles, rate):
+    """
+    builds the text Sensor Connect writes before the data rows
+    :param titles: the channel column titles
+    :param rate: the sample rate in hertz
+    :return: the preamble, ending with the Time,... title row
+    """
+    lines = ["FILE_INFO", "ListSeparator=,", "DecimalSeparator=.", "",
+             "SESSION_INFO", "TimeZone,UTC", "TimeZoneOffset,0", "DateTimeFormat,MM/DD/YY h:mm:ss.nnnnnnnnn", "",
+             "DEVICE_INFO", "Address,*", "",
+             "CHANNEL_INFO", "Channel,Type,SampleRate,Equation,Coefficients,Unit,UnitSymbol,WhereApplied,WhenApplied"]
+    lines += ["{},Channel Data,{:g}Hz,,,,,,".format(title, rate) for title in titles]
+    lines += ["", "DATA_START", ",".join(["Time"] + titles)]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def baseline(numChannels, channels):
+    """
+    :return: the resting value of every column, gravity on the z channel of every 3 channel node
+    """
+    rest = np.zeros(numChannels)
+    if channels == 3: rest[Z_CHANNEL - 1::channels] = -1.0
+    return rest
+
+
+def eventShape(rate):
+    """
+    :return: the ring of an impact of amplitude 1, one value per sample from the moment of impact
+    """
+    t = np.arange(int(EVENT_LENGTH * EVENT_DECAY * rate) + 1) / rate
+    return np.exp(-t / EVENT_DECAY) * np.cos(2 * np.pi * EVENT_FREQUENCY * t)
+
+
+def placeEvents(rows, numEvents, numChannels, channels, rate, titles, rng):
+    """
+    spreads the impacts out over the recording with some jitter, far enough apart that no two overlap
+    :return: a list of event dictionaries, start is the sample of impact and peak the sample with the largest
+    magnitude on the channel hit, value its clean value (without noise)
+    """
+    shape = eventShape(rate)
+    spacing = rows // (numEvents + 1)
+    if numEvents and spacing < len(shape):
+        raise ValueError("{} events of {} samples don't fit in {} rows".format(numEvents, len(shape), rows))
+    rest = baseline(numChannels, channels)
+    events = []
+    for k in range(numEvents):
+        start = spacing * (k + 1) + rng.randint(-(spacing // 4), spacing // 4 + 1)
+        start = min(max(start, 0), rows - len(shape))
+        column = rng.randint(numChannels)
+        amplitude = rng.uniform(*EVENT_AMPLITUDE) * rng.choice([-1, 1])
+        ring = rest[column] + amplitude * shape
+        peak = int(np.argmax(np.abs(ring)))
+        events.append({"start": int(start), "peak": int(start + peak), "channel": titles[column],
+                       "column": int(column), "amplitude": float(amplitude), "value": float(ring[peak])})
+    return events
+
+
+def generateFile(filename, rows=DEFAULT_ROWS, rate=DEFAULT_RATE, nodes=DEFAULT_NODES, channels=DEFAULT_CHANNELS,
+                 events=DEFAULT_EVENTS, noise=DEFAULT_NOISE, seed=DEFAULT_SEED):
+    """
+    writes a synthetic Sensor Connect file along with an events file describing the impacts in it
+    :param filename: the csv file to write
+    :param rows: the number of data rows
+    :param rate: the sample rate in hertz
+    :param nodes: the number of wireless nodes, numbered from FIRST_NODE
+    :param channels: the number of channels on every node
+    :param events: the number of impacts
+    :param noise: the standard deviation of the sensor noise in g
+    :param seed: the random seed, the same seed gives the same file
+    :return: the list of event dictionaries as returned by placeEvents
+    """
+    rng = np.random.RandomState(seed)
+    titles = channelTitles(range(FIRST_NODE, FIRST_NODE + nodes), channels)
+    numChannels = len(titles)
+    placed = placeEvents(rows, events, numChannels, channels, rate, titles, rng)
+    shape = eventShape(rate)
+    rest = baseline(numChannels, channels)
+    start = datetimeToNanoseconds(START_TIME)
+    period = NANOSECONDS_PER_SECOND / rate
+    with open(filename, 'wb') as outputFile:
+        outputFile.write(preamble(titles, rate))
+        for first in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - first)
+            values = rest + rng.normal(0, noise, (count, numChannels))
+            for event in placed:
+                lo, hi = max(event["start"], first), min(event["start"] + len(shape), first + count)
+                if lo < hi:
+                    values[lo - first:hi - first, event["column"]] += \
+                        event["amplitude"] * shape[lo - event["start"]:hi - event["start"]]
+            timestamps = start + np.rint(np.arange(first, first + count) * period).astype(np.int64)
+            # the values are formatted a column at a time and the rows put together by join, well ahead of the
+            # numpy string functions for the variable width %f values
+            columns = [map("%f".__mod__, values[:, col].tolist()) for col in range(numChannels)]
+            lines = map(",".join, zip(formatTimestamps(timestamps, digits=9).tolist(), *columns))
+            outputFile.write("\r\n".join(lines) + "\r\n")
+    with open(filename + EVENTS_EXTENSION, 'wb') as eventsFile:
+        json.dump(placed, eventsFile, indent=2, sort_keys=True)
+    return placed
+
+
+def main():
+    # argument data
+    file_help = "File: the name of the CSV file to write"
+    rows_help = "Rows: the number of data rows, default is %d" % DEFAULT_ROWS
+    rate_help = "Rate: the sample rate in hertz, default is %g" % DEFAULT_RATE
+    nodes_help = "Nodes: the number of wireless nodes, default is %d" % DEFAULT_NODES
+    channels_help = "Channels: the number of channels on each node, default is %d" % DEFAULT_CHANNELS
+    events_help = "Events: the number of impacts, default is %d" % DEFAULT_EVENTS
+    noise_help = "Noise: the standard deviation of the sensor noise in g, default is %g" % DEFAULT_NOISE
+    seed_help = "Seed: the random seed, default is %d" % DEFAULT_SEED
+
+    # argument parsing section, setup and execution
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--rows", type=int, default=DEFAULT_ROWS, help=rows_help)
+    parser.add_argument("-R", "--rate", type=float, default=DEFAULT_RATE, help=rate_help)
+    parser.add_argument("-N", "--nodes", type=int, default=DEFAULT_NODES, help=nodes_help)
+    parser.add_argument("-C", "--channels", type=int, default=DEFAULT_CHANNELS, help=channels_help)
+    parser.add_argument("-e", "--events", type=int, default=DEFAULT_EVENTS, help=events_help)
+    parser.add_argument("-n", "--noise", type=float, default=DEFAULT_NOISE, help=noise_help)
+    parser.add_argument("-s", "--seed", type=int, default=DEFAULT_SEED, help=seed_help)
+    parser.add_argument("filename", type=str, help=file_help)
+    args = parser.parse_args()
+
+    try:
+        placed = generateFile(args.filename, args.rows, args.rate, args.nodes, args.channels, args.events,
+                              args.noise, args.seed)
+    except ValueError as e:
+        print "<ERROR> {}. Exiting.".format(e)
+        sys.exit(1)
+    print "<+> Wrote {} rows with {} events to {}".format(args.rows, len(placed), args.filename)
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import LXRS_csv_file_processor as processor
+from LXRS_data_generator import generateFile
+"""
+    The fixture the tests share, importing it also puts the top of the repository on the path so the tests can
+import the LXRS scripts whether they are run by discovery or on their own
+"""
+
+
+class LxrsTest(unittest.TestCase):
+    """
+    the base of every test, gives each test a temporary directory that is removed once it is over
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="lxrs_test_")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def setConstant(self, module, name, value):
+        """
+        sets a module constant for the rest of the test, it is put back once the test is over
+        """
+        self.addCleanup(setattr, module, name, getattr(module, name))
+        setattr(module, name, value)
+
+
+class GeneratedFileTest(LxrsTest):
+    """
+    writes a synthetic SensorConnect file of ROWS rows from NODES nodes with EVENTS impacts into the temporary
+    directory before every test, subclasses set the three to suit
+    """
+    ROWS = 20000
+    NODES = 1
+    EVENTS = 4
+
+    def setUp(self):
+        super(GeneratedFileTest, self).setUp()
+        self.filename = os.path.join(self.directory, "generated.csv")
+        generateFile(self.filename, self.ROWS, nodes=self.NODES, events=self.EVENTS)
+
+    def load(self, **kwargs):
+        """
+        :return: the MicroStrainData of the generated file, parsed without the sample cache unless asked for
+        """
+        kwargs.setdefault("cache", "off")
+        return processor.MicroStrainData(self.filename, **kwargs)
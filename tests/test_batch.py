@@ -0,0 +1,65 @@
+import os
+import csv
+import json
+import unittest
+import multiprocessing
+from lxrs_test_case import GeneratedFileTest
+import LXRS_batch_processor as batch
+from LXRS_csv_file_processor import buildArgumentParser
+"""
+    Checks that a batch carries on past files that can't be processed, noting each in the summary with its error,
+and that earlier capture files aren't picked up as input
+"""
+
+
+class BatchTest(GeneratedFileTest):
+    ROWS, EVENTS = 5000, 3
+
+    def setUp(self):
+        super(BatchTest, self).setUp()
+        self.args = buildArgumentParser().parse_args(["-n", "2", "-ca", "off"])
+        with open(self.filename, "rb") as csvFile: contents = csvFile.read()
+        header = contents[:contents.index("\n", contents.index("DATA_START") + len("DATA_START\n")) + 1]
+        for name, data in (("bad.csv", "not a Sensor Connect file\r\n"), ("empty.csv", ""),
+                           ("header.csv", header), ("generated_trunc1.csv", contents)):
+            with open(os.path.join(self.directory, name), "wb") as csvFile: csvFile.write(data)
+
+    def processAll(self, workers):
+        jobs = [(filename, self.args, False) for filename in batch.findCsvFiles([self.directory])]
+        if workers == 1: return map(batch.processFile, jobs)
+        pool = multiprocessing.Pool(workers)
+        try:
+            return pool.map(batch.processFile, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def testErrorRows(self):
+        for workers in (1, 2):
+            summaries = self.processAll(workers)
+            statuses = dict((os.path.basename(summary["file"]), summary["status"]) for summary in summaries)
+            self.assertEqual(statuses, {"bad.csv": "error", "empty.csv": "error", "header.csv": "error",
+                                        "generated.csv": "ok"})
+            for summary in summaries:
+                self.assertEqual(summary["error"] != "", summary["status"] == "error")
+            self.assertIn("no data rows", [summary for summary in summaries
+                                           if summary["file"].endswith("header.csv")][0]["error"])
+
+    def testSummaryFiles(self):
+        summaries = self.processAll(1)
+        summaryFilename = os.path.join(self.directory, "summary.csv")
+        batch.writeSummary(summaryFilename, summaries)
+        with open(summaryFilename, "rb") as summaryFile:
+            rows = dict((os.path.basename(row["file"]), row) for row in csv.DictReader(summaryFile))
+        self.assertEqual(rows["generated.csv"]["samples"], str(self.ROWS))
+        self.assertEqual(len(rows["generated.csv"]["triggers"].split(";")), 2)
+        for name in ("bad.csv", "empty.csv", "header.csv"):
+            self.assertEqual((rows[name]["status"], rows[name]["samples"], rows[name]["triggers"]), ("error", "", ""))
+            self.assertNotEqual(rows[name]["error"], "")
+        batch.writeSummary(summaryFilename[:-len(".csv")] + ".json", summaries)
+        with open(summaryFilename[:-len(".csv")] + ".json", "rb") as summaryFile:
+            self.assertEqual(json.load(summaryFile), json.loads(json.dumps(summaries)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that data built from an open file, its bytes or arrays matches the same file read by name, and that the
+peaks, sample rate and triggers are only worked out when asked for and worked out again after a setting changes
+"""
+
+
+class ConstructionTest(GeneratedFileTest):
+    NODES = 2
+
+    def setUp(self):
+        super(ConstructionTest, self).setUp()
+        self.msd = self.load()
+
+    def assertSame(self, msd):
+        for ours, theirs in zip(msd.getSamples(), self.msd.getSamples()):
+            np.testing.assert_array_equal(ours, theirs)
+        self.assertEqual(msd.channelNames, self.msd.channelNames)
+        self.assertEqual(msd.maxExtremes, self.msd.maxExtremes)
+        self.assertEqual(msd.minPeaks, self.msd.minPeaks)
+        self.assertEqual((msd.samplePeriod, msd.gaps), (self.msd.samplePeriod, self.msd.gaps))
+
+    def testSources(self):
+        with open(self.filename, "rb") as csvFile:
+            contents = csvFile.read()
+            csvFile.seek(0)
+            self.assertSame(processor.MicroStrainData.fromFile(csvFile))
+        self.assertSame(processor.MicroStrainData.fromFile(io.BytesIO(contents)))
+        self.assertSame(processor.MicroStrainData.fromBytes(contents))
+        timestamps, channels = self.msd.getSamples()
+        # hand the channels over in file order under the file's titles, fromArrays has to put them back in
+        # channelMap order
+        titles = contents[contents.index("DATA_START"):].splitlines()[1].split(",")[1:]
+        order = np.argsort([column for node, name, column in self.msd.channelMap])
+        self.assertSame(processor.MicroStrainData.fromArrays(timestamps, channels[:, order], titles, self.msd.header))
+
+    def testErrors(self):
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData.fromBytes("not a Sensor Connect file\n")
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData(self.filename, stream=True, data="")
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData.fromArrays(np.arange(3), np.zeros((2, 3)), ["ch1", "ch2", "ch3"])
+
+    def testNoDataRows(self):
+        with open(self.filename, "rb") as csvFile: contents = csvFile.read()
+        header = contents[:contents.index("\n", contents.index("DATA_START") + len("DATA_START\n")) + 1]
+        with open(self.filename, "wb") as csvFile: csvFile.write(header)
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData(self.filename, cache="off")
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData.fromBytes(header)
+        with self.assertRaises(processor.MicroStrainDataError):
+            processor.MicroStrainData(self.filename, stream=True).sliceNumTriggers()
+
+    def testLazyResults(self):
+        profiler = processor.StageProfiler()
+        msd = self.load(profiler=profiler)
+        stages = lambda: [stage["name"] for stage in profiler.stats()["stages"]]
+        self.assertNotIn("peaks", stages())
+        self.assertNotIn("sampleRate", stages())
+        self.assertEqual(msd.maxPeaks, self.msd.maxPeaks)
+        self.assertEqual(msd.sampleFrequency, self.msd.sampleFrequency)
+        msd.setNumCaptures(3)
+        first = [capture.triggerIndex for capture in msd.sliceNumTriggers()]
+        self.assertEqual(len(first), 3)
+        msd.setNumCaptures(4)
+        second = [capture.triggerIndex for capture in msd.sliceNumTriggers()]
+        self.assertEqual(second[:3], first)
+        self.assertEqual(len(second), 4)
+        msd.setThreshold(2.0)
+        events = msd.findEvents()
+        msd.setThreshold(50.0)
+        self.assertNotEqual(msd.findEvents(), events)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks the derived channels against straightforward sample by sample versions, that they come out the same
+however the file is split into blocks and in stream mode, and that they can be triggered on
+"""
+
+
+def filterLoop(inputs, decay, state):
+    outputs = np.empty(len(inputs))
+    for i, value in enumerate(inputs):
+        state = decay * state + value
+        outputs[i] = state
+    return outputs
+
+
+class DerivedTest(GeneratedFileTest):
+    ROWS = 30000
+
+    def setUp(self):
+        super(DerivedTest, self).setUp()
+        self.msd = self.load()
+
+    def testFilters(self):
+        inputs = np.random.RandomState(1).randn(3000)
+        for decay in (0.25, 0.9, 0.9999):
+            np.testing.assert_allclose(processor.firstOrderFilter(inputs, decay, 0.5),
+                                       filterLoop(inputs, decay, 0.5), atol=1e-9)
+        rms, history = processor.movingRms(inputs[:100], 16, np.empty(0))
+        rest = processor.movingRms(inputs[100:], 16, history)[0]
+        expected = [np.sqrt(np.mean(inputs[max(0, i - 15):i + 1] ** 2)) for i in range(len(inputs))]
+        np.testing.assert_allclose(np.concatenate((rms, rest)), expected)
+
+    def testValues(self):
+        timestamps, channels = self.msd.getSamples()
+        np.testing.assert_allclose(self.msd.derivedChannel("mag"), np.sqrt((channels ** 2).sum(axis=1)))
+        z = channels[:, 2]
+        decay = processor.DerivedState(processor.DerivedChannel("hp5(z)", "hp", 2, 5.0),
+                                       self.msd.sampleFrequency).decay
+        np.testing.assert_allclose(self.msd.derivedChannel("hp5(z)"),
+                                   filterLoop(decay * np.diff(z, prepend=z[0]), decay, 0.0), atol=1e-9)
+        # gravity is taken off, what is left of z averages out near 0
+        self.assertLess(abs(np.mean(self.msd.derivedChannel("dc(z)"))), abs(np.mean(z)) / 10)
+
+    def testBlocks(self):
+        names = ["mag", "hp5(z)", "lp20(x)", "dc(z)", "rms32(hp2(mag))"]
+        whole = [self.msd.derivedChannel(name) for name in names]
+        self.setConstant(processor, "SAMPLE_BLOCK_SIZE", 777)
+        msd = self.load()
+        for name, values in zip(names, whole):
+            np.testing.assert_allclose(msd.derivedChannel(name), values, atol=1e-9)
+
+    def testTriggers(self):
+        for axis in ["mag", "hp5(z)", "dc(z),x", "rms32(mag)"]:
+            self.msd.setTriggerAxis(axis)
+            self.msd.setNumCaptures(4)
+            captures = self.msd.sliceNumTriggers()
+            self.assertEqual(len(captures), 4)
+            streamed = self.load(stream=True)
+            streamed.setTriggerAxis(axis)
+            streamed.setNumCaptures(4)
+            self.assertEqual([capture.triggerIndex for capture in streamed.sliceNumTriggers()],
+                             [capture.triggerIndex for capture in captures])
+        self.msd.setTriggerAxis("mag")
+        self.assertEqual(self.msd.triggerChannels(), ["mag"])
+        self.assertEqual(self.msd.sliceMax().triggerIndex, int(np.argmax(self.msd.derivedChannel("mag"))))
+        with self.assertRaises(processor.MicroStrainDataError):
+            self.msd.setTriggerAxis("lp1000(z)")
+            self.msd.sliceNumTriggers()
+
+    def testPlotChannels(self):
+        # a capture only holds stored channels, a derived trigger plots the ones it is worked out from
+        for axis, expected in (("mag", ["x", "y", "z"]), ("hp5(z)", ["z"]), ("dc0.5(z),x", ["z", "x"]),
+                               ("rms32(hp2(mag))", ["x", "y", "z"]), ("y,mag", ["y", "x", "z"])):
+            self.msd.setTriggerAxis(axis)
+            self.msd.setNumCaptures(2)
+            capture = self.msd.sliceNumTriggers()[0]
+            self.assertEqual(self.msd.plotChannels(), expected)
+            lines = processor.plotLines(capture, set(self.msd.plotChannels()))
+            self.assertEqual(sorted(name for name, seconds, values in lines), sorted(expected))
+            self.assertTrue(all(len(values) for name, seconds, values in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
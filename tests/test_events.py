@@ -0,0 +1,93 @@
+import unittest
+import numpy as np
+from lxrs_test_case import LxrsTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks the threshold event detector against a sample by sample hysteresis comparator, on short hand built scores
+for each of its rules and on long random ones, and that events are found the same across ranking chunks
+"""
+
+nan = np.nan
+
+
+def eventsLoop(score, threshold, rearm, minDuration=1, holdoff=0):
+    events, start = [], None
+    for i, value in enumerate(score):
+        if start is None and value >= threshold:
+            start = i
+        elif start is not None and value < rearm:
+            events.append([start, i])
+            start = None
+    if start is not None: events.append([start, len(score)])
+    merged = []
+    for start, end in [event for event in events if event[1] - event[0] >= minDuration]:
+        if merged and start - merged[-1][1] < holdoff:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, start + int(np.nanargmax(score[start:end])), end) for start, end in merged]
+
+
+class EventsTest(LxrsTest):
+    def events(self, score, threshold, rearm, minDuration=1, holdoff=0):
+        starts, peaks, ends = processor.detectEvents(np.array(score, dtype=np.float64), threshold, rearm,
+                                                     minDuration, holdoff)
+        return zip(starts.tolist(), peaks.tolist(), ends.tolist())
+
+    def testHysteresis(self):
+        # samples between the thresholds and empty cells keep the state of the sample before them
+        score = [0, 5, 3, nan, 6, 1, 3, 4, 0, 3, 3]
+        self.assertEqual(self.events(score, 4, 2), [(1, 4, 5), (7, 7, 8)])
+        # with the re-arm threshold at the threshold it is a plain comparator
+        self.assertEqual(self.events(score, 4, 4), [(1, 1, 2), (4, 4, 5), (7, 7, 8)])
+        # an event still going at the end of the score ends with it
+        self.assertEqual(self.events([0, 0, 5, 3, 3], 4, 2), [(2, 2, 5)])
+        self.assertEqual(self.events([0, 1, nan, 3], 4, 2), [])
+
+    def testMinDuration(self):
+        score = [5, 0, 5, 5, 0, 5, 6, 5, 0]
+        self.assertEqual(self.events(score, 4, 2, minDuration=2), [(2, 2, 4), (5, 6, 8)])
+        self.assertEqual(self.events(score, 4, 2, minDuration=3), [(5, 6, 8)])
+
+    def testHoldoff(self):
+        # an event starting less than holdoff samples after the end of the last is merged into it, chains included
+        score = [5, 0, 0, 7, 0, 0, 0, 6, 0]
+        self.assertEqual(self.events(score, 4, 2, holdoff=2), [(0, 0, 1), (3, 3, 4), (7, 7, 8)])
+        self.assertEqual(self.events(score, 4, 2, holdoff=3), [(0, 3, 4), (7, 7, 8)])
+        self.assertEqual(self.events(score, 4, 2, holdoff=4), [(0, 3, 8)])
+        # events too short to count are dropped before the holdoff is applied
+        self.assertEqual(self.events([5, 0, 5, 5, 0, 0, 0, 5, 5], 4, 2, minDuration=2, holdoff=3), [(2, 2, 4),
+                                                                                                    (7, 7, 9)])
+
+    def testRandomScores(self):
+        rng = np.random.RandomState(9)
+        score = np.abs(rng.standard_cauchy(20000))
+        score[rng.randint(0, len(score), 500)] = nan
+        for threshold, rearm, minDuration, holdoff in ((4, 2, 1, 0), (4, 4, 1, 0), (3, 0.5, 3, 0), (6, 1, 2, 25)):
+            self.assertEqual(self.events(score, threshold, rearm, minDuration, holdoff),
+                             eventsLoop(score, threshold, rearm, minDuration, holdoff))
+
+    def testFindEvents(self):
+        period = processor.NANOSECONDS_PER_SECOND // 256
+        channels = np.zeros((1000, 3))
+        channels[:, 2] = -1.0
+        channels[100:104, 0] = [3, 8, 4, 1.5]
+        # a negative impact running over a ranking chunk boundary
+        channels[510:514, 1] = [-2.5, -6, -9, -3]
+        # ch1 is the y axis and ch2 the x axis, as Y_CHANNEL and X_CHANNEL have them
+        msd = processor.MicroStrainData.fromArrays(np.arange(1000) * period, channels, ["ch1", "ch2", "ch3"])
+        # gravity on z scores 1 with both polarities, so the re-arm threshold sits above it
+        msd.setThreshold(2.0, 1.2)
+        self.setConstant(processor, "RANK_CHUNK_SIZE", 512)
+        events = msd.findEvents()
+        self.assertEqual([(event["start"], event["peak"], event["end"], event["channel"]) for event in events],
+                         [(100, 101, 103, "y"), (510, 512, 513, "x")])
+        self.assertEqual([event["value"] for event in events], [8.0, -9.0])
+        self.assertEqual(events[1]["peakTime"], 512 * period)
+        self.assertEqual([capture.triggerIndex for capture in msd.sliceEvents()], [101, 512])
+        msd.setPolarity("+")
+        self.assertEqual([event["peak"] for event in msd.findEvents()], [101])
+
+
+if __name__ == "__main__":
+    unittest.main()
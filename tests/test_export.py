@@ -0,0 +1,132 @@
+import os
+import csv
+import struct
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that captures written out in every export format, one file each or combined and on one thread or several,
+read back as the samples they were cut from, and that the binary layout is the one writeBin documents
+"""
+
+
+def readBin(filename):
+    """
+    reads a file written by writeBin the way a tool without numpy would, field by field with struct
+    """
+    with open(filename, "rb") as binFile:
+        data = binFile.read()
+    magic, (version, rows, columns, size, length) = data[:8], struct.unpack_from("<IQIII", data, 8)
+    offset = 8 + struct.calcsize("<IQIII")
+    names = data[offset:offset + length].split(",") if length else []
+    offset += length
+    ids = struct.unpack_from("<{}i".format(rows), data, offset)
+    timestamps = struct.unpack_from("<{}q".format(rows), data, offset + 4 * rows)
+    offset += 12 * rows
+    values = struct.unpack_from("<{}{}".format(rows * columns, "f" if size == 4 else "d"), data, offset)
+    assert offset + size * rows * columns == len(data)
+    return magic, version, names, list(ids), list(timestamps), [values[i * columns:(i + 1) * columns]
+                                                                for i in range(rows)]
+
+
+def readBack(fmt, filename):
+    """
+    :return: the capture numbers (None when the file has none), timestamps and channel matrix of an exported file,
+    csv timestamps only carry microseconds
+    """
+    if fmt == "csv":
+        with open(filename, "rb") as csvFile: text = csvFile.read()
+        numColumns = text[:text.index("\n")].count(",") + 1
+        if text.split(",", 1)[0].isdigit():
+            # the capture number leads every row of a combined file
+            ids = [int(row.split(",", 1)[0]) for row in text.splitlines()]
+            text = "\r\n".join(row.split(",", 1)[1] for row in text.splitlines())
+            fields = processor.parseDataFields(text, csv.excel, numColumns - 1)
+        else:
+            ids, fields = None, processor.parseDataFields(text, csv.excel, numColumns)
+        return ids, processor.decodeTimestamps(fields[:, :6]), fields[:, 6:]
+    if fmt == "npy":
+        records = np.load(filename)
+        names = [name for name in records.dtype.names if name not in ("capture", "time")]
+        ids = records["capture"].tolist() if "capture" in records.dtype.names else None
+        return ids, records["time"], np.column_stack([records[name] for name in names])
+    if fmt == "npz":
+        archive = np.load(filename)
+        return archive["capture"].tolist() if "capture" in archive else None, archive["timestamps"], \
+            archive["channels"]
+    magic, version, names, ids, timestamps, values = readBin(filename)
+    return ids, np.array(timestamps), np.array(values)
+
+
+class ExportTest(GeneratedFileTest):
+    ROWS, NODES, EVENTS = 8000, 2, 4
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        msd = self.load()
+        msd.setNumCaptures(4)
+        msd.setSampleSize(300)
+        self.captures = msd.sliceNumTriggers()
+        # an empty cell, as a node with no sample on a row leaves, goes out and comes back as NaN
+        self.captures[1].channels = self.captures[1].channels.copy()
+        self.captures[1].channels[5, 1] = np.nan
+
+    def assertSameSamples(self, fmt, timestamps, channels, capture):
+        if fmt == "csv": timestamps, capture = timestamps // 1000, (capture.timestamps // 1000, capture.channels)
+        else: capture = (capture.timestamps, capture.channels)
+        np.testing.assert_array_equal(timestamps, capture[0])
+        np.testing.assert_array_equal(channels, capture[1])
+
+    def testFormats(self):
+        for fmt in processor.EXPORT_FORMATS:
+            for threads in (1, 3):
+                output = os.path.join(self.directory, "{}{}".format(fmt, threads))
+                exporter = processor.CaptureExporter(threads)
+                written = processor.saveCaptures(self.filename, self.captures, output=output, verbose=False, fmt=fmt,
+                                                 exporter=exporter)
+                combined = processor.saveCaptures(self.filename, self.captures, output=output, verbose=False,
+                                                  fmt=fmt, combined=True, exporter=exporter)[0]
+                exporter.close()
+                self.assertEqual(len(written), len(self.captures))
+                for name, capture in zip(written, self.captures):
+                    ids, timestamps, channels = readBack(fmt, name)
+                    self.assertIn(ids, (None, [0] * len(capture)))
+                    self.assertSameSamples(fmt, timestamps, channels, capture)
+                ids, timestamps, channels = readBack(fmt, combined)
+                lengths = [len(capture) for capture in self.captures]
+                self.assertEqual(ids, np.repeat(np.arange(1, len(lengths) + 1), lengths).tolist())
+                for k, capture in enumerate(self.captures):
+                    rows = slice(sum(lengths[:k]), sum(lengths[:k + 1]))
+                    self.assertSameSamples(fmt, timestamps[rows], channels[rows], capture)
+
+    def testBinLayout(self):
+        filename = os.path.join(self.directory, "layout.bin")
+        timestamps = np.array([1, 2, 3], dtype=np.int64) * processor.NANOSECONDS_PER_SECOND
+        for dtype in (np.float32, np.float64):
+            channels = np.array([[1.5, np.nan], [-2.0, 3.25], [0.0, 1e-3]], dtype=dtype)
+            processor.writeBin(filename, timestamps, channels, ["x", "523:ch4"], ids=[7, 7, 8])
+            magic, version, names, ids, times, values = readBin(filename)
+            self.assertEqual((magic, version, names, ids, times),
+                             (processor.CAPTURE_MAGIC, processor.CAPTURE_VERSION, ["x", "523:ch4"], [7, 7, 8],
+                              timestamps.tolist()))
+            np.testing.assert_array_equal(np.array(values, dtype=dtype), channels)
+        processor.writeBin(filename, np.empty(0, dtype=np.int64), np.empty((0, 0)), [])
+        self.assertEqual(readBin(filename)[2:], ([], [], [], []))
+
+    def testErrors(self):
+        missing = os.path.join(self.directory, "missing", "capture")
+        capture = self.captures[0]
+        exporter = processor.CaptureExporter(3)
+        exporter.write("csv", os.path.join(self.directory, "fine.csv"), capture.timestamps, capture.channels,
+                       capture.names)
+        exporter.write("bin", missing + ".bin", capture.timestamps, capture.channels, capture.names)
+        self.assertRaises(IOError, exporter.close)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "fine.csv")))
+        # with a single thread the file is written on the spot and the error comes straight out of write
+        self.assertRaises(IOError, processor.CaptureExporter(1).write, "npz", missing + ".npz", capture.timestamps,
+                          capture.channels, capture.names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import time
+import unittest
+import threading
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that follow mode cuts the same captures from a file written a piece at a time, with pieces ending part way
+through a row, as from the finished file, that they match the samples of the fully parsed file, and that it stops
+when the file is cut short as it is when Sensor Connect starts logging over it
+"""
+
+INTERVAL = 0.01
+
+
+class FollowTest(GeneratedFileTest):
+    ROWS, EVENTS = 20000, 6
+
+    def setUp(self):
+        super(FollowTest, self).setUp()
+        with open(self.filename, "rb") as csvFile: self.contents = csvFile.read()
+        self.dataStart = processor.scanPreamble(self.contents)[2]
+        self.growing = os.path.join(self.directory, "growing.csv")
+
+    def follow(self, filename, timeout=0.3):
+        msd = processor.MicroStrainData(filename, stream=True)
+        captures = []
+        self.assertEqual(msd.follow(captures.append, interval=INTERVAL, timeout=timeout), len(captures))
+        return captures
+
+    def startWriting(self, pieces, truncate=False):
+        """
+        writes the pieces to the end of the growing file on a thread, a few checks apart, and then cuts the file back
+        to its header when asked to
+        """
+        def write():
+            with open(self.growing, "ab") as csvFile:
+                for piece in pieces:
+                    time.sleep(3 * INTERVAL)
+                    csvFile.write(piece)
+                    csvFile.flush()
+                if truncate:
+                    # long enough for the last piece to be read before the file is cut
+                    time.sleep(30 * INTERVAL)
+                    csvFile.truncate(self.dataStart)
+        writer = threading.Thread(target=write)
+        writer.start()
+        return writer
+
+    def assertSameCaptures(self, captures, expected):
+        self.assertEqual([(capture.triggerIndex, capture.start, len(capture)) for capture in captures],
+                         [(capture.triggerIndex, capture.start, len(capture)) for capture in expected])
+        for capture, other in zip(captures, expected):
+            np.testing.assert_array_equal(capture.channels, other.channels)
+
+    def testIncremental(self):
+        expected = self.follow(self.filename)
+        self.assertGreaterEqual(len(expected), self.EVENTS)
+        timestamps, channels = self.load().getSamples()
+        for capture in expected:
+            np.testing.assert_array_equal(capture.timestamps, timestamps[capture.start:capture.start + len(capture)])
+            np.testing.assert_array_equal(capture.channels, channels[capture.start:capture.start + len(capture)])
+            self.assertGreaterEqual(np.abs(channels[capture.triggerIndex]).max(), processor.DEFAULT_THRESHOLD)
+        # the header and a few rows go in first, the rest in uneven pieces that end part way through rows
+        cuts = [self.dataStart + 1000] + range(self.dataStart + 1000 + 7, len(self.contents), 97001) + \
+            [len(self.contents)]
+        with open(self.growing, "wb") as csvFile: csvFile.write(self.contents[:cuts[0]])
+        writer = self.startWriting([self.contents[start:stop] for start, stop in zip(cuts, cuts[1:])])
+        try:
+            self.assertSameCaptures(self.follow(self.growing, timeout=1.0), expected)
+        finally:
+            writer.join()
+
+    def testTruncated(self):
+        half = self.contents.index("\n", len(self.contents) // 2) + 1
+        with open(self.growing, "wb") as csvFile: csvFile.write(self.contents[:half])
+        expected = self.follow(self.growing)
+        with open(self.growing, "wb") as csvFile: csvFile.write(self.contents[:self.dataStart + 1000])
+        writer = self.startWriting([self.contents[self.dataStart + 1000:half]], truncate=True)
+        began = time.time()
+        try:
+            captures = self.follow(self.growing, timeout=30)
+        finally:
+            writer.join()
+        # it stopped on the shorter file rather than waiting out the timeout, and kept the captures found before
+        self.assertLess(time.time() - began, 10)
+        self.assertSameCaptures(captures, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import json
+import unittest
+import numpy as np
+from lxrs_test_case import LxrsTest
+import LXRS_csv_file_processor as processor
+import LXRS_data_generator as generator
+"""
+    Checks that a generated file written over many chunks has every row and puts each impact where its events file
+says, impacts running over a chunk boundary included, and that it is the same file written in one chunk
+"""
+
+ROWS = 4500
+CHUNK_ROWS = 1000
+
+
+class GeneratorTest(LxrsTest):
+    def generate(self, name, **settings):
+        filename = os.path.join(self.directory, name)
+        events = generator.generateFile(filename, ROWS, events=20, **settings)
+        with open(filename + generator.EVENTS_EXTENSION, "rb") as eventsFile:
+            self.assertEqual(json.load(eventsFile), events)
+        return filename, events
+
+    def testChunks(self):
+        whole = self.generate("whole.csv")[0]
+        self.setConstant(generator, "CHUNK_ROWS", CHUNK_ROWS)
+        chunked, events = self.generate("chunked.csv")
+        with open(whole, "rb") as wholeFile, open(chunked, "rb") as chunkedFile:
+            self.assertEqual(chunkedFile.read(), wholeFile.read())
+        for nodes, channels in ((1, 3), (2, 2)):
+            filename, events = self.generate("clean.csv", nodes=nodes, channels=channels, noise=0.0)
+            msd = processor.MicroStrainData(filename, cache="off")
+            timestamps, samples = msd.getSamples()
+            self.assertEqual(len(timestamps), ROWS)
+            self.assertEqual(msd.sampleFrequency, generator.DEFAULT_RATE)
+            length = len(generator.eventShape(generator.DEFAULT_RATE))
+            self.assertTrue(any(event["start"] // CHUNK_ROWS != (event["start"] + length - 1) // CHUNK_ROWS
+                                for event in events))
+            columns = [column for node, name, column in msd.channelMap]
+            for event in events:
+                values = samples[:, columns.index(event["column"] + 1)]
+                # the sample before the impact is at rest and the ring starts at its full amplitude
+                self.assertAlmostEqual(values[event["start"]] - values[event["start"] - 1], event["amplitude"], 5)
+                self.assertAlmostEqual(values[event["peak"]], event["value"], 5)
+                self.assertEqual(int(np.argmax(np.abs(values[event["start"]:event["start"] + length]))),
+                                 event["peak"] - event["start"])
+
+
+if __name__ == "__main__":
+    unittest.main()
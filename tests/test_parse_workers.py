@@ -0,0 +1,92 @@
+import csv
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that a file split into several byte ranges parses the same on one process (-j 1) as on a pool of
+them (-j N), run from the top of the repository with
+
+    python -m unittest discover tests
+"""
+
+# small enough that the generated file is split into a dozen or so byte ranges
+CHUNK_SIZE = 256 * 1024
+
+
+class ParseWorkersTest(GeneratedFileTest):
+    ROWS, NODES, EVENTS = 40000, 2, 5
+
+    def setUp(self):
+        super(ParseWorkersTest, self).setUp()
+        self.setConstant(processor, "PARSE_CHUNK_SIZE", CHUNK_SIZE)
+
+    def damageFile(self):
+        """
+        adds a blank line, drops a row (a lost packet) and empties a cell, each in a different byte range
+        """
+        with open(self.filename, 'rb') as csvFile:
+            lines = csvFile.read().split("\r\n")
+        first = lines.index("DATA_START") + 2
+        lines.insert(first + self.ROWS // 2, "")
+        del lines[first + 3 * self.ROWS // 4]
+        lines[first + self.ROWS // 4] = lines[first + self.ROWS // 4].rsplit(",", 1)[0] + ","
+        with open(self.filename, 'wb') as csvFile:
+            csvFile.write("\r\n".join(lines))
+
+    def parse(self, workers, timeMode="parsed"):
+        return self.load(timeMode=timeMode, parseWorkers=workers).getSamples()
+
+    def assertSameSamples(self, timeMode="parsed"):
+        timestamps, channels = self.parse(1, timeMode)
+        for workers in (2, 4):
+            parallelTimestamps, parallelChannels = self.parse(workers, timeMode)
+            np.testing.assert_array_equal(timestamps, parallelTimestamps)
+            np.testing.assert_array_equal(channels, parallelChannels)
+        return timestamps, channels
+
+    def testRangesSplitOnRows(self):
+        with open(self.filename, 'rb') as csvFile:
+            data = csvFile.read()
+        sections, titleStart, dataStart = processor.scanPreamble(data)
+        ranges = processor.splitRanges(data, dataStart, len(data), CHUNK_SIZE)
+        self.assertGreater(len(ranges), 4)
+        self.assertEqual(ranges[0][0], dataStart)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (start, stop), (nextStart, nextStop) in zip(ranges, ranges[1:]):
+            self.assertEqual(stop, nextStart)
+            self.assertEqual(data[stop - 1], "\n")
+        self.assertEqual(sum(processor.countRows(data, start, stop) for start, stop in ranges), self.ROWS)
+
+    def testParsed(self):
+        timestamps, channels = self.assertSameSamples()
+        self.assertEqual(len(timestamps), self.ROWS)
+
+    def testSynthesized(self):
+        timestamps, channels = self.assertSameSamples("synthesized")
+        np.testing.assert_array_equal(timestamps, self.parse(1)[0])
+
+    def testDamagedFile(self):
+        self.damageFile()
+        timestamps, channels = self.assertSameSamples()
+        self.assertEqual(len(timestamps), self.ROWS - 1)
+        self.assertEqual(np.isnan(channels).sum(), 1)
+        # the dropped row fails the spot checks so synthesized mode decodes every timestamp instead
+        np.testing.assert_array_equal(self.assertSameSamples("synthesized")[0], timestamps)
+
+    def testEmptyFields(self):
+        nan = np.nan
+        rows = ["02/17/17 15:30:31.000000000,1.5,,3.0,,", "02/17/17 15:30:31.001000000,,,,,",
+                "02/17/17 15:30:31.002000000,4.0,5.0,6.0,7.0,"]
+        fields = processor.parseDataBlock("\r\n".join(rows) + "\r\n", 6)
+        np.testing.assert_array_equal(fields[:, 6:], [[1.5, nan, 3.0, nan, nan], [nan] * 5, [4.0, 5.0, 6.0, 7.0, nan]])
+        # only the short row and the one with a field too many are read row by row, the blank line is dropped
+        rows[1:1] = ["02/17/17 15:30:31.000500000,8.0", "", "02/17/17 15:30:31.000700000,,1,2,3,4,5"]
+        fields = processor.parseDataFields("\r\n".join(rows) + "\r\n", csv.excel, 6)
+        np.testing.assert_array_equal(fields[:, 6:], [[1.5, nan, 3.0, nan, nan], [8.0] + [nan] * 4,
+                                                      [nan, 1.0, 2.0, 3.0, 4.0], [nan] * 5,
+                                                      [4.0, 5.0, 6.0, 7.0, nan]])
+        self.assertEqual(fields[:, 5].tolist(), [31.0, 31.0005, 31.0007, 31.001, 31.002])
+
+
+if __name__ == "__main__": unittest.main()
@@ -0,0 +1,36 @@
+import os
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that a cache sidecar cut short is parsed around rather than mapped, and that a failed write leaves no
+temporary file behind
+"""
+
+
+class SampleCacheTest(GeneratedFileTest):
+    ROWS, EVENTS = 5000, 2
+
+    def testTruncated(self):
+        expected = self.load(cache="use").getSamples()
+        cache = processor.SampleCache(self.filename)
+        key = cache.key(dtype=np.dtype(processor.DEFAULT_SAMPLE_DTYPE).str, timeMode=processor.DEFAULT_TIMESTAMP_MODE)
+        self.assertIsNotNone(cache.load(key))
+        with open(cache.path, "r+b") as cacheFile: cacheFile.truncate(os.path.getsize(cache.path) - 100)
+        self.assertIsNone(cache.load(key))
+        for ours, theirs in zip(self.load(cache="use").getSamples(), expected):
+            np.testing.assert_array_equal(ours, theirs)
+        # the entry was written again in full
+        self.assertIsNotNone(cache.load(key))
+
+    def testFailedSave(self):
+        cache = processor.SampleCache(self.filename)
+        with self.assertRaises(ValueError):
+            cache.save(cache.key(), ["not a timestamp"], np.zeros((1, 3)))
+        self.assertFalse(os.path.exists(cache.path + ".tmp"))
+        self.assertFalse(os.path.exists(cache.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks the batched capture spectra against one capture at a time, that Welch's method gives the same result
+however the samples are split into blocks and in stream mode, and that a known tone is found at its frequency
+"""
+
+RATE = 512.0
+
+
+class SpectrumTest(GeneratedFileTest):
+    ROWS, NODES = 40000, 2
+
+    def testTone(self):
+        t = np.arange(8192) / RATE
+        samples = np.stack([np.sin(2 * np.pi * 40 * t), 0.5 * np.sin(2 * np.pi * 100 * t) - 1.0], axis=1)
+        frequencies, density = processor.spectralDensity(samples[np.newaxis], RATE)
+        found = processor.dominantFrequencies(frequencies, density, 1)[0]
+        self.assertEqual(found[0, 0].tolist(), [40.0, 100.0])
+        # the densities add up to the variance of each channel
+        np.testing.assert_allclose((density[0] * frequencies[1]).sum(axis=0), samples.var(axis=0), rtol=0.02)
+
+    def testBatchedCaptures(self):
+        msd = self.load()
+        msd.setNumCaptures(6)
+        captures = msd.sliceNumTriggers()
+        groups = msd.captureSpectra(captures)
+        self.assertEqual(sorted(sum([positions for positions, frequencies, density in groups], [])),
+                         range(len(captures)))
+        for positions, frequencies, density in groups:
+            for row, position in enumerate(positions):
+                single = processor.spectralDensity(captures[position].channels[np.newaxis], msd.sampleFrequency)[1]
+                np.testing.assert_allclose(density[row], single[0])
+
+    def testWelchBlocks(self):
+        msd = self.load()
+        frequencies, density = msd.welchSpectrum(256)
+        samples = msd.getSamples()[1]
+        for blockSize in (1000, 256, 7):
+            welch = processor.WelchAccumulator(256)
+            for start in range(0, len(samples), blockSize): welch.add(samples[start:start + blockSize])
+            np.testing.assert_allclose(welch.result(msd.sampleFrequency)[1], density)
+        streamed = self.load(stream=True).welchSpectrum(256)
+        np.testing.assert_allclose(streamed[0], frequencies)
+        np.testing.assert_allclose(streamed[1], density)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import time
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+from LXRS_data_generator import generateFile
+"""
+    Checks that windows cut through the sparse time index in stream mode match the same windows sliced out of the
+fully parsed file, and that the index is rebuilt when the file changes
+"""
+
+
+class TimeIndexTest(GeneratedFileTest):
+    ROWS, NODES, EVENTS = 3 * processor.INDEX_INTERVAL + 100, 2, 2
+
+    def setUp(self):
+        super(TimeIndexTest, self).setUp()
+        self.timestamps, self.channels = self.load().getSamples()
+
+    def testRanges(self):
+        msd = self.load(stream=True)
+        interval, rows = processor.INDEX_INTERVAL, self.ROWS
+        for first, last in [(0, 10), (interval - 1, interval + 1), (interval, 2 * interval), (rows - 5, rows + 5),
+                            (7, 7), (rows + 10, rows + 20)]:
+            capture = msd.extractRange(first, last)
+            np.testing.assert_array_equal(capture.timestamps, self.timestamps[first:last])
+            np.testing.assert_array_equal(capture.channels, self.channels[first:last])
+            if len(capture): self.assertEqual(capture.start, first)
+
+    def testWindows(self):
+        msd = self.load(stream=True)
+        for first, last in [(0, 0), (100, 5000), (self.ROWS - 1, self.ROWS - 1), (4095, 4097)]:
+            capture = msd.extractWindow(self.timestamps[first], self.timestamps[last])
+            np.testing.assert_array_equal(capture.timestamps, self.timestamps[first:last + 1])
+            self.assertEqual(capture.start, first)
+        self.assertEqual(len(msd.extractWindow(self.timestamps[0] - 10 ** 12, self.timestamps[0] - 1)), 0)
+        self.assertRaises(processor.MicroStrainDataError, msd.extractWindow, 2, 1)
+
+    def testRebuiltWhenFileChanges(self):
+        self.load(stream=True).extractRange(0, 1)
+        self.assertTrue(os.path.exists(self.filename + processor.INDEX_EXTENSION))
+        # a second generated file with more rows stands in for the recording growing
+        time.sleep(0.01)
+        generateFile(self.filename, self.ROWS + processor.INDEX_INTERVAL, nodes=2, events=2)
+        timestamps, channels = self.load().getSamples()
+        capture = self.load(stream=True).extractRange(self.ROWS, self.ROWS + 50)
+        np.testing.assert_array_equal(capture.channels, channels[self.ROWS:self.ROWS + 50])
+
+    def testParseWindow(self):
+        start = self.timestamps[0]
+        self.assertEqual(processor.parseWindow("15:30:31,+2", start),
+                         (start, start + 2 * processor.NANOSECONDS_PER_SECOND))
+        self.assertEqual(processor.parseWindow("02/17/17 15:30:32~2", start),
+                         (start, start + 2 * processor.NANOSECONDS_PER_SECOND))
+        self.assertRaises(processor.MicroStrainDataError, processor.parseWindow, "15:30", start)
+
+
+if __name__ == "__main__": unittest.main()
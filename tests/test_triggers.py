@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+from lxrs_test_case import GeneratedFileTest
+import LXRS_csv_file_processor as processor
+"""
+    Checks that stream mode picks the same triggers as the in-memory slice methods, and that both pick the largest
+value left outside the dead-zones of the triggers before it
+"""
+
+
+def greedyTriggers(scores, numTriggers, deadzone):
+    scores = np.where(np.isnan(scores), -np.inf, scores).max(axis=1)
+    triggers = []
+    for index in np.argsort(-scores, kind="mergesort"):
+        if len(triggers) == numTriggers: break
+        if all(abs(index - trigger) >= deadzone for trigger in triggers): triggers.append(int(index))
+    return triggers
+
+
+class TriggerTest(GeneratedFileTest):
+    ROWS, NODES, EVENTS = 50000, 2, 8
+
+    def loadTriggers(self, stream, polarity, numCaptures, axis="xyz"):
+        msd = self.load(stream=stream)
+        msd.setPolarity(polarity)
+        msd.setNumCaptures(numCaptures)
+        msd.setTriggerAxis(axis)
+        return msd
+
+    def testStreamMatchesMemory(self):
+        # several ranking chunks in memory, several blocks in stream mode
+        self.setConstant(processor, "RANK_CHUNK_SIZE", 4096)
+        for polarity in ("+", "-", "+-"):
+            for numCaptures, axis in ((1, "xyz"), (5, "xyz"), (12, "z")):
+                memory = self.loadTriggers(False, polarity, numCaptures, axis)
+                stream = self.loadTriggers(True, polarity, numCaptures, axis)
+                self.assertEqual([(c.triggerIndex, c.start, len(c)) for c in stream.sliceNumTriggers()],
+                                 [(c.triggerIndex, c.start, len(c)) for c in memory.sliceNumTriggers()])
+                self.assertEqual(self.loadTriggers(True, polarity, 1, axis).sliceMax().triggerIndex,
+                                 memory.sliceMax().triggerIndex)
+
+    def testGreedySelection(self):
+        for polarity in ("+", "-", "+-"):
+            msd = self.loadTriggers(False, polarity, 6)
+            channels = msd.getSamples()[1]
+            expected = greedyTriggers(processor.triggerScores(channels, range(channels.shape[1]), polarity), 6,
+                                      msd.deadzone)
+            self.assertEqual([capture.triggerIndex for capture in msd.sliceNumTriggers()], expected)
+
+    def testNoTriggers(self):
+        # -n 0 cuts nothing instead of failing to rank
+        for stream in (False, True):
+            self.assertEqual(self.loadTriggers(stream, "+-", 0).sliceNumTriggers(), [])
+        scores = np.ones((10, 3))
+        self.assertEqual([len(column) for column in processor.rankCandidates(scores, 0)], [0, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()